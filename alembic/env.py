@@ -1,4 +1,5 @@
 import asyncio
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -26,6 +27,21 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+# Секции wallets создаются вместе с таблицей (после create) и в модели не описаны
+WALLET_PARTITION_PATTERN = re.compile(r"^wallets_p\d+$")
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    """
+    Исключает из сравнения секции wallets и унаследованные ими внешние ключи
+    """
+    if type_ == "table":
+        return not WALLET_PARTITION_PATTERN.match(name)
+    if type_ == "foreign_key_constraint":
+        return not WALLET_PARTITION_PATTERN.match(obj.referred_table.name)
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -48,6 +64,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -72,7 +89,7 @@ async def run_migrations_online() -> None:
 
 
 def do_run_migrations(connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
 
     with context.begin_transaction():
         context.run_migrations()
@@ -0,0 +1,83 @@
+"""balances_to_minor_units
+
+Revision ID: 26841e82a0f4
+Revises: 7d2e4f1a8b36
+Create Date: 2026-10-17 12:40:05.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = '26841e82a0f4'
+down_revision: Union[str, None] = '7d2e4f1a8b36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MINOR_UNITS = 10 ** settings.BALANCE_SCALE
+
+# Таблица, столбец, первичный ключ, ограничение неотрицательности
+COLUMNS = [
+    ('wallets', 'balance', ('id',), 'balance_check'),
+    ('wallet_slots', 'balance', ('wallet_id', 'slot'), 'slot_balance_check'),
+    ('wallet_ledger', 'amount', ('id',), None),
+]
+
+# Клиенты приложения, подключенные к БД под тем же пользователем, кроме самой миграции
+OTHER_CLIENTS_STMT = """
+    SELECT count(*) FROM pg_stat_activity
+    WHERE datname = current_database() AND usename = current_user
+        AND backend_type = 'client backend' AND pid <> pg_backend_pid()
+"""
+
+
+def check_no_clients() -> None:
+    """
+    После подмены в столбце - минимальные единицы, а старые версии приложения пишут десятичные суммы
+    (10.5 вместо 1050) без ошибки. Подмена выполняется только при остановленных старых версиях.
+    """
+    clients = op.get_bind().execute(sa.text(OTHER_CLIENTS_STMT)).scalar_one()
+    if clients:
+        raise RuntimeError(
+            f"{clients} other client connections to the database: stop instances of the previous "
+            f"application version before swapping balances to minor units"
+        )
+
+
+def swap_column(table: str, column: str, check: str | None) -> None:
+    """
+    Подменяет старый столбец новым: только изменения каталога, без перезаписи таблицы
+    """
+    # NOT NULL использует проверенное ограничение и не сканирует таблицу
+    op.execute(f'ALTER TABLE {table} ALTER COLUMN {column}_minor SET NOT NULL')
+    op.execute(f'ALTER TABLE {table} DROP CONSTRAINT {table}_{column}_minor_not_null')
+    op.execute(f'DROP TRIGGER {table}_{column}_minor_sync ON {table}')
+    op.execute(f'DROP FUNCTION {table}_{column}_minor_sync()')
+    op.drop_column(table, column)
+    op.alter_column(table, f'{column}_minor', new_column_name=column)
+    if check:
+        op.execute(f'ALTER TABLE {table} RENAME CONSTRAINT {check}_minor TO {check}')
+
+
+def upgrade() -> None:
+    # Второй шаг: столбцы, заполненные ревизией 7d2e4f1a8b36, подменяют старые.
+    # Раскатка: alembic upgrade 7d2e4f1a8b36 при работающей старой версии, остановка старой версии,
+    # alembic upgrade head и запуск новой
+    check_no_clients()
+    for table, column, keys, check in COLUMNS:
+        swap_column(table, column, check)
+
+
+def downgrade() -> None:
+    for table, column, keys, check in COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.Float(),
+            postgresql_using=f'{column}::double precision / {MINOR_UNITS}'
+        )
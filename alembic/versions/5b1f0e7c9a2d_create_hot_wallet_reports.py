@@ -0,0 +1,34 @@
+"""create_hot_wallet_reports
+
+Revision ID: 5b1f0e7c9a2d
+Revises: 26841e82a0f4
+Create Date: 2026-10-17 18:05:12.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1f0e7c9a2d'
+down_revision: Union[str, None] = '26841e82a0f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Отчеты воркеров перезаписываются каждые несколько секунд, журналировать их незачем
+    op.create_table('hot_wallet_reports',
+    sa.Column('worker', sa.String(length=255), nullable=False),
+    sa.Column('report', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('reported_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('worker'),
+    prefixes=['UNLOGGED']
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('hot_wallet_reports')
@@ -0,0 +1,111 @@
+"""backfill_minor_units
+
+Revision ID: 7d2e4f1a8b36
+Revises: 4c36b88157bb
+Create Date: 2026-10-17 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e4f1a8b36'
+down_revision: Union[str, None] = '4c36b88157bb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MINOR_UNITS = 10 ** settings.BALANCE_SCALE
+# Строк в одной транзакции заполнения
+CHUNK_SIZE = 10_000
+
+# Таблица, столбец, первичный ключ, ограничение неотрицательности
+COLUMNS = [
+    ('wallets', 'balance', ('id',), 'balance_check'),
+    ('wallet_slots', 'balance', ('wallet_id', 'slot'), 'slot_balance_check'),
+    ('wallet_ledger', 'amount', ('id',), None),
+]
+
+
+def prepare_column(table: str, column: str) -> None:
+    """
+    Новый столбец bigint и триггер, переводящий в него все последующие записи старого столбца
+    """
+    op.add_column(table, sa.Column(f'{column}_minor', sa.BigInteger(), nullable=True))
+    op.execute(f"""
+        CREATE FUNCTION {table}_{column}_minor_sync() RETURNS trigger AS $$
+        BEGIN
+            NEW.{column}_minor := round(NEW.{column} * {MINOR_UNITS});
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute(f"""
+        CREATE TRIGGER {table}_{column}_minor_sync
+        BEFORE INSERT OR UPDATE OF {column} ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {table}_{column}_minor_sync()
+    """)
+
+
+def backfill_column(table: str, column: str, keys: tuple[str, ...]) -> None:
+    """
+    Заполняет новый столбец пачками по первичному ключу, каждая пачка - отдельная транзакция
+    """
+    key_list = ', '.join(keys)
+    bounds = ', '.join(f':k{i}' for i in range(len(keys)))
+    connection = op.get_bind()
+
+    last = None
+    while True:
+        condition = f'WHERE ({key_list}) > ({bounds})' if last else ''
+        rows = connection.execute(
+            sa.text(f"""
+                UPDATE {table}
+                SET {column}_minor = round({column} * {MINOR_UNITS})
+                WHERE ({key_list}) IN (
+                    SELECT {key_list} FROM {table} {condition} ORDER BY {key_list} LIMIT {CHUNK_SIZE}
+                )
+                RETURNING {key_list}
+            """),
+            {f'k{i}': value for i, value in enumerate(last or ())}
+        ).all()
+
+        if not rows:
+            return
+        last = max(tuple(row) for row in rows)
+
+
+def validate_column(table: str, column: str, check: str | None) -> None:
+    """
+    Проверяет ограничения нового столбца без блокировки записи (NOT VALID + VALIDATE)
+    """
+    op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_minor_not_null '
+               f'CHECK ({column}_minor IS NOT NULL) NOT VALID')
+    op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_minor_not_null')
+    if check:
+        op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {check}_minor CHECK ({column}_minor >= 0) NOT VALID')
+        op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {check}_minor')
+
+
+def upgrade() -> None:
+    # Первый шаг перевода балансов в минимальные единицы. Старые версии приложения продолжают писать
+    # float в старый столбец, триггер переносит их записи в новый, пока существующие строки заполняются пачками.
+    # Подмена столбцов - следующая ревизия 26841e82a0f4, только после остановки старых версий
+    with op.get_context().autocommit_block():
+        for table, column, keys, check in COLUMNS:
+            prepare_column(table, column)
+        for table, column, keys, check in COLUMNS:
+            backfill_column(table, column, keys)
+            validate_column(table, column, check)
+
+
+def downgrade() -> None:
+    # После отката 26841e82a0f4 новых столбцов уже нет
+    for table, column, keys, check in COLUMNS:
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_{column}_minor_sync ON {table}')
+        op.execute(f'DROP FUNCTION IF EXISTS {table}_{column}_minor_sync()')
+        op.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS {column}_minor')
@@ -0,0 +1,141 @@
+"""partition_wallets_by_hash
+
+Revision ID: 9e4d2a6b1c3f
+Revises: 5b1f0e7c9a2d
+Create Date: 2026-10-17 19:20:41.903517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4d2a6b1c3f'
+down_revision: Union[str, None] = '5b1f0e7c9a2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Значения на момент миграции, а не из модели: последующие изменения модели требуют своей миграции
+PARTITIONS = 16
+PARTITION_OPTIONS = (
+    'fillfactor = 70, autovacuum_vacuum_scale_factor = 0.02, autovacuum_vacuum_threshold = 1000, '
+    'autovacuum_analyze_scale_factor = 0.05, autovacuum_vacuum_cost_delay = 0'
+)
+# Строк в одной транзакции заполнения
+CHUNK_SIZE = 10_000
+
+NEW_TABLE = 'wallets_partitioned'
+OLD_TABLE = 'wallets_unpartitioned'
+
+
+def create_table(table: str, partitioned: bool) -> None:
+    """
+    Таблица с колонками и ограничениями wallets под временным именем
+    """
+    op.execute(f"""
+        CREATE TABLE {table} (
+            id uuid NOT NULL,
+            slot_count integer NOT NULL DEFAULT 0,
+            balance bigint NOT NULL,
+            CONSTRAINT {table}_pkey PRIMARY KEY (id),
+            CONSTRAINT balance_check CHECK (balance >= 0)
+        ) {'PARTITION BY HASH (id)' if partitioned else ''}
+    """)
+    if partitioned:
+        for remainder in range(PARTITIONS):
+            op.execute(f"""
+                CREATE TABLE wallets_p{remainder} PARTITION OF {table}
+                FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder}) WITH ({PARTITION_OPTIONS})
+            """)
+    op.execute(f'CREATE INDEX ix_{table}_sharded ON {table} (id) WHERE slot_count > 0')
+
+
+def prepare_sync(table: str) -> None:
+    """
+    Триггер, переносящий все последующие изменения wallets в новую таблицу
+    """
+    op.execute(f"""
+        CREATE FUNCTION {table}_sync() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM {table} WHERE id = OLD.id;
+                RETURN OLD;
+            END IF;
+            INSERT INTO {table} (id, slot_count, balance) VALUES (NEW.id, NEW.slot_count, NEW.balance)
+            ON CONFLICT (id) DO UPDATE SET slot_count = EXCLUDED.slot_count, balance = EXCLUDED.balance;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute(f"""
+        CREATE TRIGGER {table}_sync
+        AFTER INSERT OR UPDATE OR DELETE ON wallets
+        FOR EACH ROW EXECUTE FUNCTION {table}_sync()
+    """)
+
+
+def backfill(table: str) -> None:
+    """
+    Копирует существующие строки пачками по id, каждая пачка - отдельная транзакция.
+    FOR KEY SHARE не мешает обновлениям баланса, но не дает удалить строку до конца пачки;
+    строки, уже записанные триггером, новее копии и не перезаписываются.
+    """
+    connection = op.get_bind()
+
+    last = None
+    while True:
+        condition = 'WHERE id > :last' if last else ''
+        rows = connection.execute(
+            sa.text(f"""
+                INSERT INTO {table} (id, slot_count, balance)
+                SELECT id, slot_count, balance FROM wallets {condition}
+                ORDER BY id LIMIT {CHUNK_SIZE}
+                FOR KEY SHARE
+                ON CONFLICT (id) DO NOTHING
+                RETURNING id
+            """),
+            {'last': last}
+        ).all()
+
+        if not rows:
+            return
+        last = max(row.id for row in rows)
+
+
+def swap_table(table: str) -> None:
+    """
+    Подменяет wallets новой таблицей под короткой эксклюзивной блокировкой
+    """
+    op.execute('LOCK TABLE wallets, wallet_slots IN ACCESS EXCLUSIVE MODE')
+    op.execute(f'DROP TRIGGER IF EXISTS {table}_sync ON wallets')
+    op.execute(f'DROP FUNCTION IF EXISTS {table}_sync()')
+    op.execute('ALTER TABLE wallet_slots DROP CONSTRAINT wallet_slots_wallet_id_fkey')
+    op.execute('DROP TABLE wallets')
+
+    op.execute(f'ALTER TABLE {table} RENAME TO wallets')
+    op.execute(f'ALTER TABLE wallets RENAME CONSTRAINT {table}_pkey TO wallets_pkey')
+    op.execute(f'ALTER INDEX ix_{table}_sharded RENAME TO ix_wallets_sharded')
+    op.execute("""
+        ALTER TABLE wallet_slots ADD CONSTRAINT wallet_slots_wallet_id_fkey
+        FOREIGN KEY (wallet_id) REFERENCES wallets (id) ON DELETE CASCADE
+    """)
+
+
+def upgrade() -> None:
+    # Перенос без долгих блокировок: приложение продолжает писать в wallets,
+    # триггер переносит изменения в секционированную таблицу, пока существующие строки копируются пачками
+    with op.get_context().autocommit_block():
+        create_table(NEW_TABLE, partitioned=True)
+        prepare_sync(NEW_TABLE)
+        backfill(NEW_TABLE)
+
+    swap_table(NEW_TABLE)
+
+
+def downgrade() -> None:
+    create_table(OLD_TABLE, partitioned=False)
+    op.execute('LOCK TABLE wallets IN SHARE MODE')
+    op.execute(f'INSERT INTO {OLD_TABLE} (id, slot_count, balance) SELECT id, slot_count, balance FROM wallets')
+    swap_table(OLD_TABLE)
@@ -0,0 +1,116 @@
+from typing import Literal
+
+from fastapi import APIRouter, Body, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import crud_services, hot_wallets, sharding
+from app.api.v1.balance_cache import balance_cache
+from app.api.v1.missing_wallets import missing_wallets
+from app.api.v1.models import WalletShardsRequest, from_minor_units
+from app.api.v1.wallet import wallet_uuid_path
+from app.config.config import settings
+from app.db.database import get_async_session
+from app.metrics.logs import log_pipeline
+from app.metrics.tracing import tracer
+from app.exceptions import wallet_exceptions
+
+admin_router = APIRouter(prefix="/api/v1/admin", tags=["admin"])
+
+
+@admin_router.get("/balance_cache")
+async def get_balance_cache_stats():
+    """
+    Счетчики кэша балансов текущего воркера
+    :return: Размер кэша, попадания, промахи и вытеснения
+    """
+    return balance_cache.stats()
+
+
+@admin_router.get("/missing_wallets")
+async def get_missing_wallets_stats():
+    """
+    Счетчики фильтра отсутствующих кошельков текущего воркера
+    :return: Размер фильтра, ответы без обращения к БД и вытеснения
+    """
+    return missing_wallets.stats()
+
+
+@admin_router.get("/tracing")
+async def get_tracing_stats():
+    """
+    Счетчики трассировки текущего воркера
+    :return: Сохраненные по доле и по длительности трассы, отброшенные при переполнении очереди и выгруженные
+    """
+    return tracer.stats()
+
+
+@admin_router.get("/logging")
+async def get_logging_stats():
+    """
+    Счетчики логирования текущего воркера
+    :return: Записи в очереди, записанные, отброшенные при переполнении очереди, подавленные повторы
+    исключений и запросы, попавшие в журнал
+    """
+    return log_pipeline.stats()
+
+
+@admin_router.get("/hot_wallets")
+async def get_hot_wallets(
+        limit: int = Query(default=20, ge=1, le=1000),
+        sort: Literal["requests", "lock_wait"] = "requests",
+        session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Самые нагруженные кошельки по отчетам всех воркеров
+    :param limit: Количество кошельков
+    :param sort: requests - по частоте операций, lock_wait - по ожиданию блокировки
+    :param session: Сессия БД
+    :return: Кошельки с частотой операций и временем ожидания блокировки
+    """
+    # Свой отчет - актуальный на момент запроса
+    await hot_wallets.publish_report(session)
+    await session.commit()
+
+    interval = settings.HOT_WALLETS_REPORT_INTERVAL_S
+    reports = await hot_wallets.collect_reports(hot_wallets.REPORT_MAX_AGE_INTERVALS * interval, session)
+    merged = hot_wallets.merge_reports(reports)
+
+    key = "rate" if sort == "requests" else "lock_wait_s"
+    top = sorted(merged.items(), key=lambda item: item[1][key], reverse=True)[:limit]
+
+    return {
+        "workers": len(reports),
+        "wallets": [
+            {
+                "wallet_uuid": wallet_uuid,
+                "requests": round(item["requests"]),
+                "requests_per_s": item["rate"],
+                "lock_wait_s": item["lock_wait_s"],
+                "avg_lock_wait_ms": item["lock_wait_s"] * 1000 / item["requests"] if item["requests"] else None,
+            }
+            for wallet_uuid, item in top
+        ],
+    }
+
+
+@admin_router.post("/wallets/{wallet_uuid}/shards")
+async def set_wallet_shards(
+        wallet_uuid: str = Depends(wallet_uuid_path),
+        request: WalletShardsRequest = Body(),
+        session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Разбиение баланса горячего кошелька на слоты
+    :param wallet_uuid: UUID Кошелька
+    :param request: Количество слотов
+    :param session: Сессия БД
+    :return: Количество слотов и баланс кошелька
+    """
+    try:
+        await sharding.set_wallet_slots(wallet_uuid, request.slots, session)
+        balance = await crud_services.get_wallet_balance(wallet_uuid, session, use_cache=False)
+
+    except wallet_exceptions.WalletNotFoundError:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+
+    return {"wallet_uuid": wallet_uuid, "slots": request.slots, "balance": from_minor_units(balance)}
@@ -0,0 +1,134 @@
+import time
+from collections import OrderedDict
+
+from app.config.config import settings
+
+
+class BalanceCache:
+    """
+    Интерфейс кэша балансов кошельков. Баланс - целое число минимальных единиц
+    """
+
+    def get(self, wallet_uuid: str) -> int | None:
+        raise NotImplementedError
+
+    def add(self, wallet_uuid: str, balance: int) -> None:
+        """
+        Кладет значение, только если ключа еще нет (заполнение при чтении)
+        """
+        raise NotImplementedError
+
+    def set(self, wallet_uuid: str, balance: int) -> None:
+        """
+        Кладет значение безусловно (обновление после записи)
+        """
+        raise NotImplementedError
+
+    def invalidate(self, wallet_uuid: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class NullBalanceCache(BalanceCache):
+    """
+    Отключенный кэш: всегда промах
+    """
+
+    def get(self, wallet_uuid: str) -> int | None:
+        return None
+
+    def add(self, wallet_uuid: str, balance: int) -> None:
+        pass
+
+    def set(self, wallet_uuid: str, balance: int) -> None:
+        pass
+
+    def invalidate(self, wallet_uuid: str) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"enabled": False}
+
+
+class LRUBalanceCache(BalanceCache):
+    """
+    Ограниченный по размеру LRU кэш балансов с TTL.
+    TTL задает максимальную устаревшость значения относительно других воркеров.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        :param max_size: Максимальное число кошельков в кэше
+        :param ttl: Время жизни значения в секундах
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, wallet_uuid: str) -> int | None:
+        key = wallet_uuid.lower()
+        item = self._data.get(key)
+
+        if item is None:
+            self.misses += 1
+            return None
+
+        balance, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return balance
+
+    def add(self, wallet_uuid: str, balance: int) -> None:
+        if wallet_uuid.lower() not in self._data:
+            self.set(wallet_uuid, balance)
+
+    def set(self, wallet_uuid: str, balance: int) -> None:
+        key = wallet_uuid.lower()
+        self._data[key] = (balance, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, wallet_uuid: str) -> None:
+        self._data.pop(wallet_uuid.lower(), None)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_ms": self.ttl * 1000,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def create_balance_cache() -> BalanceCache:
+    """
+    Создает кэш балансов по настройкам
+    :return: Кэш балансов
+    """
+    if not settings.BALANCE_CACHE_ENABLED:
+        return NullBalanceCache()
+
+    return LRUBalanceCache(
+        max_size=settings.BALANCE_CACHE_MAX_SIZE,
+        ttl=settings.BALANCE_CACHE_TTL_MS / 1000,
+    )
+
+
+# Экземпляр на процесс воркера
+balance_cache = create_balance_cache()
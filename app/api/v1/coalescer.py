@@ -0,0 +1,141 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1 import sharding
+from app.api.v1.hot_wallets import hot_wallet_tracker
+from app.api.v1.notifications import publish_balances
+from app.api.v1.models import Operation
+from app.config.config import settings
+from app.db.database import async_session_maker
+from app.exceptions import wallet_exceptions
+
+
+@dataclass
+class PendingOperation:
+    """
+    Операция, ожидающая применения в составе пачки
+    """
+    operation: Operation
+    amount: int
+    future: asyncio.Future
+
+
+class WalletOperationCoalescer:
+    """
+    Собирает операции над одним кошельком, пришедшие в течение короткого окна,
+    и применяет их одним итоговым UPDATE в одной транзакции.
+    Каждый вызывающий получает свой баланс после своей операции,
+    снятие, нарушающее balance_check, отклоняется индивидуально.
+    """
+
+    def __init__(
+            self,
+            window: float,
+            max_batch: int,
+            session_maker: async_sessionmaker[AsyncSession] = async_session_maker
+    ):
+        """
+        :param window: Окно сбора операций в секундах
+        :param max_batch: Размер пачки, при достижении которого она применяется сразу
+        :param session_maker: Фабрика сессий БД
+        """
+        self.window = window
+        self.max_batch = max_batch
+        self._session_maker = session_maker
+        self._batches: dict[str, list[PendingOperation]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, wallet_uuid: str, operation: Operation, amount: int) -> int:
+        """
+        Ставит операцию в пачку кошелька и ждет ее применения
+        :param wallet_uuid: UUID кошелька
+        :param operation: Тип операции
+        :param amount: Сумма операции в минимальных единицах
+        :return: Баланс кошелька после этой операции
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self._batches.get(wallet_uuid)
+        if batch is None:
+            batch = self._batches[wallet_uuid] = []
+            loop.call_later(self.window, self._start_flush, wallet_uuid, batch)
+
+        batch.append(PendingOperation(operation, amount, future))
+
+        if len(batch) >= self.max_batch:
+            self._start_flush(wallet_uuid, batch)
+
+        return await future
+
+    def _start_flush(self, wallet_uuid: str, batch: list[PendingOperation]) -> None:
+        # Пачка могла уже уйти на применение по размеру
+        if self._batches.get(wallet_uuid) is not batch:
+            return
+        del self._batches[wallet_uuid]
+
+        task = asyncio.create_task(self._flush(wallet_uuid, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, wallet_uuid: str, batch: list[PendingOperation]) -> None:
+        # Операции отмененных запросов не применяем
+        batch = [item for item in batch if not item.future.done()]
+        if not batch:
+            return
+
+        try:
+            async with self._session_maker() as session:
+                started = time.perf_counter()
+                balances, sharded = await sharding.lock_wallet_balances([wallet_uuid], session)
+                # Блокировку ждала каждая объединенная операция, как ждала бы по отдельности
+                hot_wallet_tracker.record_lock_wait(wallet_uuid, (time.perf_counter() - started) * len(batch))
+                balance = balances.get(wallet_uuid.lower())
+
+                if balance is None:
+                    raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+
+                outcomes = []
+                applied = False
+                for item in batch:
+                    if item.operation == Operation.DEPOSIT:
+                        balance += item.amount
+                    elif balance - item.amount < 0:
+                        outcomes.append(wallet_exceptions.WalletBalanceError(wallet_uuid=wallet_uuid))
+                        continue
+                    else:
+                        balance -= item.amount
+                    applied = True
+                    outcomes.append(balance)
+
+                if applied:
+                    await sharding.write_wallet_balances({wallet_uuid.lower(): balance}, sharded, session)
+                    await publish_balances({wallet_uuid: balance}, session)
+                    await session.commit()
+
+        except Exception as err:
+            if not isinstance(err, wallet_exceptions.WalletException):
+                logger.exception(f"Failed to apply coalesced batch for wallet {wallet_uuid}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(err)
+            return
+
+        for item, outcome in zip(batch, outcomes):
+            if item.future.done():
+                continue
+            if isinstance(outcome, Exception):
+                item.future.set_exception(outcome)
+            else:
+                item.future.set_result(outcome)
+
+
+# Экземпляр на процесс воркера
+wallet_coalescer = WalletOperationCoalescer(
+    window=settings.WALLET_COALESCING_WINDOW_MS / 1000,
+    max_batch=settings.WALLET_COALESCING_MAX_BATCH,
+)
@@ -1,21 +1,78 @@
-from decimal import Decimal
+import time
+from collections.abc import AsyncIterator
 from fastapi import HTTPException
 
-from sqlalchemy import select, text
+from sqlalchemy import BigInteger, func, select, text
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.v1.models import Operation
-from app.db.models import Wallet
+from app.api.v1 import ledger, sharding
+from app.api.v1.balance_cache import balance_cache
+from app.api.v1.missing_wallets import missing_wallets
+from app.api.v1.coalescer import wallet_coalescer
+from app.api.v1.hot_wallets import hot_wallet_tracker
+from app.api.v1.notifications import publish_balances
+from app.api.v1.models import (
+    BatchMode,
+    BatchOperationItem,
+    BatchOperationResult,
+    BatchTransferResult,
+    Operation,
+    OperationStatus,
+    WalletTransfer,
+)
+from app.config.config import settings
+from app.db import fast_path
+from app.db.models import Wallet, WalletSlot
 from app.exceptions import wallet_exceptions
 
 
+DEPOSIT_STMT = text("""
+    UPDATE wallets
+    SET balance = balance + :amount
+    WHERE id = :wallet_uuid AND slot_count = 0
+    RETURNING balance
+""")
+
+WITHDRAW_STMT = text("""
+    UPDATE wallets
+    SET balance = balance - :amount
+    WHERE id = :wallet_uuid AND slot_count = 0
+    RETURNING balance
+""")
+
+# Баланс с учетом слотов и записей журнала после проекции, для любого режима хранения
+WALLET_BALANCES_STMT = text("""
+    SELECT w.id, (
+        w.balance
+        + CASE WHEN w.slot_count > 0
+            THEN (SELECT coalesce(sum(s.balance), 0) FROM wallet_slots s WHERE s.wallet_id = w.id)
+            ELSE 0 END
+        + coalesce(l.amount, 0)
+    )::bigint
+    FROM wallets w
+    LEFT JOIN (
+        SELECT wallet_id, sum(amount) AS amount
+        FROM wallet_ledger
+        WHERE wallet_id = ANY(CAST(:wallet_uuids AS uuid[]))
+            AND id > (SELECT coalesce(max(position), 0) FROM ledger_watermark)
+        GROUP BY wallet_id
+    ) l ON l.wallet_id = w.id
+    WHERE w.id = ANY(CAST(:wallet_uuids AS uuid[]))
+""")
+
+
 async def create_wallet(session: AsyncSession) -> str:
     """
     Создает новый кошелек в БД
     :param session: Сессия для работы с БД
     :return: id кошелька
     """
+    if settings.FAST_PATH_ENABLED:
+        wallet_uuid = await fast_path.create_wallet()
+        missing_wallets.discard(str(wallet_uuid))
+        return wallet_uuid
+
     stmt = text("""
     INSERT INTO wallets (id, balance)
         VALUES (uuid_generate_v4(), 0)
@@ -28,52 +85,160 @@ async def create_wallet(session: AsyncSession) -> str:
         raise HTTPException(status_code=500, detail="Failed to create wallet.")
 
     await session.commit()
+    missing_wallets.discard(str(wallet_uuid))
 
     return wallet_uuid
 
 
-async def get_wallet_balance(wallet_uuid: str, session: AsyncSession) -> int:
-    stmt = select(Wallet).where(Wallet.id == wallet_uuid)
-    result = await session.execute(stmt)
-    wallet = result.scalar_one_or_none()
+async def create_wallets_bulk(
+        count: int | None,
+        initial_balance: int,
+        balances: list[int] | None,
+        chunk_size: int,
+        session: AsyncSession
+) -> AsyncIterator[list[str]]:
+    """
+    Создает кошельки пачками, каждая пачка - один INSERT и один commit
+    :param count: Количество кошельков с начальным балансом initial_balance
+    :param initial_balance: Начальный баланс при создании по count, в минимальных единицах
+    :param balances: Начальные балансы в минимальных единицах, по кошельку на каждый (вместо count)
+    :param chunk_size: Количество кошельков в одном INSERT
+    :param session: Сессия для работы с БД
+    :return: Асинхронный итератор по спискам id созданных кошельков
+    """
+    series_stmt = text("""
+        INSERT INTO wallets (id, balance)
+            SELECT uuid_generate_v4(), :balance
+            FROM generate_series(1, :count)
+            RETURNING id
+    """)
+    unnest_stmt = text("""
+        INSERT INTO wallets (id, balance)
+            SELECT uuid_generate_v4(), balance
+            FROM unnest(CAST(:balances AS bigint[])) AS balance
+            RETURNING id
+    """)
 
-    # Если кошелек не найден выбрасываем исключение
-    if wallet is None:
-        raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+    total = count if balances is None else len(balances)
+    for offset in range(0, total, chunk_size):
+        if balances is None:
+            params = {"balance": initial_balance, "count": min(chunk_size, total - offset)}
+            result = await session.execute(series_stmt, params)
+        else:
+            result = await session.execute(unnest_stmt, {"balances": balances[offset:offset + chunk_size]})
 
-    return wallet.balance
+        wallet_ids = [str(wallet_id) for wallet_id in result.scalars()]
+        await session.commit()
+        for wallet_id in wallet_ids:
+            missing_wallets.discard(wallet_id)
 
+        yield wallet_ids
 
-async def wallet_operation(wallet_uuid: str, operation: Operation, amount: Decimal, session: AsyncSession) -> float:
-    if operation == "DEPOSIT":
-        stmt = text(
-            """
-            UPDATE wallets
-            SET balance = balance + :amount
-            WHERE id = :wallet_uuid
-            RETURNING balance
-            """
-        )
+
+async def get_wallet_balance(wallet_uuid: str, session: AsyncSession, use_cache: bool = True) -> int:
+    """
+    Возвращает баланс кошелька, при наличии - из кэша балансов
+    :param wallet_uuid: UUID кошелька
+    :param session: Сессия для работы с БД
+    :param use_cache: False - читать из БД в обход кэша (read-your-writes между воркерами)
+    :return: Баланс кошелька в минимальных единицах
+    """
+    if use_cache:
+        balance = balance_cache.get(wallet_uuid)
+        if balance is not None:
+            return balance
+
+    # Сессия реплики: быстрый путь читал бы с основной БД
+    replica = session.info.get("replica")
+    if settings.WALLET_STORAGE_ENGINE == "ledger":
+        balance = await ledger.get_wallet_balance(wallet_uuid, session)
+    elif settings.FAST_PATH_ENABLED and replica is None:
+        balance = await fast_path.get_wallet_balance(wallet_uuid)
     else:
-        stmt = text(
-            """
-            UPDATE wallets
-            SET balance = balance - :amount
-            WHERE id = :wallet_uuid
-            RETURNING balance
-            """
-        )
+        stmt = select(Wallet).where(Wallet.id == wallet_uuid)
+        result = await session.execute(stmt)
+        wallet = result.scalar_one_or_none()
 
+        # Если кошелек не найден выбрасываем исключение
+        if wallet is None:
+            raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+
+        balance = wallet.balance
+        if wallet.slot_count > 0:
+            slots_stmt = select(func.coalesce(func.sum(WalletSlot.balance), 0).cast(BigInteger)).where(
+                WalletSlot.wallet_id == wallet_uuid
+            )
+            balance += (await session.execute(slots_stmt)).scalar_one()
+
+    # Свежее значение из БД не перетирает записанное за это время операцией.
+    # Значение с реплики может отставать больше TTL кэша и в кэш не попадает
+    if replica is None:
+        balance_cache.add(wallet_uuid, balance)
+
+    return balance
+
+
+async def get_wallet_balances(
+        wallet_uuids: list[str],
+        chunk_size: int,
+        session: AsyncSession
+) -> AsyncIterator[list[tuple[str, int]]]:
+    """
+    Читает балансы списка кошельков одним запросом, результат выбирается кусками через курсор
+    :param wallet_uuids: UUID кошельков
+    :param chunk_size: Строк в одном куске
+    :param session: Сессия для работы с БД
+    :return: Асинхронный итератор по спискам (UUID кошелька, баланс) найденных кошельков
+    """
+    result = await session.stream(WALLET_BALANCES_STMT, {"wallet_uuids": wallet_uuids})
+    async for rows in result.partitions(chunk_size):
+        yield [(str(wallet_id), balance) for wallet_id, balance in rows]
+
+
+async def wallet_operation(wallet_uuid: str, operation: Operation, amount: int, session: AsyncSession) -> int:
+    hot_wallet_tracker.record_request(wallet_uuid)
+
+    # Операции всех кошельков за такт записываются в журнал одним COPY
+    if settings.WALLET_STORAGE_ENGINE == "ledger":
+        new_balance = await ledger.ledger_writer.submit(wallet_uuid, operation, amount)
+        balance_cache.set(wallet_uuid, new_balance)
+        return new_balance
+
+    # Для горячих кошельков операции можно объединять в одно UPDATE
+    if settings.WALLET_COALESCING_ENABLED:
+        new_balance = await wallet_coalescer.submit(wallet_uuid, operation, amount)
+        balance_cache.set(wallet_uuid, new_balance)
+        return new_balance
+
+    if settings.FAST_PATH_ENABLED:
+        try:
+            new_balance = await fast_path.wallet_operation(wallet_uuid, operation, amount)
+        # Кошелек разбит на слоты или не существует
+        except wallet_exceptions.WalletNotFoundError:
+            new_balance = await sharding.sharded_wallet_operation(wallet_uuid, operation, amount, session)
+            await publish_balances({wallet_uuid: new_balance}, session)
+            await session.commit()
+
+        balance_cache.set(wallet_uuid, new_balance)
+        return new_balance
+
+    stmt = DEPOSIT_STMT if operation == "DEPOSIT" else WITHDRAW_STMT
     params = {"wallet_uuid": wallet_uuid, "amount": amount}
     try:
+        started = time.perf_counter()
         result = await session.execute(stmt, params)
+        hot_wallet_tracker.record_lock_wait(wallet_uuid, time.perf_counter() - started)
         new_balance = result.scalar_one_or_none()
 
+        # Кошелек разбит на слоты или не существует
         if new_balance is None:
-            raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+            new_balance = await sharding.sharded_wallet_operation(wallet_uuid, operation, amount, session)
 
+        await publish_balances({wallet_uuid: new_balance}, session)
         await session.commit()
 
+        balance_cache.set(wallet_uuid, new_balance)
+
         return new_balance
 
     # Если нарушено ограничение баланса, выбрасываем исключение
@@ -81,4 +246,248 @@ async def wallet_operation(wallet_uuid: str, operation: Operation, amount: Decim
         if "balance_check" in str(e.orig):
             raise wallet_exceptions.WalletBalanceError(wallet_uuid=wallet_uuid)
         else:
-            raise e from e
\ No newline at end of file
+            raise e from e
+
+
+async def lock_wallet_balances(wallet_ids: list, session: AsyncSession) -> tuple[dict[str, int], set[str]]:
+    """
+    Блокирует кошельки в порядке id и возвращает полные балансы с учетом режима хранения
+    """
+    if settings.WALLET_STORAGE_ENGINE == "ledger":
+        return await ledger.lock_wallet_balances(wallet_ids, session)
+
+    started = time.perf_counter()
+    balances, sharded = await sharding.lock_wallet_balances(wallet_ids, session)
+    # Ожидание блокировки всех строк приписывается каждому кошельку
+    lock_wait = time.perf_counter() - started
+    for wallet_uuid in balances:
+        hot_wallet_tracker.record_lock_wait(wallet_uuid, lock_wait)
+    return balances, sharded
+
+
+async def write_wallet_changes(
+        balances: dict[str, int],
+        entries: list[tuple[str, int]],
+        sharded: set[str],
+        session: AsyncSession
+) -> None:
+    """
+    Записывает изменения заблокированных кошельков: записи журнала или итоговые балансы
+    :param balances: Итоговые балансы измененных кошельков
+    :param entries: Изменения (кошелек, сумма со знаком) в порядке применения
+    :param sharded: Кошельки, разбитые на слоты
+    :param session: Сессия для работы с БД
+    """
+    if settings.WALLET_STORAGE_ENGINE == "ledger":
+        await ledger.append_entries(entries, session)
+    elif balances:
+        await sharding.write_wallet_balances(balances, sharded, session)
+    await publish_balances(balances, session)
+
+
+async def wallet_batch_operation(
+        operations: list[BatchOperationItem],
+        mode: BatchMode,
+        session: AsyncSession
+) -> tuple[bool, list[BatchOperationResult]]:
+    """
+    Применяет пакет операций одной транзакцией.
+    Строки кошельков (и слоты разбитых кошельков) блокируются в порядке id,
+    итоговые балансы записываются одним UPDATE по массивам.
+    :param operations: Операции в порядке применения
+    :param mode: ATOMIC - все или ничего, BEST_EFFORT - применяются успешные операции
+    :param session: Сессия для работы с БД
+    :return: Признак применения и результаты по каждой операции
+    """
+    for item in operations:
+        hot_wallet_tracker.record_request(item.wallet_uuid)
+
+    wallet_ids = list({item.wallet_uuid for item in operations})
+    balances, sharded = await lock_wallet_balances(wallet_ids, session)
+
+    results = []
+    changed = set()
+    entries = []
+    for item in operations:
+        key = str(item.wallet_uuid)
+        balance = balances.get(key)
+
+        if balance is None:
+            results.append(BatchOperationResult(wallet_uuid=item.wallet_uuid, status=OperationStatus.NOT_FOUND))
+            continue
+
+        amount = item.amount
+        if item.operation == Operation.DEPOSIT:
+            balance += amount
+        elif balance - amount < 0:
+            results.append(
+                BatchOperationResult(wallet_uuid=item.wallet_uuid, status=OperationStatus.INSUFFICIENT_FUNDS)
+            )
+            continue
+        else:
+            balance -= amount
+
+        balances[key] = balance
+        changed.add(key)
+        entries.append((key, amount if item.operation == Operation.DEPOSIT else -amount))
+        results.append(
+            BatchOperationResult(wallet_uuid=item.wallet_uuid, status=OperationStatus.SUCCESS, balance=balance)
+        )
+
+    failed = any(item.status != OperationStatus.SUCCESS for item in results)
+
+    # В режиме "все или ничего" при любой ошибке откатываем весь пакет
+    if mode == BatchMode.ATOMIC and failed:
+        await session.rollback()
+        for item in results:
+            if item.status == OperationStatus.SUCCESS:
+                item.status = OperationStatus.ROLLED_BACK
+                item.balance = None
+        return False, results
+
+    await write_wallet_changes({key: balances[key] for key in changed}, entries, sharded, session)
+    await session.commit()
+
+    for key in changed:
+        balance_cache.set(key, balances[key])
+
+    return bool(changed), results
+
+
+async def wallet_transfer(
+        from_wallet_uuid: str,
+        to_wallet_uuid: str,
+        amount: int,
+        session: AsyncSession
+) -> tuple[int, int]:
+    """
+    Переводит сумму между кошельками одной транзакцией.
+    Обе строки блокируются в порядке id, поэтому встречные переводы не взаимоблокируются.
+    :param from_wallet_uuid: UUID кошелька списания
+    :param to_wallet_uuid: UUID кошелька зачисления
+    :param amount: Сумма в минимальных единицах
+    :param session: Сессия для работы с БД
+    :return: Балансы кошельков списания и зачисления после перевода
+    """
+    hot_wallet_tracker.record_request(from_wallet_uuid)
+    hot_wallet_tracker.record_request(to_wallet_uuid)
+
+    # Кошельки без слотов: блокировка, списание и зачисление одним выражением.
+    # Строки блокируются и при отказе, повторная блокировка ниже их уже не ждет
+    if settings.WALLET_STORAGE_ENGINE == "update":
+        stmt = text(
+            """
+            WITH locked AS (
+                SELECT id, slot_count FROM wallets
+                WHERE id IN (:from_uuid, :to_uuid)
+                ORDER BY id
+                FOR UPDATE
+            )
+            UPDATE wallets
+            SET balance = balance + CASE WHEN wallets.id = :to_uuid THEN 1 ELSE -1 END * CAST(:amount AS bigint)
+            FROM locked
+            WHERE wallets.id = locked.id AND (SELECT count(*) FROM locked WHERE slot_count = 0) = 2
+            RETURNING wallets.id, wallets.balance
+            """
+        )
+        params = {"from_uuid": from_wallet_uuid, "to_uuid": to_wallet_uuid, "amount": amount}
+        started = time.perf_counter()
+        try:
+            balances = {str(wallet_id): balance for wallet_id, balance in await session.execute(stmt, params)}
+        except IntegrityError as e:
+            if "balance_check" in str(e.orig):
+                raise wallet_exceptions.WalletBalanceError(wallet_uuid=from_wallet_uuid)
+            raise e from e
+
+        lock_wait = time.perf_counter() - started
+        for wallet_uuid in balances:
+            hot_wallet_tracker.record_lock_wait(wallet_uuid, lock_wait)
+
+        if balances:
+            await publish_balances(balances, session)
+            await session.commit()
+            balance_cache.set(from_wallet_uuid, balances[from_wallet_uuid])
+            balance_cache.set(to_wallet_uuid, balances[to_wallet_uuid])
+            return balances[from_wallet_uuid], balances[to_wallet_uuid]
+
+    # Кошелек разбит на слоты, не существует или хранение журналом
+    balances, sharded = await lock_wallet_balances([from_wallet_uuid, to_wallet_uuid], session)
+    for wallet_uuid in (from_wallet_uuid, to_wallet_uuid):
+        if wallet_uuid not in balances:
+            raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+    if balances[from_wallet_uuid] < amount:
+        raise wallet_exceptions.WalletBalanceError(wallet_uuid=from_wallet_uuid)
+
+    balances[from_wallet_uuid] -= amount
+    balances[to_wallet_uuid] += amount
+    entries = [(from_wallet_uuid, -amount), (to_wallet_uuid, amount)]
+    await write_wallet_changes(balances, entries, sharded, session)
+    await session.commit()
+
+    balance_cache.set(from_wallet_uuid, balances[from_wallet_uuid])
+    balance_cache.set(to_wallet_uuid, balances[to_wallet_uuid])
+    return balances[from_wallet_uuid], balances[to_wallet_uuid]
+
+
+async def wallet_batch_transfer(
+        transfers: list[WalletTransfer],
+        mode: BatchMode,
+        session: AsyncSession
+) -> tuple[bool, list[BatchTransferResult]]:
+    """
+    Применяет пакет переводов одной транзакцией, все кошельки пакета блокируются в порядке id
+    :param transfers: Переводы в порядке применения
+    :param mode: ATOMIC - все или ничего, BEST_EFFORT - применяются успешные переводы
+    :param session: Сессия для работы с БД
+    :return: Признак применения и результаты по каждому переводу
+    """
+    for item in transfers:
+        hot_wallet_tracker.record_request(item.from_wallet_uuid)
+        hot_wallet_tracker.record_request(item.to_wallet_uuid)
+
+    wallet_ids = list({item.from_wallet_uuid for item in transfers} | {item.to_wallet_uuid for item in transfers})
+    balances, sharded = await lock_wallet_balances(wallet_ids, session)
+
+    results = []
+    changed = set()
+    entries = []
+    for item in transfers:
+        from_key, to_key = str(item.from_wallet_uuid), str(item.to_wallet_uuid)
+        result = BatchTransferResult(
+            from_wallet_uuid=item.from_wallet_uuid,
+            to_wallet_uuid=item.to_wallet_uuid,
+            status=OperationStatus.SUCCESS
+        )
+        results.append(result)
+
+        if from_key not in balances or to_key not in balances:
+            result.status = OperationStatus.NOT_FOUND
+            continue
+        if balances[from_key] < item.amount:
+            result.status = OperationStatus.INSUFFICIENT_FUNDS
+            continue
+
+        balances[from_key] -= item.amount
+        balances[to_key] += item.amount
+        changed.update((from_key, to_key))
+        entries.extend(((from_key, -item.amount), (to_key, item.amount)))
+        result.from_balance, result.to_balance = balances[from_key], balances[to_key]
+
+    failed = any(item.status != OperationStatus.SUCCESS for item in results)
+
+    # В режиме "все или ничего" при любой ошибке откатываем весь пакет
+    if mode == BatchMode.ATOMIC and failed:
+        await session.rollback()
+        for item in results:
+            if item.status == OperationStatus.SUCCESS:
+                item.status = OperationStatus.ROLLED_BACK
+                item.from_balance = item.to_balance = None
+        return False, results
+
+    await write_wallet_changes({key: balances[key] for key in changed}, entries, sharded, session)
+    await session.commit()
+
+    for key in changed:
+        balance_cache.set(key, balances[key])
+
+    return bool(changed), results
@@ -0,0 +1,85 @@
+import asyncio
+import uuid
+from collections.abc import AsyncIterator
+
+from app.api.v1.models import MINOR_UNITS, ExportFormat
+from app.config.config import settings
+from app.db.admission import admission_controller
+from app.db.database import async_session_maker
+
+
+# Баланс - как в ledger.GET_BALANCE_STMT: проекция, слоты и еще не учтенные записи журнала.
+# Один запрос - один снимок, поэтому выгрузка согласована на момент начала.
+# Минимальные единицы переводятся в десятичное число в БД: $2 - MINOR_UNITS, $3 - BALANCE_SCALE.
+BALANCES_QUERY = """
+    SELECT w.id AS wallet_uuid,
+        round((
+            w.balance
+            + CASE WHEN w.slot_count > 0
+                THEN (SELECT coalesce(sum(s.balance), 0) FROM wallet_slots s WHERE s.wallet_id = w.id)
+                ELSE 0 END
+            + coalesce(l.amount, 0)
+        )::numeric / $2, $3) AS balance
+    FROM wallets w
+    LEFT JOIN (
+        SELECT wallet_id, sum(amount) AS amount
+        FROM wallet_ledger
+        WHERE id > (SELECT coalesce(max(position), 0) FROM ledger_watermark)
+        GROUP BY wallet_id
+    ) l ON l.wallet_id = w.id
+    WHERE $1::uuid IS NULL OR w.id > $1::uuid
+    ORDER BY w.id
+"""
+
+# Строка JSON собирается в БД: COPY в текстовом формате отдает ее как есть
+NDJSON_QUERY = f"""
+    SELECT format('{{"wallet_uuid": "%s", "balance": %s}}', wallet_uuid, balance)
+    FROM ({BALANCES_QUERY}) AS balances
+"""
+
+
+async def export_balances(export_format: ExportFormat, after: uuid.UUID | None = None) -> AsyncIterator[bytes]:
+    """
+    Выгружает балансы всех кошельков в порядке UUID через COPY ... TO STDOUT.
+    Куски COPY передаются через очередь ограниченной длины: пока потребитель
+    не заберет данные, чтение из БД приостанавливается, память воркера не растет.
+    :param export_format: CSV (с заголовком) или NDJSON
+    :param after: Продолжить выгрузку после этого UUID
+    :return: Асинхронный итератор по кускам выгрузки
+    """
+    chunks: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=settings.EXPORT_QUEUE_CHUNKS)
+
+    async with admission_controller.slot(), async_session_maker() as session:
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+
+        if export_format == ExportFormat.CSV:
+            copy = raw_connection.driver_connection.copy_from_query(
+                BALANCES_QUERY, after, MINOR_UNITS, settings.BALANCE_SCALE, output=chunks.put, format="csv", header=True
+            )
+        else:
+            copy = raw_connection.driver_connection.copy_from_query(
+                NDJSON_QUERY, after, MINOR_UNITS, settings.BALANCE_SCALE, output=chunks.put
+            )
+
+        # Признак конца выгрузки кладется и при ошибке; при отмене потребитель его уже не ждет
+        async def run_copy():
+            try:
+                await copy
+            except Exception:
+                await chunks.put(None)
+                raise
+            await chunks.put(None)
+
+        task = asyncio.create_task(run_copy())
+        try:
+            while (chunk := await chunks.get()) is not None:
+                yield bytes(chunk)
+            await task
+
+        # Клиент отключился: прерываем COPY, соединение не возвращается в пул посреди выгрузки
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await connection.invalidate()
@@ -0,0 +1,288 @@
+import asyncio
+import heapq
+import json
+import math
+import os
+import socket
+import time
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config.config import settings
+from app.db.database import async_session_maker
+
+# Отчет воркера учитывается, пока тот пропустил меньше этого числа публикаций
+REPORT_MAX_AGE_INTERVALS = 3
+# Отчеты остановленных воркеров удаляются позже, чтобы не мешать медленным
+STALE_REPORT_INTERVALS = 20
+
+PUBLISH_REPORT_STMT = text("""
+    INSERT INTO hot_wallet_reports (worker, report, reported_at)
+        VALUES (:worker, CAST(:report AS jsonb), now())
+    ON CONFLICT (worker) DO UPDATE SET report = excluded.report, reported_at = excluded.reported_at
+""")
+
+DELETE_STALE_REPORTS_STMT = text("""
+    DELETE FROM hot_wallet_reports WHERE reported_at < now() - make_interval(secs => :max_age)
+""")
+
+SELECT_REPORTS_STMT = text("""
+    SELECT report FROM hot_wallet_reports WHERE reported_at >= now() - make_interval(secs => :max_age)
+""")
+
+
+class CountMinSketch:
+    """
+    Count-min sketch: оценка суммы весов ключа сверху в памяти width * depth
+    независимо от числа ключей
+    """
+
+    def __init__(self, width: int, depth: int):
+        """
+        :param width: Счетчиков в строке, ошибка оценки - порядка суммы весов / width
+        :param depth: Число строк (хеш-функций), вероятность большой ошибки падает экспоненциально
+        """
+        self.width = width
+        self.depth = depth
+        self._rows = [[0.0] * width for _ in range(depth)]
+
+    def _indexes(self, key: str) -> list[int]:
+        # Двойное хеширование: по индексу в каждой строке из одного хеша
+        hashed = hash(key)
+        step = (hashed >> 32) | 1
+        return [(hashed + row * step) % self.width for row in range(self.depth)]
+
+    def add(self, key: str, weight: float) -> float:
+        """
+        :return: Оценка суммы весов ключа после добавления
+        """
+        estimate = math.inf
+        for row, index in zip(self._rows, self._indexes(key)):
+            row[index] += weight
+            if row[index] < estimate:
+                estimate = row[index]
+        return estimate
+
+    def estimate(self, key: str) -> float:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+
+class HeavyHitters:
+    """
+    Ключи с наибольшей суммой весов: оценки из count-min sketch и ограниченный набор кандидатов.
+    Ключ попадает в кандидаты, если его оценка больше наименьшей среди оставленных при последней чистке.
+    """
+
+    def __init__(self, capacity: int, width: int, depth: int):
+        """
+        :param capacity: Число отслеживаемых ключей, кандидатов хранится не больше 2 * capacity
+        :param width: Ширина sketch
+        :param depth: Глубина sketch
+        """
+        self.capacity = capacity
+        self.sketch = CountMinSketch(width, depth)
+        self._candidates: dict[str, float] = {}
+        self._threshold = 0.0
+
+    def add(self, key: str, weight: float = 1.0) -> None:
+        estimate = self.sketch.add(key, weight)
+        if key in self._candidates or estimate > self._threshold or len(self._candidates) < self.capacity:
+            self._candidates[key] = estimate
+            if len(self._candidates) > 2 * self.capacity:
+                self._prune()
+
+    def _prune(self) -> None:
+        kept = heapq.nlargest(self.capacity, self._candidates.items(), key=lambda item: item[1])
+        self._candidates = dict(kept)
+        self._threshold = kept[-1][1]
+
+    def estimate(self, key: str) -> float:
+        return self.sketch.estimate(key)
+
+    def top(self, limit: int) -> list[tuple[str, float]]:
+        """
+        :return: До limit ключей с наибольшей оценкой, по убыванию
+        """
+        return heapq.nlargest(limit, self._candidates.items(), key=lambda item: item[1])
+
+
+class HotWalletWindow:
+    """
+    Счетчики запросов и ожидания блокировок за одно окно
+    """
+
+    def __init__(self, started_at: float, capacity: int, width: int, depth: int):
+        self.started_at = started_at
+        self.requests = HeavyHitters(capacity, width, depth)
+        self.lock_wait = HeavyHitters(capacity, width, depth)
+
+
+class HotWalletTracker:
+    """
+    Интерфейс учета нагрузки на кошельки
+    """
+
+    def record_request(self, wallet_uuid: str) -> None:
+        raise NotImplementedError
+
+    def record_lock_wait(self, wallet_uuid: str, seconds: float) -> None:
+        raise NotImplementedError
+
+    def report(self) -> dict:
+        raise NotImplementedError
+
+
+class NullHotWalletTracker(HotWalletTracker):
+    """
+    Отключенный учет
+    """
+
+    def record_request(self, wallet_uuid: str) -> None:
+        pass
+
+    def record_lock_wait(self, wallet_uuid: str, seconds: float) -> None:
+        pass
+
+    def report(self) -> dict:
+        return {"window_s": 0.0, "wallets": {}}
+
+
+class SketchHotWalletTracker(HotWalletTracker):
+    """
+    Самые нагруженные кошельки воркера по числу операций и времени ожидания блокировки строки.
+    Учет идет окнами: отчет покрывает текущее и предыдущее окно, поэтому старая нагрузка
+    забывается, а память не зависит от числа кошельков.
+    """
+
+    def __init__(self, capacity: int, width: int, depth: int, window: float):
+        """
+        :param capacity: Кошельков в отчете воркера
+        :param width: Ширина count-min sketch
+        :param depth: Глубина count-min sketch
+        :param window: Длительность окна в секундах
+        """
+        self.capacity = capacity
+        self.width = width
+        self.depth = depth
+        self.window = window
+        self._current = self._new_window(time.monotonic())
+        self._previous: HotWalletWindow | None = None
+
+    def _new_window(self, started_at: float) -> HotWalletWindow:
+        return HotWalletWindow(started_at, self.capacity, self.width, self.depth)
+
+    def _rotate(self) -> HotWalletWindow:
+        now = time.monotonic()
+        if now - self._current.started_at >= self.window:
+            # Простой дольше окна: предыдущее окно тоже устарело
+            if now - self._current.started_at >= 2 * self.window:
+                self._previous = None
+            else:
+                self._previous = self._current
+            self._current = self._new_window(now)
+        return self._current
+
+    def record_request(self, wallet_uuid: str) -> None:
+        self._rotate().requests.add(str(wallet_uuid).lower())
+
+    def record_lock_wait(self, wallet_uuid: str, seconds: float) -> None:
+        self._rotate().lock_wait.add(str(wallet_uuid).lower(), seconds)
+
+    def report(self) -> dict:
+        """
+        :return: Длительность учета в секундах и по кошельку - число операций и ожидание блокировки в секундах
+        """
+        current = self._rotate()
+        windows = [current] if self._previous is None else [self._previous, current]
+
+        keys = set()
+        for window in windows:
+            keys.update(key for key, _ in window.requests.top(self.capacity))
+            keys.update(key for key, _ in window.lock_wait.top(self.capacity))
+
+        wallets = {
+            key: [
+                sum(window.requests.estimate(key) for window in windows),
+                sum(window.lock_wait.estimate(key) for window in windows),
+            ]
+            for key in keys
+        }
+        return {"window_s": time.monotonic() - windows[0].started_at, "wallets": wallets}
+
+
+def create_hot_wallet_tracker() -> HotWalletTracker:
+    """
+    Создает учет нагрузки на кошельки по настройкам
+    :return: Учет нагрузки
+    """
+    if not settings.HOT_WALLETS_TRACKING_ENABLED:
+        return NullHotWalletTracker()
+
+    return SketchHotWalletTracker(
+        capacity=settings.HOT_WALLETS_CAPACITY,
+        width=settings.HOT_WALLETS_SKETCH_WIDTH,
+        depth=settings.HOT_WALLETS_SKETCH_DEPTH,
+        window=settings.HOT_WALLETS_WINDOW_S,
+    )
+
+
+def merge_reports(reports: list[dict]) -> dict[str, dict]:
+    """
+    Объединяет отчеты воркеров: операции и ожидание складываются, частота - сумма частот воркеров
+    :param reports: Отчеты SketchHotWalletTracker.report
+    :return: По кошельку - операции, операций в секунду и ожидание блокировки в секундах
+    """
+    merged = {}
+    for report in reports:
+        window = max(report["window_s"], 1e-9)
+        for wallet_uuid, (requests, lock_wait) in report["wallets"].items():
+            item = merged.setdefault(wallet_uuid, {"requests": 0.0, "rate": 0.0, "lock_wait_s": 0.0})
+            item["requests"] += requests
+            item["rate"] += requests / window
+            item["lock_wait_s"] += lock_wait
+    return merged
+
+
+def worker_id() -> str:
+    # pid берется при вызове: воркеры gunicorn могут импортировать приложение до fork
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def publish_report(session: AsyncSession) -> None:
+    """
+    Записывает отчет воркера, заменяя его предыдущий отчет. Без commit.
+    """
+    report = json.dumps(hot_wallet_tracker.report())
+    await session.execute(PUBLISH_REPORT_STMT, {"worker": worker_id(), "report": report})
+
+
+async def collect_reports(max_age: float, session: AsyncSession) -> list[dict]:
+    """
+    :param max_age: Отчеты старше max_age секунд не учитываются (воркер остановлен)
+    :return: Отчеты воркеров
+    """
+    return list((await session.execute(SELECT_REPORTS_STMT, {"max_age": max_age})).scalars())
+
+
+async def run_reporter(
+        interval: float,
+        session_maker: async_sessionmaker[AsyncSession] = async_session_maker
+) -> None:
+    """
+    Фоновая задача публикации отчета воркера и удаления отчетов остановленных воркеров
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_maker() as session:
+                await publish_report(session)
+                await session.execute(DELETE_STALE_REPORTS_STMT, {"max_age": STALE_REPORT_INTERVALS * interval})
+                await session.commit()
+        except Exception as err:
+            logger.exception(f"Failed to publish hot wallets report {err}")
+
+
+# Экземпляр на процесс воркера
+hot_wallet_tracker = create_hot_wallet_tracker()
@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1 import ledger, sharding
+from app.api.v1.crud_services import DEPOSIT_STMT
+from app.api.v1.balance_cache import balance_cache
+from app.api.v1.hot_wallets import hot_wallet_tracker
+from app.api.v1.missing_wallets import missing_wallets
+from app.api.v1.notifications import publish_balances
+from app.api.v1.models import Operation, from_minor_units
+from app.config.config import settings
+from app.db.database import async_session_maker
+from app.exceptions import wallet_exceptions
+
+
+@dataclass
+class StoredResponse:
+    """
+    Сохраненный ответ на операцию с ключом идемпотентности
+    """
+    request_hash: str
+    status_code: int
+    body: str
+    expires_at: float
+
+
+class IdempotencyResponseCache:
+    """
+    Ограниченный LRU кэш сохраненных ответов: повторы не обращаются к БД
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: OrderedDict[str, StoredResponse] = OrderedDict()
+
+    def get(self, key: str) -> StoredResponse | None:
+        stored = self._data.get(key)
+        if stored is None:
+            return None
+
+        if stored.expires_at <= time.time():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return stored
+
+    def put(self, key: str, stored: StoredResponse) -> None:
+        self._data[key] = stored
+        self._data.move_to_end(key)
+
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+
+# Экземпляр на процесс воркера
+response_cache = IdempotencyResponseCache(settings.IDEMPOTENCY_CACHE_MAX_SIZE)
+
+
+SELECT_RESPONSE_STMT = text("""
+    SELECT request_hash, status_code, response, extract(epoch FROM expires_at)
+    FROM idempotency_keys
+    WHERE key = :key AND expires_at > now() AND status_code IS NOT NULL
+""")
+
+# Просроченный, но еще не удаленный ключ занимается заново
+RESERVE_KEY_STMT = text("""
+    INSERT INTO idempotency_keys (key, request_hash, expires_at)
+        VALUES (:key, :request_hash, now() + make_interval(secs => :ttl))
+    ON CONFLICT (key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash,
+            status_code = NULL,
+            response = NULL,
+            expires_at = EXCLUDED.expires_at
+        WHERE idempotency_keys.expires_at <= now()
+    RETURNING extract(epoch FROM expires_at)
+""")
+
+STORE_RESPONSE_STMT = text("""
+    UPDATE idempotency_keys
+    SET status_code = :status_code, response = :response
+    WHERE key = :key
+""")
+
+# Условие вместо нарушения balance_check: транзакция не прерывается и ответ можно сохранить
+WITHDRAW_STMT = text("""
+    UPDATE wallets
+    SET balance = balance - :amount
+    WHERE id = :wallet_uuid AND slot_count = 0 AND balance - :amount >= 0
+    RETURNING balance
+""")
+
+WALLET_SLOT_COUNT_STMT = text("""
+    SELECT slot_count FROM wallets WHERE id = :wallet_uuid
+""")
+
+SWEEP_STMT = text("""
+    DELETE FROM idempotency_keys
+    WHERE key IN (
+        SELECT key
+        FROM idempotency_keys
+        WHERE expires_at <= now()
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+""")
+
+
+def request_fingerprint(wallet_uuid: str, operation: Operation, amount: int) -> str:
+    """
+    Отпечаток запроса для проверки повторного использования ключа с другими параметрами
+    """
+    payload = f"{wallet_uuid.lower()}:{operation.value}:{amount}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def get_stored_response(key: str, session: AsyncSession) -> StoredResponse | None:
+    """
+    Ищет сохраненный ответ сначала в кэше воркера, затем в таблице
+    :param key: Ключ идемпотентности
+    :param session: Сессия для работы с БД
+    :return: Сохраненный ответ или None
+    """
+    stored = response_cache.get(key)
+    if stored is not None:
+        return stored
+
+    result = await session.execute(SELECT_RESPONSE_STMT, {"key": key})
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    stored = StoredResponse(request_hash=row[0], status_code=row[1], body=row[2], expires_at=float(row[3]))
+    response_cache.put(key, stored)
+    return stored
+
+
+def check_fingerprint(key: str, stored: StoredResponse, request_hash: str) -> StoredResponse:
+    """
+    Проверяет, что ключ повторно используется для того же запроса
+    """
+    if stored.request_hash != request_hash:
+        raise wallet_exceptions.IdempotencyKeyReusedError(key=key)
+    return stored
+
+
+async def apply_operation(wallet_uuid: str, operation: Operation, amount: int, session: AsyncSession) -> int:
+    """
+    Операция с кошельком в транзакции ключа. Ошибки выбрасываются до изменения данных,
+    поэтому транзакция остается пригодной для сохранения ответа.
+    :return: Баланс кошелька после операции
+    """
+    if settings.WALLET_STORAGE_ENGINE == "ledger":
+        return await ledger.append_operation(wallet_uuid, operation, amount, session)
+
+    params = {"wallet_uuid": wallet_uuid, "amount": amount}
+    stmt = DEPOSIT_STMT if operation == Operation.DEPOSIT else WITHDRAW_STMT
+    started = time.perf_counter()
+    new_balance = (await session.execute(stmt, params)).scalar_one_or_none()
+    hot_wallet_tracker.record_lock_wait(wallet_uuid, time.perf_counter() - started)
+    if new_balance is not None:
+        return new_balance
+
+    slot_count = (await session.execute(WALLET_SLOT_COUNT_STMT, params)).scalar_one_or_none()
+    if slot_count is None:
+        raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+    if slot_count == 0 and operation == Operation.WITHDRAW:
+        raise wallet_exceptions.WalletBalanceError(wallet_uuid=wallet_uuid)
+
+    return await sharding.sharded_wallet_operation(wallet_uuid, operation, amount, session)
+
+
+async def idempotent_wallet_operation(
+        key: str,
+        wallet_uuid: str,
+        operation: Operation,
+        amount: int,
+        session: AsyncSession
+) -> tuple[StoredResponse, bool]:
+    """
+    Выполняет операцию с кошельком не более одного раза для ключа.
+    Ключ и ответ сохраняются в той же транзакции, что и изменение баланса.
+    :param key: Ключ идемпотентности
+    :param wallet_uuid: UUID кошелька
+    :param operation: Тип операции
+    :param amount: Сумма операции в минимальных единицах
+    :param session: Сессия для работы с БД
+    :return: Ответ на операцию и признак повтора
+    """
+    hot_wallet_tracker.record_request(wallet_uuid)
+    request_hash = request_fingerprint(wallet_uuid, operation, amount)
+
+    stored = await get_stored_response(key, session)
+    if stored is not None:
+        return check_fingerprint(key, stored, request_hash), True
+
+    result = await session.execute(
+        RESERVE_KEY_STMT,
+        {"key": key, "request_hash": request_hash, "ttl": settings.IDEMPOTENCY_KEY_TTL_S}
+    )
+    expires_at = result.scalar_one_or_none()
+
+    # Ключ занят параллельным запросом: INSERT дождался его commit, ответ уже сохранен
+    if expires_at is None:
+        await session.rollback()
+        stored = await get_stored_response(key, session)
+        if stored is None:
+            raise RuntimeError(f"Idempotency key {key} is reserved without a stored response")
+        return check_fingerprint(key, stored, request_hash), True
+
+    try:
+        new_balance = await apply_operation(wallet_uuid, operation, amount, session)
+        status_code, body = 200, {"status": "success", "balance": from_minor_units(new_balance)}
+    except wallet_exceptions.WalletNotFoundError:
+        new_balance, status_code, body = None, 404, {"detail": "Wallet not found"}
+    except wallet_exceptions.WalletBalanceError as err:
+        new_balance, status_code, body = None, 400, {"detail": str(err)}
+
+    stored = StoredResponse(
+        request_hash=request_hash,
+        status_code=status_code,
+        # Разделители и кодировка - как у JSONResponse и codec: повтор побайтно совпадает с ответом без ключа
+        body=json.dumps(body, separators=(",", ":"), ensure_ascii=False),
+        expires_at=float(expires_at)
+    )
+    await session.execute(STORE_RESPONSE_STMT, {"key": key, "status_code": status_code, "response": stored.body})
+    if new_balance is not None:
+        await publish_balances({wallet_uuid: new_balance}, session)
+    await session.commit()
+
+    response_cache.put(key, stored)
+    if new_balance is not None:
+        balance_cache.set(wallet_uuid, new_balance)
+    elif status_code == 404:
+        missing_wallets.add(wallet_uuid)
+
+    return stored, False
+
+
+async def sweep_expired_keys(
+        batch_size: int,
+        session_maker: async_sessionmaker[AsyncSession] = async_session_maker
+) -> int:
+    """
+    Удаляет просроченные ключи пачками, каждая пачка - отдельная транзакция
+    :param batch_size: Ключей в одной пачке
+    :param session_maker: Фабрика сессий БД
+    :return: Количество удаленных ключей
+    """
+    deleted = 0
+    while True:
+        async with session_maker() as session:
+            result = await session.execute(SWEEP_STMT, {"batch_size": batch_size})
+            await session.commit()
+
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+async def run_sweeper(interval: float, batch_size: int) -> None:
+    """
+    Фоновая задача периодической очистки просроченных ключей
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            deleted = await sweep_expired_keys(batch_size)
+            if deleted:
+                logger.info(f"Swept {deleted} expired idempotency keys")
+        except Exception as err:
+            logger.exception(f"Failed to sweep idempotency keys {err}")
@@ -0,0 +1,382 @@
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.api.v1 import sharding
+from app.api.v1.hot_wallets import hot_wallet_tracker
+from app.api.v1.notifications import publish_balances
+from app.api.v1.models import Operation
+from app.config.config import settings
+from app.db.database import async_session_maker, engine
+from app.exceptions import wallet_exceptions
+
+
+# Баланс кошелька = проекция в wallets (и слотах) + записи журнала после ledger_watermark.
+# Запись в журнал идет под разделяемой advisory блокировкой, проекция берет исключительную
+# только чтобы дождаться завершения начатых записей: все id до найденного максимума уже закоммичены.
+LEDGER_LOCK_KEY = 7_304_157_211
+# Проецирует один воркер: остальные пропускают проход, а не ждут исключительную блокировку
+LEDGER_PROJECTOR_LOCK_KEY = 7_304_157_212
+
+WRITE_LOCK_STMT = text("""
+    SELECT pg_advisory_xact_lock_shared(:key)
+""")
+
+TRY_PROJECTOR_LOCK_STMT = text("""
+    SELECT pg_try_advisory_lock(:key)
+""")
+
+PROJECTOR_UNLOCK_STMT = text("""
+    SELECT pg_advisory_unlock(:key)
+""")
+
+BARRIER_STMT = text("""
+    SELECT pg_advisory_xact_lock(:key)
+""")
+
+LEDGER_HORIZON_STMT = text("""
+    SELECT coalesce(max(id), 0) FROM wallet_ledger
+""")
+
+UNPROJECTED_STMT = text("""
+    SELECT wallet_id, sum(amount)::bigint
+    FROM wallet_ledger
+    WHERE wallet_id = ANY(CAST(:wallet_ids AS uuid[]))
+        AND id > (SELECT coalesce(max(position), 0) FROM ledger_watermark)
+    GROUP BY wallet_id
+""")
+
+GET_BALANCE_STMT = text("""
+    SELECT (w.balance
+        + CASE WHEN w.slot_count > 0
+            THEN (SELECT coalesce(sum(s.balance), 0) FROM wallet_slots s WHERE s.wallet_id = w.id)
+            ELSE 0 END
+        + coalesce((
+            SELECT sum(l.amount)
+            FROM wallet_ledger l
+            WHERE l.wallet_id = w.id AND l.id > (SELECT coalesce(max(position), 0) FROM ledger_watermark)
+        ), 0))::bigint
+    FROM wallets w
+    WHERE w.id = :wallet_uuid
+""")
+
+INIT_WATERMARK_STMT = text("""
+    INSERT INTO ledger_watermark (id, position) VALUES (1, 0) ON CONFLICT (id) DO NOTHING
+""")
+
+LOCK_WATERMARK_STMT = text("""
+    SELECT position FROM ledger_watermark WHERE id = 1 FOR UPDATE
+""")
+
+SET_WATERMARK_STMT = text("""
+    UPDATE ledger_watermark SET position = :position WHERE id = 1
+""")
+
+LEDGER_DELTA_STMT = text("""
+    SELECT wallet_id, sum(amount)::bigint
+    FROM wallet_ledger
+    WHERE id > :start AND id <= :end
+    GROUP BY wallet_id
+""")
+
+
+async def lock_wallet_balances(
+        wallet_ids: list,
+        session: AsyncSession
+) -> tuple[dict[str, int], set[str]]:
+    """
+    Блокирует кошельки для записи в журнал и возвращает их текущие балансы с учетом журнала
+    :param wallet_ids: UUID кошельков
+    :param session: Сессия для работы с БД
+    :return: Полные балансы найденных кошельков и множество разбитых на слоты
+    """
+    started = time.perf_counter()
+    await session.execute(WRITE_LOCK_STMT, {"key": LEDGER_LOCK_KEY})
+    balances, sharded = await sharding.lock_wallet_balances(wallet_ids, session)
+    # Ожидание блокировки всех строк приписывается каждому кошельку
+    lock_wait = time.perf_counter() - started
+    for wallet_id in balances:
+        hot_wallet_tracker.record_lock_wait(wallet_id, lock_wait)
+
+    # Отдельный запрос после блокировки строк: его снимок видит проекцию, которую ждала блокировка
+    if balances:
+        result = await session.execute(UNPROJECTED_STMT, {"wallet_ids": list(balances)})
+        for wallet_id, amount in result.all():
+            balances[str(wallet_id)] += amount
+
+    return balances, sharded
+
+
+async def append_entries(entries: list[tuple[str, int]], session: AsyncSession) -> None:
+    """
+    Добавляет записи в журнал одним COPY в текущей транзакции сессии
+    :param entries: Пары (UUID кошелька, изменение баланса со знаком)
+    :param session: Сессия, в которой кошельки заблокированы через lock_wallet_balances
+    """
+    if not entries:
+        return
+
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        "wallet_ledger",
+        records=[(uuid.UUID(str(wallet_id)), amount) for wallet_id, amount in entries],
+        columns=["wallet_id", "amount"],
+    )
+
+
+async def append_operations(
+        operations: list[tuple[str, Operation, int]],
+        session: AsyncSession
+) -> list[int | Exception]:
+    """
+    Проверяет операции по текущему балансу с учетом журнала и добавляет успешные в журнал. Без commit.
+    :param operations: Тройки (UUID кошелька, тип операции, сумма) в порядке применения
+    :param session: Сессия для работы с БД
+    :return: Баланс после операции или исключение для каждой операции
+    """
+    balances, _ = await lock_wallet_balances(sorted({wallet_uuid for wallet_uuid, _, _ in operations}), session)
+
+    outcomes, entries = [], []
+    for wallet_uuid, operation, amount in operations:
+        key = wallet_uuid.lower()
+        balance = balances.get(key)
+
+        if balance is None:
+            outcomes.append(wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid))
+            continue
+
+        delta = amount if operation == Operation.DEPOSIT else -amount
+        if balance + delta < 0:
+            outcomes.append(wallet_exceptions.WalletBalanceError(wallet_uuid=wallet_uuid))
+            continue
+
+        balances[key] = balance + delta
+        entries.append((key, delta))
+        outcomes.append(balances[key])
+
+    await append_entries(entries, session)
+    return outcomes
+
+
+async def append_operation(wallet_uuid: str, operation: Operation, amount: int, session: AsyncSession) -> int:
+    """
+    Одна операция через журнал в транзакции вызывающего. Без commit.
+    :return: Баланс кошелька после операции
+    """
+    outcome = (await append_operations([(wallet_uuid, operation, amount)], session))[0]
+    if isinstance(outcome, Exception):
+        raise outcome
+    return outcome
+
+
+async def get_wallet_balance(wallet_uuid: str, session: AsyncSession) -> int:
+    """
+    Возвращает баланс кошелька: проекция плюс еще не учтенные записи журнала
+    :param wallet_uuid: UUID кошелька
+    :param session: Сессия для работы с БД
+    :return: Баланс кошелька
+    """
+    balance = (await session.execute(GET_BALANCE_STMT, {"wallet_uuid": wallet_uuid})).scalar_one_or_none()
+    if balance is None:
+        raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+    return balance
+
+
+@dataclass
+class PendingEntry:
+    """
+    Операция, ожидающая записи в журнал
+    """
+    wallet_uuid: str
+    operation: Operation
+    amount: int
+    future: asyncio.Future
+
+
+class LedgerWriter:
+    """
+    Собирает операции всех кошельков за такт и записывает их в журнал одним COPY
+    в одной транзакции. Снятия проверяются по балансу с учетом еще не учтенных
+    в проекции записей, каждый вызывающий получает свой баланс после своей операции.
+    """
+
+    def __init__(
+            self,
+            interval: float,
+            max_batch: int,
+            session_maker: async_sessionmaker[AsyncSession] = async_session_maker
+    ):
+        """
+        :param interval: Такт записи в секундах
+        :param max_batch: Размер пачки, при достижении которого она записывается сразу
+        :param session_maker: Фабрика сессий БД
+        """
+        self.interval = interval
+        self.max_batch = max_batch
+        self._session_maker = session_maker
+        self._batch: list[PendingEntry] | None = None
+        self._tasks: set[asyncio.Task] = set()
+        # Пачки пишутся по одной: запись журнала занимает не больше одного соединения пула
+        self._flush_lock = asyncio.Lock()
+
+    async def submit(self, wallet_uuid: str, operation: Operation, amount: int) -> int:
+        """
+        Ставит операцию в текущую пачку и ждет ее записи
+        :param wallet_uuid: UUID кошелька
+        :param operation: Тип операции
+        :param amount: Сумма операции в минимальных единицах
+        :return: Баланс кошелька после этой операции
+        """
+        # Некорректный UUID не должен ронять CAST для всей пачки
+        try:
+            uuid.UUID(wallet_uuid)
+        except ValueError:
+            raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self._batch
+        if batch is None:
+            batch = self._batch = []
+            loop.call_later(self.interval, self._start_flush, batch)
+
+        batch.append(PendingEntry(wallet_uuid, operation, amount, future))
+
+        if len(batch) >= self.max_batch:
+            self._start_flush(batch)
+
+        return await future
+
+    def _start_flush(self, batch: list[PendingEntry]) -> None:
+        # Пачка могла уже уйти на запись по размеру
+        if self._batch is not batch:
+            return
+        self._batch = None
+
+        task = asyncio.create_task(self._flush(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch: list[PendingEntry]) -> None:
+        async with self._flush_lock:
+            await self._write(batch)
+
+    async def _write(self, batch: list[PendingEntry]) -> None:
+        # Операции отмененных запросов не записываем
+        batch = [item for item in batch if not item.future.done()]
+        if not batch:
+            return
+
+        try:
+            async with self._session_maker() as session:
+                outcomes = await append_operations(
+                    [(item.wallet_uuid, item.operation, item.amount) for item in batch],
+                    session
+                )
+                # Последний баланс каждого кошелька пачки
+                await publish_balances({
+                    item.wallet_uuid.lower(): outcome
+                    for item, outcome in zip(batch, outcomes) if not isinstance(outcome, Exception)
+                }, session)
+                await session.commit()
+
+        except Exception as err:
+            logger.exception("Failed to write ledger batch")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(err)
+            return
+
+        for item, outcome in zip(batch, outcomes):
+            if item.future.done():
+                continue
+            if isinstance(outcome, Exception):
+                item.future.set_exception(outcome)
+            else:
+                item.future.set_result(outcome)
+
+
+# Экземпляр на процесс воркера
+ledger_writer = LedgerWriter(
+    interval=settings.LEDGER_FLUSH_INTERVAL_MS / 1000,
+    max_batch=settings.LEDGER_FLUSH_MAX_BATCH,
+)
+
+
+async def project_ledger(batch_size: int, db_engine: AsyncEngine = engine) -> int:
+    """
+    Переносит записи журнала в балансы кошельков пачками по id,
+    каждая пачка - отдельная транзакция вместе со сдвигом ledger_watermark.
+    Если проекцию уже выполняет другой воркер, проход пропускается.
+    :param batch_size: Записей журнала в одной пачке
+    :param db_engine: Движок БД
+    :return: На сколько позиций сдвинут ledger_watermark
+    """
+    # Блокировка уровня сессии Postgres держится на соединении: весь проход - на одном,
+    # иначе после commit пачки соединение вернется в пул вместе с блокировкой
+    async with db_engine.connect() as connection, AsyncSession(bind=connection, expire_on_commit=False) as session:
+        if not (await session.execute(TRY_PROJECTOR_LOCK_STMT, {"key": LEDGER_PROJECTOR_LOCK_KEY})).scalar_one():
+            await session.commit()
+            return 0
+
+        try:
+            # Дожидаемся начатых записей: после этого все id до horizon видны
+            await session.execute(BARRIER_STMT, {"key": LEDGER_LOCK_KEY})
+            horizon = (await session.execute(LEDGER_HORIZON_STMT)).scalar_one()
+            await session.commit()
+
+            projected = 0
+            while True:
+                await session.execute(INIT_WATERMARK_STMT)
+                start = (await session.execute(LOCK_WATERMARK_STMT)).scalar_one()
+                if start >= horizon:
+                    await session.commit()
+                    return projected
+
+                end = min(horizon, start + batch_size)
+                result = await session.execute(LEDGER_DELTA_STMT, {"start": start, "end": end})
+                deltas = {str(wallet_id): amount for wallet_id, amount in result.all()}
+
+                if deltas:
+                    balances, sharded = await sharding.lock_wallet_balances(sorted(deltas), session)
+                    await sharding.write_wallet_balances(
+                        {wallet_id: balances[wallet_id] + delta for wallet_id, delta in deltas.items()},
+                        sharded,
+                        session
+                    )
+
+                await session.execute(SET_WATERMARK_STMT, {"position": end})
+                await session.commit()
+
+                projected += end - start
+        finally:
+            await session.rollback()
+            await session.execute(PROJECTOR_UNLOCK_STMT, {"key": LEDGER_PROJECTOR_LOCK_KEY})
+            await session.commit()
+
+
+async def run_projector(interval: float, batch_size: int) -> None:
+    """
+    Фоновая задача периодической проекции журнала в балансы (WALLET_STORAGE_ENGINE=ledger)
+    """
+    while True:
+        await asyncio.sleep(interval)
+        await drain_ledger(batch_size)
+
+
+async def drain_ledger(batch_size: int) -> None:
+    """
+    Однократная проекция журнала. При WALLET_STORAGE_ENGINE=update - при старте воркера,
+    чтобы перенести записи, оставшиеся после смены режима
+    """
+    try:
+        await project_ledger(batch_size)
+    except Exception as err:
+        logger.exception(f"Failed to project wallet ledger {err}")
@@ -0,0 +1,116 @@
+import time
+from collections import OrderedDict
+
+from app.config.config import settings
+
+
+class MissingWalletFilter:
+    """
+    Интерфейс фильтра кошельков, отсутствие которых недавно подтвердила основная БД.
+    UUID кошельков генерирует БД при создании, поэтому заранее запрошенный UUID почти
+    наверняка так и не появится; TTL ограничивает ошибку, если все-таки появится в другом воркере.
+    """
+
+    def contains(self, wallet_uuid: str) -> bool:
+        raise NotImplementedError
+
+    def add(self, wallet_uuid: str) -> None:
+        raise NotImplementedError
+
+    def discard(self, wallet_uuid: str) -> None:
+        """
+        Снимает отметку при создании кошелька в этом воркере
+        """
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class NullMissingWalletFilter(MissingWalletFilter):
+    """
+    Отключенный фильтр: каждый запрос идет в БД
+    """
+
+    def contains(self, wallet_uuid: str) -> bool:
+        return False
+
+    def add(self, wallet_uuid: str) -> None:
+        pass
+
+    def discard(self, wallet_uuid: str) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"enabled": False}
+
+
+class LRUMissingWalletFilter(MissingWalletFilter):
+    """
+    Ограниченное по размеру LRU множество отсутствующих кошельков с TTL.
+    В отличие от фильтра Блума не дает ложных срабатываний и позволяет снять отметку.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        :param max_size: Максимальное число кошельков в фильтре
+        :param ttl: Время жизни отметки в секундах
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[str, float] = OrderedDict()
+        self.hits = 0
+        self.evictions = 0
+
+    def contains(self, wallet_uuid: str) -> bool:
+        expires_at = self._data.get(wallet_uuid)
+        if expires_at is None:
+            return False
+
+        if expires_at <= time.monotonic():
+            del self._data[wallet_uuid]
+            return False
+
+        self._data.move_to_end(wallet_uuid)
+        self.hits += 1
+        return True
+
+    def add(self, wallet_uuid: str) -> None:
+        self._data[wallet_uuid] = time.monotonic() + self.ttl
+        self._data.move_to_end(wallet_uuid)
+
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, wallet_uuid: str) -> None:
+        if self._data:
+            self._data.pop(wallet_uuid, None)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "evictions": self.evictions,
+        }
+
+
+def create_missing_wallet_filter() -> MissingWalletFilter:
+    """
+    Создает фильтр отсутствующих кошельков по настройкам
+    :return: Фильтр отсутствующих кошельков
+    """
+    if not settings.MISSING_WALLETS_CACHE_ENABLED:
+        return NullMissingWalletFilter()
+
+    return LRUMissingWalletFilter(
+        max_size=settings.MISSING_WALLETS_CACHE_MAX_SIZE,
+        ttl=settings.MISSING_WALLETS_CACHE_TTL_S,
+    )
+
+
+# Экземпляр на процесс воркера
+missing_wallets = create_missing_wallet_filter()
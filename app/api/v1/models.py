@@ -1,26 +1,80 @@
+from decimal import Decimal
 from enum import Enum
+from typing import Annotated
 import uuid
 
-from pydantic import BaseModel, condecimal
+from pydantic import AfterValidator, BaseModel, Field, PlainSerializer, condecimal, model_validator
+
+from app.config.config import settings
+
+
+# Внутри приложения суммы и балансы - int в минимальных единицах (10 ** BALANCE_SCALE на единицу).
+# Перевод из Decimal запроса и обратно в число ответа выполняется только здесь.
+MINOR_UNITS = 10 ** settings.BALANCE_SCALE
+# Предел bigint в БД
+MAX_MINOR_UNITS = 2 ** 63 - 1
+
+
+def to_minor_units(value: Decimal) -> int:
+    """
+    Переводит сумму в минимальные единицы, не допуская дробных минимальных единиц
+    """
+    minor = value.scaleb(settings.BALANCE_SCALE)
+    if minor != minor.to_integral_value():
+        raise ValueError(f"Amount must have at most {settings.BALANCE_SCALE} decimal places")
+    if minor > MAX_MINOR_UNITS:
+        raise ValueError("Amount is too large")
+    return int(minor)
+
+
+def from_minor_units(value: int) -> float:
+    """
+    Число для ответа: деление int на int округляется корректно, поэтому запись float
+    совпадает с точным десятичным значением до 15 значащих цифр
+    """
+    return value / MINOR_UNITS
+
+
+Amount = Annotated[condecimal(gt=0), AfterValidator(to_minor_units)]
+InitialBalance = Annotated[condecimal(ge=0), AfterValidator(to_minor_units)]
+Balance = Annotated[int, PlainSerializer(from_minor_units, return_type=float)]
+
 
 class Operation(str, Enum):
     DEPOSIT = "DEPOSIT"
     WITHDRAW = "WITHDRAW"
 
 
+class BatchMode(str, Enum):
+    ATOMIC = "ATOMIC"
+    BEST_EFFORT = "BEST_EFFORT"
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+class OperationStatus(str, Enum):
+    SUCCESS = "success"
+    NOT_FOUND = "not_found"
+    INSUFFICIENT_FUNDS = "insufficient_funds"
+    ROLLED_BACK = "rolled_back"
+
+
 class OperationResponse(BaseModel):
     """
     Модель ответа на операцию
     """
     status: str
-    balance: float
+    balance: Balance
 
 
 class WalletBalanceResponse(BaseModel):
     """
     Модель ответа на запрос баланса
     """
-    balance: float
+    balance: Balance
 
 
 class WalletOperation(BaseModel):
@@ -28,7 +82,7 @@ class WalletOperation(BaseModel):
     Операция с кошельком
     """
     operation: Operation
-    amount: condecimal(gt=0)
+    amount: Amount
 
 
 class WalletUUIDResponse(BaseModel):
@@ -38,4 +92,139 @@ class WalletUUIDResponse(BaseModel):
     id_: uuid.UUID
 
     def __str__(self):
-        return str(self.id_)
\ No newline at end of file
+        return str(self.id_)
+
+
+class BatchOperationItem(BaseModel):
+    """
+    Операция с кошельком в составе пакета
+    """
+    wallet_uuid: uuid.UUID
+    operation: Operation
+    amount: Amount
+
+
+class BatchOperationRequest(BaseModel):
+    """
+    Пакет операций с кошельками
+    """
+    mode: BatchMode = BatchMode.BEST_EFFORT
+    operations: list[BatchOperationItem] = Field(min_length=1, max_length=settings.BATCH_MAX_OPERATIONS)
+
+
+class BatchOperationResult(BaseModel):
+    """
+    Результат операции в составе пакета
+    """
+    wallet_uuid: uuid.UUID
+    status: OperationStatus
+    balance: Balance | None = None
+
+
+class BatchOperationResponse(BaseModel):
+    """
+    Модель ответа на пакет операций
+    """
+    applied: bool
+    results: list[BatchOperationResult]
+
+
+class WalletTransfer(BaseModel):
+    """
+    Перевод между кошельками
+    """
+    from_wallet_uuid: uuid.UUID
+    to_wallet_uuid: uuid.UUID
+    amount: Amount
+
+    @model_validator(mode="after")
+    def check_distinct_wallets(self):
+        if self.from_wallet_uuid == self.to_wallet_uuid:
+            raise ValueError("Source and destination wallets must differ")
+        return self
+
+
+class TransferResponse(BaseModel):
+    """
+    Модель ответа на перевод
+    """
+    status: str
+    from_balance: Balance
+    to_balance: Balance
+
+
+class BatchTransferRequest(BaseModel):
+    """
+    Пакет переводов между кошельками
+    """
+    mode: BatchMode = BatchMode.BEST_EFFORT
+    transfers: list[WalletTransfer] = Field(min_length=1, max_length=settings.BATCH_MAX_OPERATIONS)
+
+
+class BatchTransferResult(BaseModel):
+    """
+    Результат перевода в составе пакета
+    """
+    from_wallet_uuid: uuid.UUID
+    to_wallet_uuid: uuid.UUID
+    status: OperationStatus
+    from_balance: Balance | None = None
+    to_balance: Balance | None = None
+
+
+class BatchTransferResponse(BaseModel):
+    """
+    Модель ответа на пакет переводов
+    """
+    applied: bool
+    results: list[BatchTransferResult]
+
+
+class WalletBalancesRequest(BaseModel):
+    """
+    Список кошельков для чтения балансов
+    """
+    wallet_uuids: list[uuid.UUID] = Field(min_length=1, max_length=settings.BALANCES_MAX_WALLETS)
+
+
+class WalletBalanceItem(BaseModel):
+    """
+    Баланс кошелька в ответе на чтение списком
+    """
+    wallet_uuid: uuid.UUID
+    balance: Balance
+
+
+class WalletBalancesResponse(BaseModel):
+    """
+    Модель ответа на чтение балансов списком
+    """
+    balances: list[WalletBalanceItem]
+    missing: list[uuid.UUID]
+
+
+class BulkCreateWalletsRequest(BaseModel):
+    """
+    Массовое создание кошельков: либо count кошельков с одинаковым балансом,
+    либо по кошельку на каждый баланс из balances
+    """
+    count: int | None = Field(default=None, gt=0, le=settings.BULK_CREATE_MAX_WALLETS)
+    initial_balance: InitialBalance = 0
+    balances: list[InitialBalance] | None = Field(
+        default=None,
+        min_length=1,
+        max_length=settings.BULK_CREATE_MAX_WALLETS
+    )
+
+    @model_validator(mode="after")
+    def check_count_or_balances(self):
+        if (self.count is None) == (self.balances is None):
+            raise ValueError("Either count or balances must be provided")
+        return self
+
+
+class WalletShardsRequest(BaseModel):
+    """
+    Количество слотов баланса кошелька, 0 - собрать баланс обратно в одну строку
+    """
+    slots: int = Field(ge=0, le=settings.WALLET_SHARD_MAX_SLOTS)
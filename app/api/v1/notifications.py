@@ -0,0 +1,176 @@
+import asyncio
+
+import asyncpg
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.config import settings
+from app.exceptions.db_exceptions import DatabaseOverloadedError
+from app.metrics.metrics import BALANCE_SUBSCRIBERS, BALANCE_UPDATES
+
+CHANNEL = "wallet_balances"
+
+# Уведомление - "<uuid кошелька>:<баланс в минимальных единицах>", отправляется при commit транзакции.
+# Уведомления разных транзакций доставляются в порядке commit, поэтому последнее - актуальный баланс.
+PUBLISH_STMT = text(f"""
+    SELECT count(pg_notify('{CHANNEL}', payload)) FROM unnest(CAST(:payloads AS text[])) AS payload
+""")
+
+
+async def publish_balances(balances: dict[str, int], session: AsyncSession) -> None:
+    """
+    Публикует новые балансы в транзакции сессии, до commit. Без commit.
+    :param balances: Балансы измененных кошельков
+    :param session: Сессия для работы с БД
+    """
+    if not settings.BALANCE_NOTIFY_ENABLED or not balances:
+        return
+
+    payloads = [f"{str(wallet_uuid).lower()}:{balance}" for wallet_uuid, balance in balances.items()]
+    await session.execute(PUBLISH_STMT, {"payloads": payloads})
+
+
+class BalanceSubscription:
+    """
+    Подписка на балансы кошельков. Буфер - последний баланс каждого кошелька, поэтому
+    его размер ограничен числом кошельков подписки, а промежуточные балансы медленный
+    подписчик пропускает.
+    """
+
+    def __init__(self, wallet_uuids: list[str]):
+        self.wallet_uuids = [wallet_uuid.lower() for wallet_uuid in wallet_uuids]
+        self.pending: dict[str, int] = {}
+        # Кошельки, по которым было уведомление после регистрации: снимок их не перетирает
+        self.notified: set[str] = set()
+        # Снимок балансов нужен после регистрации и после переподключения LISTEN
+        self.needs_snapshot = True
+        self._event = asyncio.Event()
+
+    def push(self, wallet_uuid: str, balance: int, snapshot: bool = False) -> None:
+        """
+        :param snapshot: Баланс прочитан запросом, а не получен уведомлением
+        """
+        if snapshot:
+            if wallet_uuid in self.notified:
+                return
+        else:
+            self.notified.add(wallet_uuid)
+
+        if wallet_uuid in self.pending:
+            BALANCE_UPDATES.labels("coalesced").inc()
+        self.pending[wallet_uuid] = balance
+        self._event.set()
+
+    def request_snapshot(self) -> None:
+        self.needs_snapshot = True
+        self.notified.clear()
+        self._event.set()
+
+    async def wait(self, timeout: float) -> dict[str, int]:
+        """
+        Ждет изменений не дольше timeout
+        :return: Последние балансы изменившихся кошельков, пустой словарь - изменений не было
+        """
+        if not self.pending and not self.needs_snapshot:
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except TimeoutError:
+                return {}
+
+        self._event.clear()
+        pending, self.pending = self.pending, {}
+        return pending
+
+
+class BalanceNotifier:
+    """
+    Одно соединение LISTEN на воркер и раздача уведомлений подпискам внутри процесса
+    """
+
+    def __init__(self, dsn: str, reconnect_interval: float):
+        """
+        :param dsn: Адрес БД для asyncpg
+        :param reconnect_interval: Пауза перед переподключением в секундах
+        """
+        self.dsn = dsn
+        self.reconnect_interval = reconnect_interval
+        self._subscriptions: dict[str, set[BalanceSubscription]] = {}
+        self._connected = asyncio.Event()
+
+    def _on_notification(self, connection, pid, channel, payload: str) -> None:
+        wallet_uuid, _, balance = payload.partition(":")
+        subscriptions = self._subscriptions.get(wallet_uuid)
+        if not subscriptions:
+            return
+
+        BALANCE_UPDATES.labels("received").inc()
+        for subscription in subscriptions:
+            subscription.push(wallet_uuid, int(balance))
+
+    async def run(self) -> None:
+        """
+        Фоновая задача: держит соединение LISTEN и переподключается при обрыве.
+        После переподключения подпискам нужен новый снимок - уведомления за время обрыва потеряны.
+        """
+        while True:
+            closed = asyncio.Event()
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(CHANNEL, self._on_notification)
+
+                self._connected.set()
+                for subscriptions in list(self._subscriptions.values()):
+                    for subscription in subscriptions:
+                        subscription.request_snapshot()
+
+                await closed.wait()
+                logger.warning("Balance notifications connection lost")
+
+            except asyncio.CancelledError:
+                if connection is not None:
+                    await connection.close()
+                raise
+
+            except Exception as err:
+                logger.warning(f"Balance notifications connection failed {err!r}")
+
+            finally:
+                self._connected.clear()
+
+            await asyncio.sleep(self.reconnect_interval)
+
+    async def subscribe(self, wallet_uuids: list[str]) -> BalanceSubscription:
+        """
+        Регистрирует подписку. Снимок балансов читается после регистрации,
+        чтобы не пропустить изменения между чтением и подпиской.
+        """
+        if not self._connected.is_set():
+            try:
+                await asyncio.wait_for(self._connected.wait(), self.reconnect_interval)
+            except TimeoutError:
+                raise DatabaseOverloadedError(
+                    retry_after=settings.ADMISSION_RETRY_AFTER_S,
+                    message="Balance notifications are unavailable, retry later"
+                )
+
+        subscription = BalanceSubscription(wallet_uuids)
+        for wallet_uuid in subscription.wallet_uuids:
+            self._subscriptions.setdefault(wallet_uuid, set()).add(subscription)
+        BALANCE_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: BalanceSubscription) -> None:
+        for wallet_uuid in subscription.wallet_uuids:
+            subscriptions = self._subscriptions.get(wallet_uuid)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[wallet_uuid]
+        BALANCE_SUBSCRIBERS.dec()
+
+
+# Экземпляр на процесс воркера
+balance_notifier = BalanceNotifier(settings.get_asyncpg_dsn, settings.BALANCE_NOTIFY_RECONNECT_INTERVAL_S)
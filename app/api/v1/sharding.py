@@ -0,0 +1,348 @@
+import asyncio
+import random
+import time
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1.hot_wallets import hot_wallet_tracker
+from app.api.v1.models import Operation
+from app.db.database import async_session_maker
+from app.exceptions import wallet_exceptions
+
+
+# Баланс кошелька = wallets.balance + сумма его слотов; каждое слагаемое неотрицательно,
+# поэтому ограничение balance_check выполняется и для кошелька в целом.
+
+SLOT_COUNT_STMT = text("""
+    SELECT slot_count FROM wallets WHERE id = :wallet_uuid
+""")
+
+SLOT_DEPOSIT_STMT = text("""
+    UPDATE wallet_slots
+    SET balance = balance + :amount
+    WHERE wallet_id = :wallet_uuid AND slot = :slot
+    RETURNING slot
+""")
+
+# Случайный незаблокированный слот с достаточными средствами
+SLOT_WITHDRAW_STMT = text("""
+    WITH picked AS (
+        SELECT slot
+        FROM wallet_slots
+        WHERE wallet_id = :wallet_uuid AND balance - :amount >= 0
+        ORDER BY random()
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE wallet_slots
+    SET balance = balance - :amount
+    FROM picked
+    WHERE wallet_id = :wallet_uuid AND wallet_slots.slot = picked.slot
+    RETURNING wallet_slots.slot
+""")
+
+# Отдельным выражением после изменения слота: в одном выражении с UPDATE, дождавшимся перебалансировки,
+# измененный слот читается после нее, а wallets.balance и остальные слоты - из снимка до нее.
+# Снимок нового выражения видит перебалансировку целиком, а следующая не закоммитится, пока слот
+# заблокирован этой транзакцией.
+SHARDED_BALANCE_STMT = text("""
+    SELECT (w.balance + coalesce((SELECT sum(s.balance) FROM wallet_slots s WHERE s.wallet_id = w.id), 0))::bigint
+    FROM wallets w
+    WHERE w.id = :wallet_uuid
+""")
+
+LOCK_WALLETS_STMT = text("""
+    SELECT id, balance, slot_count
+    FROM wallets
+    WHERE id = ANY(CAST(:wallet_ids AS uuid[]))
+    ORDER BY id
+    FOR UPDATE
+""")
+
+LOCK_SLOTS_STMT = text("""
+    SELECT wallet_id, slot, balance
+    FROM wallet_slots
+    WHERE wallet_id = ANY(CAST(:wallet_ids AS uuid[]))
+    ORDER BY wallet_id, slot
+    FOR UPDATE
+""")
+
+SET_BALANCES_STMT = text("""
+    UPDATE wallets
+    SET balance = new.balance
+    FROM unnest(CAST(:wallet_ids AS uuid[]), CAST(:balances AS bigint[])) AS new(id, balance)
+    WHERE wallets.id = new.id
+""")
+
+CLEAR_SLOTS_STMT = text("""
+    UPDATE wallet_slots
+    SET balance = 0
+    WHERE wallet_id = ANY(CAST(:wallet_ids AS uuid[]))
+""")
+
+SET_SLOTS_STMT = text("""
+    UPDATE wallet_slots
+    SET balance = new.balance
+    FROM unnest(CAST(:slots AS int[]), CAST(:balances AS bigint[])) AS new(slot, balance)
+    WHERE wallet_id = :wallet_uuid AND wallet_slots.slot = new.slot
+""")
+
+DELETE_SLOTS_STMT = text("""
+    DELETE FROM wallet_slots WHERE wallet_id = :wallet_uuid
+""")
+
+INSERT_SLOTS_STMT = text("""
+    INSERT INTO wallet_slots (wallet_id, slot, balance)
+        SELECT :wallet_uuid, slot - 1, balance
+        FROM unnest(CAST(:balances AS bigint[])) WITH ORDINALITY AS new(balance, slot)
+""")
+
+SET_SLOT_COUNT_STMT = text("""
+    UPDATE wallets
+    SET balance = :balance, slot_count = :slot_count
+    WHERE id = :wallet_uuid
+""")
+
+SKEWED_WALLETS_STMT = text("""
+    SELECT w.id
+    FROM wallets w
+    JOIN wallet_slots s ON s.wallet_id = w.id
+    WHERE w.slot_count > 0
+    GROUP BY w.id, w.balance
+    HAVING w.balance > 0 OR min(s.balance) < max(s.balance) / 2
+""")
+
+LOCK_WALLET_NOWAIT_STMT = text("""
+    SELECT balance FROM wallets WHERE id = :wallet_uuid FOR UPDATE SKIP LOCKED
+""")
+
+
+async def lock_wallet_balances(
+        wallet_ids: list[str],
+        session: AsyncSession
+) -> tuple[dict[str, int], set[str]]:
+    """
+    Блокирует кошельки (и слоты разбитых кошельков) в порядке id.
+    Ожидание блокировки учитывает вызывающий код операции в hot_wallet_tracker
+    :param wallet_ids: UUID кошельков
+    :param session: Сессия для работы с БД
+    :return: Полные балансы найденных кошельков и множество разбитых на слоты
+    """
+    result = await session.execute(LOCK_WALLETS_STMT, {"wallet_ids": wallet_ids})
+
+    balances, sharded = {}, set()
+    for wallet_id, balance, slot_count in result.all():
+        balances[str(wallet_id)] = balance
+        if slot_count > 0:
+            sharded.add(str(wallet_id))
+
+    if sharded:
+        result = await session.execute(LOCK_SLOTS_STMT, {"wallet_ids": sorted(sharded)})
+        for wallet_id, _, balance in result.all():
+            balances[str(wallet_id)] += balance
+
+    return balances, sharded
+
+
+async def write_wallet_balances(balances: dict[str, int], sharded: set[str], session: AsyncSession) -> None:
+    """
+    Записывает полные балансы заблокированных кошельков.
+    У разбитых кошельков баланс переносится в wallets.balance, слоты обнуляются
+    до следующей перебалансировки.
+    :param balances: Новые полные балансы
+    :param sharded: Разбитые на слоты кошельки из lock_wallet_balances
+    :param session: Сессия для работы с БД
+    """
+    wallet_ids = sorted(balances)
+    await session.execute(
+        SET_BALANCES_STMT,
+        {"wallet_ids": wallet_ids, "balances": [balances[wallet_id] for wallet_id in wallet_ids]}
+    )
+
+    cleared = sorted(sharded & balances.keys())
+    if cleared:
+        await session.execute(CLEAR_SLOTS_STMT, {"wallet_ids": cleared})
+
+
+async def sharded_wallet_operation(
+        wallet_uuid: str,
+        operation: Operation,
+        amount: int,
+        session: AsyncSession
+) -> int:
+    """
+    Операция с кошельком, баланс которого разбит на слоты. Без commit.
+    Пополнение идет в случайный слот, снятие - из случайного слота с достаточными
+    средствами, а при отсутствии такого - из нескольких слотов под общей блокировкой.
+    :param wallet_uuid: UUID кошелька
+    :param operation: Тип операции
+    :param amount: Сумма операции в минимальных единицах
+    :param session: Сессия для работы с БД
+    :return: Баланс кошелька после операции
+    """
+    slot_count = (await session.execute(SLOT_COUNT_STMT, {"wallet_uuid": wallet_uuid})).scalar_one_or_none()
+    if slot_count is None:
+        raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+
+    # Кошелек успели собрать обратно из слотов
+    if slot_count == 0:
+        return await locked_wallet_operation(wallet_uuid, operation, amount, session)
+
+    params = {"wallet_uuid": wallet_uuid, "amount": amount, "slot": random.randrange(slot_count)}
+    stmt = SLOT_DEPOSIT_STMT if operation == Operation.DEPOSIT else SLOT_WITHDRAW_STMT
+    if (await session.execute(stmt, params)).scalar_one_or_none() is None:
+        return await locked_wallet_operation(wallet_uuid, operation, amount, session)
+
+    return (await session.execute(SHARDED_BALANCE_STMT, {"wallet_uuid": wallet_uuid})).scalar_one()
+
+
+async def locked_wallet_operation(
+        wallet_uuid: str,
+        operation: Operation,
+        amount: int,
+        session: AsyncSession
+) -> int:
+    """
+    Операция под блокировкой кошелька и всех его слотов.
+    Пополнение зачисляется в wallets.balance, снятие списывается сначала
+    с wallets.balance, затем с наибольших слотов.
+    :param wallet_uuid: UUID кошелька
+    :param operation: Тип операции
+    :param amount: Сумма операции в минимальных единицах
+    :param session: Сессия для работы с БД
+    :return: Баланс кошелька после операции
+    """
+    started = time.perf_counter()
+    row = (await session.execute(LOCK_WALLETS_STMT, {"wallet_ids": [wallet_uuid]})).one_or_none()
+    if row is None:
+        raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+    hot_wallet_tracker.record_lock_wait(wallet_uuid, time.perf_counter() - started)
+
+    base = row[1]
+    slots = (await session.execute(LOCK_SLOTS_STMT, {"wallet_ids": [wallet_uuid]})).all()
+    total = base + sum(balance for _, _, balance in slots)
+
+    remaining = amount
+    if operation == Operation.DEPOSIT:
+        await session.execute(SET_BALANCES_STMT, {"wallet_ids": [wallet_uuid], "balances": [base + amount]})
+        return total + amount
+
+    if total - remaining < 0:
+        raise wallet_exceptions.WalletBalanceError(wallet_uuid=wallet_uuid)
+
+    taken = min(base, remaining)
+    base, remaining = base - taken, remaining - taken
+
+    new_slots = {}
+    for _, slot, balance in sorted(slots, key=lambda slot_row: slot_row[2], reverse=True):
+        if remaining <= 0:
+            break
+        taken = min(balance, remaining)
+        new_slots[slot] = balance - taken
+        remaining -= taken
+
+    await session.execute(SET_BALANCES_STMT, {"wallet_ids": [wallet_uuid], "balances": [base]})
+    if new_slots:
+        slot_ids = sorted(new_slots)
+        await session.execute(
+            SET_SLOTS_STMT,
+            {"wallet_uuid": wallet_uuid, "slots": slot_ids, "balances": [new_slots[slot] for slot in slot_ids]}
+        )
+
+    return total - amount
+
+
+def split_balance(total: int, slots: int) -> list[int]:
+    """
+    Делит баланс на равные доли, остаток уходит в последний слот
+    """
+    per_slot = total // slots
+    return [per_slot] * (slots - 1) + [total - per_slot * (slots - 1)]
+
+
+async def set_wallet_slots(wallet_uuid: str, slots: int, session: AsyncSession) -> int:
+    """
+    Разбивает баланс кошелька на slots слотов или собирает обратно при slots=0
+    :param wallet_uuid: UUID кошелька
+    :param slots: Количество слотов
+    :param session: Сессия для работы с БД
+    :return: Перераспределенный баланс (без записей журнала операций)
+    """
+    balances, _ = await lock_wallet_balances([wallet_uuid], session)
+    total = balances.get(wallet_uuid.lower())
+    if total is None:
+        raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+
+    await session.execute(DELETE_SLOTS_STMT, {"wallet_uuid": wallet_uuid})
+    if slots:
+        await session.execute(INSERT_SLOTS_STMT, {"wallet_uuid": wallet_uuid, "balances": split_balance(total, slots)})
+
+    await session.execute(
+        SET_SLOT_COUNT_STMT,
+        {"wallet_uuid": wallet_uuid, "balance": 0 if slots else total, "slot_count": slots}
+    )
+    await session.commit()
+    return total
+
+
+async def rebalance_wallet(wallet_uuid: str, session: AsyncSession) -> bool:
+    """
+    Переносит wallets.balance в слоты и выравнивает их.
+    Кошелек, заблокированный операцией, пропускается до следующего прохода.
+    :param wallet_uuid: UUID кошелька
+    :param session: Сессия для работы с БД
+    :return: Был ли кошелек перебалансирован
+    """
+    base = (await session.execute(LOCK_WALLET_NOWAIT_STMT, {"wallet_uuid": wallet_uuid})).scalar_one_or_none()
+    if base is None:
+        await session.rollback()
+        return False
+
+    slots = (await session.execute(LOCK_SLOTS_STMT, {"wallet_ids": [wallet_uuid]})).all()
+    if not slots:
+        await session.rollback()
+        return False
+
+    total = base + sum(balance for _, _, balance in slots)
+    slot_ids = [slot for _, slot, _ in slots]
+    await session.execute(
+        SET_SLOTS_STMT,
+        {"wallet_uuid": wallet_uuid, "slots": slot_ids, "balances": split_balance(total, len(slot_ids))}
+    )
+    await session.execute(SET_BALANCES_STMT, {"wallet_ids": [wallet_uuid], "balances": [0]})
+    await session.commit()
+    return True
+
+
+async def rebalance_wallets(session_maker: async_sessionmaker[AsyncSession] = async_session_maker) -> int:
+    """
+    Перебалансирует разбитые кошельки с перекосом между слотами,
+    каждый кошелек - отдельная короткая транзакция
+    :param session_maker: Фабрика сессий БД
+    :return: Количество перебалансированных кошельков
+    """
+    async with session_maker() as session:
+        wallet_ids = (await session.execute(SKEWED_WALLETS_STMT)).scalars().all()
+
+    rebalanced = 0
+    for wallet_id in wallet_ids:
+        async with session_maker() as session:
+            rebalanced += await rebalance_wallet(str(wallet_id), session)
+
+    return rebalanced
+
+
+async def run_rebalancer(interval: float) -> None:
+    """
+    Фоновая задача периодической перебалансировки слотов
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            rebalanced = await rebalance_wallets()
+            if rebalanced:
+                logger.info(f"Rebalanced {rebalanced} sharded wallets")
+        except Exception as err:
+            logger.exception(f"Failed to rebalance sharded wallets {err}")
@@ -1,15 +1,67 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.responses import JSONResponse
+import uuid
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.v1 import crud_services
-from app.api.v1.models import WalletOperation, OperationResponse, WalletBalanceResponse
-from app.db.database import get_async_session
+from app.api.v1 import codec, crud_services, export, idempotency
+from app.api.v1.missing_wallets import missing_wallets
+from app.api.v1.notifications import balance_notifier
+from app.api.v1.models import (
+    BatchMode,
+    BatchOperationRequest,
+    BatchOperationResponse,
+    BatchTransferRequest,
+    BatchTransferResponse,
+    BulkCreateWalletsRequest,
+    ExportFormat,
+    OperationResponse,
+    TransferResponse,
+    WalletBalanceResponse,
+    WalletBalancesRequest,
+    WalletBalancesResponse,
+    WalletOperation,
+    WalletTransfer,
+)
+from app.config.config import settings
+from app.db.admission import admission_controller
+from app.db.database import (
+    READ_CONSISTENCY_PATTERN,
+    async_session_maker,
+    get_async_session,
+    get_read_session,
+    read_session,
+)
 from app.exceptions import wallet_exceptions
 
 wallet_router = APIRouter(prefix="/api/v1/wallets", tags=["wallets"])
 
 
+async def wallet_uuid_path(wallet_uuid: str) -> str:
+    """
+    UUID кошелька из пути. Зависимость объявляется первой и проверяет UUID до получения
+    сессии и слота admission_controller: некорректный UUID - 422, кошелек, отсутствие
+    которого недавно подтвердила основная БД, - 404, оба без обращения к БД.
+    :param wallet_uuid: UUID кошелька
+    :return: UUID в каноническом виде
+    """
+    try:
+        wallet_uuid = str(uuid.UUID(wallet_uuid))
+    except ValueError:
+        raise RequestValidationError([{
+            "type": "uuid_parsing",
+            "loc": ("path", "wallet_uuid"),
+            "msg": "Input should be a valid UUID",
+            "input": wallet_uuid,
+        }])
+
+    if missing_wallets.contains(wallet_uuid):
+        raise HTTPException(status_code=404, detail="Wallet not found")
+
+    return wallet_uuid
+
+
 @wallet_router.post("/create_wallet", status_code=201)
 async def create_wallet(session: AsyncSession = Depends(get_async_session)):
     """
@@ -19,42 +71,186 @@ async def create_wallet(session: AsyncSession = Depends(get_async_session)):
     """
     wallet_uuid = await crud_services.create_wallet(session)
 
-    return JSONResponse({"wallet_uuid": str(wallet_uuid)}, status.HTTP_201_CREATED)
+    return codec.wallet_uuid_response(str(wallet_uuid), status.HTTP_201_CREATED)
+
+
+@wallet_router.post("/create_wallets", status_code=201)
+async def create_wallets(request: BulkCreateWalletsRequest):
+    """
+    Массовое создание кошельков
+    :param request: Количество кошельков или список начальных балансов
+    :return: Поток NDJSON, по строке {"wallet_uuid": ...} на каждый созданный кошелек
+    """
+    async def stream_wallet_uuids():
+        # Сессия и слот admission_controller - внутри генератора: зависимость закрылась бы до конца стриминга
+        async with admission_controller.slot(), async_session_maker() as session:
+            chunks = crud_services.create_wallets_bulk(
+                request.count,
+                request.initial_balance,
+                request.balances,
+                settings.BULK_CREATE_CHUNK_SIZE,
+                session
+            )
+            async for wallet_ids in chunks:
+                yield "".join(f'{{"wallet_uuid": "{wallet_uuid}"}}\n' for wallet_uuid in wallet_ids)
+
+    return StreamingResponse(
+        stream_wallet_uuids(),
+        status_code=status.HTTP_201_CREATED,
+        media_type="application/x-ndjson"
+    )
+
+
+# Объявлен до /{wallet_uuid}, иначе "export" попадет в параметр пути
+@wallet_router.get("/export")
+async def export_wallets(
+        export_format: ExportFormat = Query(default=ExportFormat.NDJSON, alias="format"),
+        after: uuid.UUID | None = Query(default=None)
+):
+    """
+    Потоковая выгрузка балансов всех кошельков в порядке UUID
+    :param export_format: csv или ndjson
+    :param after: Продолжить выгрузку после последнего полученного UUID
+    :return: Поток CSV (wallet_uuid,balance) или NDJSON {"wallet_uuid": ..., "balance": ...}
+    """
+    media_type = "text/csv" if export_format == ExportFormat.CSV else "application/x-ndjson"
+    return StreamingResponse(export.export_balances(export_format, after), media_type=media_type)
+
+
+# Объявлен до /{wallet_uuid}, иначе "subscribe" попадет в параметр пути
+@wallet_router.get("/subscribe")
+async def subscribe_balances(
+        wallet_uuids: list[uuid.UUID] = Query(
+            alias="wallet_uuid",
+            min_length=1,
+            max_length=settings.BALANCE_SUBSCRIBE_MAX_WALLETS
+        )
+):
+    """
+    Подписка на изменения балансов (Server-Sent Events)
+    :param wallet_uuids: UUID кошельков, параметр повторяется для каждого
+    :return: Поток событий balance: сначала текущие балансы, затем последние балансы изменившихся кошельков
+    """
+    if not settings.BALANCE_NOTIFY_ENABLED:
+        raise HTTPException(status_code=404, detail="Balance notifications are disabled")
+
+    subscription = await balance_notifier.subscribe(list(dict.fromkeys(str(item) for item in wallet_uuids)))
+
+    async def stream_events():
+        try:
+            while True:
+                if subscription.needs_snapshot:
+                    subscription.needs_snapshot = False
+                    # Только основная БД: снимок с отстающей реплики мог бы оказаться последним событием
+                    async with read_session("primary") as session:
+                        chunks = crud_services.get_wallet_balances(
+                            subscription.wallet_uuids, settings.BALANCES_CHUNK_SIZE, session
+                        )
+                        async for rows in chunks:
+                            for wallet_uuid, balance in rows:
+                                subscription.push(wallet_uuid, balance, snapshot=True)
+
+                balances = await subscription.wait(settings.BALANCE_SUBSCRIBE_HEARTBEAT_S)
+                if balances:
+                    yield b"".join(
+                        b"event: balance\ndata: " + codec.encode_wallet_balances([item], first=True) + b"\n\n"
+                        for item in balances.items()
+                    )
+                elif not subscription.needs_snapshot:
+                    # Комментарий SSE: держит соединение через прокси и выявляет отключившихся клиентов
+                    yield b": ping\n\n"
+        finally:
+            balance_notifier.unsubscribe(subscription)
+
+    return StreamingResponse(stream_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@wallet_router.post(
+    "/balances",
+    response_model=WalletBalancesResponse,
+    openapi_extra=codec.request_body_schema(WalletBalancesRequest)
+)
+async def get_wallets_balances(
+        request: WalletBalancesRequest = Depends(codec.json_body(WalletBalancesRequest)),
+        x_read_consistency: str | None = Header(default=None, pattern=READ_CONSISTENCY_PATTERN)
+):
+    """
+    Балансы списка кошельков одним запросом к БД
+    :param request: UUID кошельков
+    :param x_read_consistency: Выбор реплики, как для чтения баланса одного кошелька
+    :return: Балансы найденных кошельков и список ненайденных; длинный список - потоком
+    """
+    wallet_uuids = list(dict.fromkeys(str(wallet_uuid) for wallet_uuid in request.wallet_uuids))
+
+    async def stream_balances():
+        # Сессия открывается внутри генератора: зависимость закрылась бы до конца стриминга
+        async with read_session(x_read_consistency) as session:
+            yield codec.BALANCES_PREFIX
+            found = set()
+            chunks = crud_services.get_wallet_balances(wallet_uuids, settings.BALANCES_CHUNK_SIZE, session)
+            async for rows in chunks:
+                yield codec.encode_wallet_balances(rows, first=not found)
+                found.update(wallet_uuid for wallet_uuid, _ in rows)
+        yield codec.encode_missing([wallet_uuid for wallet_uuid in wallet_uuids if wallet_uuid not in found])
+
+    if len(wallet_uuids) > settings.BALANCES_CHUNK_SIZE:
+        return StreamingResponse(stream_balances(), media_type="application/json")
+
+    body = b"".join([chunk async for chunk in stream_balances()])
+    return Response(body, media_type="application/json")
 
 
 @wallet_router.get("/{wallet_uuid}", response_model=WalletBalanceResponse)
-async def get_wallet(wallet_uuid: str, session: AsyncSession = Depends(get_async_session)):
+async def get_wallet(
+        wallet_uuid: str = Depends(wallet_uuid_path),
+        session: AsyncSession = Depends(get_read_session),
+        cache_control: str | None = Header(default=None)
+):
     """
     Получение баланса кошелька
-    :param session: Сессия БД
+    :param session: Сессия БД: реплика или основная, по заголовку X-Read-Consistency
     :param wallet_uuid: UUID Кошелька
+    :param cache_control: "no-cache" - читать баланс из БД в обход кэша
     :return: Баланс кошелька
     """
+    use_cache = cache_control is None or "no-cache" not in cache_control
     try:
-        balance = await crud_services.get_wallet_balance(wallet_uuid, session)
+        balance = await crud_services.get_wallet_balance(wallet_uuid, session, use_cache)
 
     except wallet_exceptions.WalletNotFoundError:
+        # Реплика может отставать от только что созданного кошелька
+        if session.info.get("replica") is None:
+            missing_wallets.add(wallet_uuid)
         raise HTTPException(status_code=404, detail="Wallet not found")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    return JSONResponse({"balance": balance}, status.HTTP_200_OK)
+    return codec.balance_response(balance)
 
 
-@wallet_router.post("/{wallet_uuid}/operation", response_model=OperationResponse)
+@wallet_router.post(
+    "/{wallet_uuid}/operation",
+    response_model=OperationResponse,
+    openapi_extra=codec.request_body_schema(WalletOperation)
+)
 async def update_wallet(
-        wallet_uuid: str,
-        operation: WalletOperation,
-        session: AsyncSession = Depends(get_async_session)
+        wallet_uuid: str = Depends(wallet_uuid_path),
+        operation: WalletOperation = Depends(codec.json_body(WalletOperation)),
+        session: AsyncSession = Depends(get_async_session),
+        idempotency_key: str | None = Header(default=None, max_length=255)
 ):
     """
     Обновление баланса кошелька
     :param session: Сессия БД
     :param wallet_uuid: UUID Кошелька
     :param operation: Тип операции и сумма операции
+    :param idempotency_key: Ключ идемпотентности: повтор с тем же ключом получает сохраненный ответ
     :return: Баланс кошелька
     """
+    if idempotency_key is not None:
+        return await update_wallet_idempotent(idempotency_key, wallet_uuid, operation, session)
+
     try:
         new_balance = await crud_services.wallet_operation(
             wallet_uuid,
@@ -62,9 +258,10 @@ async def update_wallet(
             operation.amount,
             session)
 
-        return JSONResponse({"status": "success", "balance": new_balance}, status.HTTP_200_OK)
+        return codec.operation_response(new_balance)
 
     except wallet_exceptions.WalletNotFoundError:
+        missing_wallets.add(wallet_uuid)
         raise HTTPException(status_code=404, detail="Wallet not found")
 
     except wallet_exceptions.WalletBalanceError as e:
@@ -72,3 +269,127 @@ async def update_wallet(
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+async def update_wallet_idempotent(
+        idempotency_key: str,
+        wallet_uuid: str,
+        operation: WalletOperation,
+        session: AsyncSession
+):
+    """
+    Обновление баланса кошелька с ключом идемпотентности
+    :param idempotency_key: Ключ идемпотентности
+    :param session: Сессия БД
+    :param wallet_uuid: UUID Кошелька
+    :param operation: Тип операции и сумма операции
+    :return: Сохраненный ответ на операцию
+    """
+    try:
+        stored, replayed = await idempotency.idempotent_wallet_operation(
+            idempotency_key,
+            wallet_uuid,
+            operation.operation,
+            operation.amount,
+            session)
+
+    except wallet_exceptions.IdempotencyKeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return Response(
+        stored.body,
+        stored.status_code,
+        headers={"Idempotent-Replayed": "true" if replayed else "false"},
+        media_type="application/json"
+    )
+
+
+@wallet_router.post(
+    "/operations/batch",
+    response_model=BatchOperationResponse,
+    openapi_extra=codec.request_body_schema(BatchOperationRequest)
+)
+async def update_wallets_batch(
+        batch: BatchOperationRequest = Depends(codec.json_body(BatchOperationRequest)),
+        session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Пакетное обновление балансов кошельков
+    :param session: Сессия БД
+    :param batch: Режим применения и список операций
+    :return: Результат по каждой операции
+    """
+    try:
+        applied, results = await crud_services.wallet_batch_operation(batch.operations, batch.mode, session)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    response = BatchOperationResponse(applied=applied, results=results)
+    status_code = status.HTTP_200_OK if applied or batch.mode != BatchMode.ATOMIC else status.HTTP_409_CONFLICT
+
+    return Response(response.model_dump_json(), status_code, media_type="application/json")
+
+
+@wallet_router.post(
+    "/transfer",
+    response_model=TransferResponse,
+    openapi_extra=codec.request_body_schema(WalletTransfer)
+)
+async def transfer(
+        transfer_request: WalletTransfer = Depends(codec.json_body(WalletTransfer)),
+        session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Перевод между кошельками одной транзакцией
+    :param session: Сессия БД
+    :param transfer_request: Кошельки списания и зачисления и сумма перевода
+    :return: Балансы обоих кошельков после перевода
+    """
+    try:
+        from_balance, to_balance = await crud_services.wallet_transfer(
+            str(transfer_request.from_wallet_uuid),
+            str(transfer_request.to_wallet_uuid),
+            transfer_request.amount,
+            session)
+
+        return codec.transfer_response(from_balance, to_balance)
+
+    except wallet_exceptions.WalletNotFoundError:
+        raise HTTPException(status_code=404, detail="Wallet not found")
+
+    except wallet_exceptions.WalletBalanceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@wallet_router.post(
+    "/transfers/batch",
+    response_model=BatchTransferResponse,
+    openapi_extra=codec.request_body_schema(BatchTransferRequest)
+)
+async def transfer_batch(
+        batch: BatchTransferRequest = Depends(codec.json_body(BatchTransferRequest)),
+        session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Пакет переводов между кошельками
+    :param session: Сессия БД
+    :param batch: Режим применения и список переводов
+    :return: Результат по каждому переводу
+    """
+    try:
+        applied, results = await crud_services.wallet_batch_transfer(batch.transfers, batch.mode, session)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    response = BatchTransferResponse(applied=applied, results=results)
+    status_code = status.HTTP_200_OK if applied or batch.mode != BatchMode.ATOMIC else status.HTTP_409_CONFLICT
+
+    return Response(response.model_dump_json(), status_code, media_type="application/json")
@@ -0,0 +1,36 @@
+"""
+Выгрузка балансов всех кошельков напрямую из БД, без HTTP.
+
+Запуск (переменные подключения к БД - как для приложения):
+    python -m app.cli.export_balances --format csv --output balances.csv
+    python -m app.cli.export_balances --format ndjson --after <последний выгруженный UUID> >> balances.ndjson
+"""
+import argparse
+import asyncio
+import sys
+import uuid
+
+from app.api.v1.export import export_balances
+from app.api.v1.models import ExportFormat
+from app.db.database import engine
+
+
+async def main(export_format: ExportFormat, after: uuid.UUID | None, output: str | None) -> None:
+    file = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        async for chunk in export_balances(export_format, after):
+            file.write(chunk)
+    finally:
+        if output:
+            file.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", type=ExportFormat, choices=list(ExportFormat), default=ExportFormat.CSV)
+    parser.add_argument("--after", type=uuid.UUID, default=None)
+    parser.add_argument("--output", default=None, help="Файл выгрузки, по умолчанию stdout")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.format, args.after, args.output))
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from dotenv import load_dotenv
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -22,6 +24,124 @@ class Settings(BaseSettings):
     DB_POOL_TIMEOUT: int = 30
     DB_POOL_RECYCLE: int = 1800
 
+    # Бюджет соединений: max_connections сервера делится между воркерами gunicorn,
+    # DB_POOL_SIZE и DB_MAX_OVERFLOW ограничиваются долей воркера
+    DB_MAX_CONNECTIONS: int = 400
+    DB_RESERVED_CONNECTIONS: int = 10
+    WORKERS_COUNT: int = 4
+
+    # Прогрев при старте воркера: соединений пула с подготовленными горячими запросами.
+    # /ready отвечает 200 только после прогрева
+    WARMUP_CONNECTIONS: int = 10
+    WARMUP_RETRY_INTERVAL_S: float = 1.0
+
+    # Реплики для чтения балансов: "host:port" через запятую, пользователь и БД - как у основной.
+    # Реплика с отставанием больше DB_REPLICA_MAX_LAG_MS исключается, пока не догонит
+    DB_REPLICA_HOSTS: str = ""
+    DB_REPLICA_POOL_SIZE: int = 20
+    DB_REPLICA_MAX_LAG_MS: float = 1000.0
+    DB_REPLICA_LAG_CHECK_INTERVAL_S: float = 0.5
+
+    # Балансы и суммы хранятся в минимальных единицах: 10 ** BALANCE_SCALE на единицу валюты.
+    # Значение фиксируется миграцией перевода балансов в bigint, менять его после нее нельзя.
+    BALANCE_SCALE: int = 2
+
+    # Ограничение конкурентности запросов к БД в воркере
+    ADMISSION_MAX_CONCURRENCY: int | None = None
+    ADMISSION_MAX_QUEUE: int = 1000
+    ADMISSION_TIMEOUT_MS: float = 1000.0
+    ADMISSION_RETRY_AFTER_S: int = 1
+
+    # Объединение операций над одним кошельком в одно UPDATE
+    WALLET_COALESCING_ENABLED: bool = False
+    WALLET_COALESCING_WINDOW_MS: float = 2.0
+    WALLET_COALESCING_MAX_BATCH: int = 256
+
+    # Максимальное число операций в одном пакетном запросе
+    BATCH_MAX_OPERATIONS: int = 10000
+
+    # Чтение балансов списком: не больше BALANCES_MAX_WALLETS кошельков в запросе,
+    # из БД читается кусками по BALANCES_CHUNK_SIZE, список длиннее одного куска отдается потоком
+    BALANCES_MAX_WALLETS: int = 10_000
+    BALANCES_CHUNK_SIZE: int = 1000
+
+    # Массовое создание кошельков
+    BULK_CREATE_MAX_WALLETS: int = 1_000_000
+    BULK_CREATE_CHUNK_SIZE: int = 10_000
+
+    # Кэш балансов (TTL - допустимая устаревшость между воркерами)
+    BALANCE_CACHE_ENABLED: bool = False
+    BALANCE_CACHE_MAX_SIZE: int = 100_000
+    BALANCE_CACHE_TTL_MS: float = 100.0
+
+    # Фильтр отсутствующих кошельков: повторный запрос к кошельку, которого нет в основной БД, - 404 без запроса
+    MISSING_WALLETS_CACHE_ENABLED: bool = True
+    MISSING_WALLETS_CACHE_MAX_SIZE: int = 100_000
+    MISSING_WALLETS_CACHE_TTL_S: float = 60.0
+
+    # Трассировка запросов: доля запросов, трасса которых сохраняется всегда, и порог, медленнее которого
+    # запрос сохраняется всегда (0 - выключено). При обоих нулях запросы не записываются
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_SLOW_THRESHOLD_MS: float = 0.0
+    # Выгрузка в OTLP/JSON: коллектору (например http://collector:4318/v1/traces) или в файл, {pid} - pid воркера
+    TRACE_EXPORT_ENDPOINT: str = ""
+    TRACE_EXPORT_PATH: str = "traces-{pid}.jsonl"
+    TRACE_EXPORT_TIMEOUT_S: float = 5.0
+    TRACE_EXPORT_INTERVAL_S: float = 1.0
+    TRACE_EXPORT_MAX_QUEUE: int = 10_000
+    TRACE_SERVICE_NAME: str = "wallet-api"
+    TRACE_STATEMENT_MAX_LENGTH: int = 1000
+
+    # Логирование: строки JSON в stderr через ограниченную очередь и поток записи воркера.
+    # Журнал запросов - доля LOG_ACCESS_SAMPLE_RATE, для маршрутов из LOG_ACCESS_ROUTE_SAMPLE_RATES
+    # ("шаблон=доля" через запятую) - своя, ответы 5xx пишутся всегда.
+    # Повтор исключения из того же места за LOG_EXCEPTION_DEDUP_WINDOW_S подавляется (0 - выключено)
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_MAX_SIZE: int = 10_000
+    LOG_ACCESS_SAMPLE_RATE: float = 0.01
+    LOG_ACCESS_ROUTE_SAMPLE_RATES: str = "/health=0,/ready=0,/metrics=0"
+    LOG_EXCEPTION_DEDUP_WINDOW_S: float = 10.0
+
+    # Быстрый путь на чистом asyncpg для горячих эндпоинтов
+    FAST_PATH_ENABLED: bool = False
+    FAST_PATH_POOL_MIN_SIZE: int = 10
+    FAST_PATH_POOL_MAX_SIZE: int = 100
+
+    # Ключи идемпотентности операций
+    IDEMPOTENCY_KEY_TTL_S: int = 86400
+    IDEMPOTENCY_CACHE_MAX_SIZE: int = 10_000
+    IDEMPOTENCY_SWEEP_INTERVAL_S: float = 60.0
+    IDEMPOTENCY_SWEEP_BATCH_SIZE: int = 1000
+
+    # Разбиение баланса горячих кошельков на слоты
+    WALLET_SHARD_MAX_SLOTS: int = 64
+    WALLET_SHARD_REBALANCE_INTERVAL_S: float = 5.0
+
+    # Хранение операций: update - изменение строки кошелька, ledger - журнал операций
+    WALLET_STORAGE_ENGINE: Literal["update", "ledger"] = "update"
+    LEDGER_FLUSH_INTERVAL_MS: float = 5.0
+    LEDGER_FLUSH_MAX_BATCH: int = 5000
+    LEDGER_PROJECTION_INTERVAL_S: float = 1.0
+    LEDGER_PROJECTION_BATCH_SIZE: int = 50_000
+
+    # Учет самых нагруженных кошельков: операции и ожидание блокировок за последние одно-два окна.
+    # Память воркера - HOT_WALLETS_SKETCH_WIDTH * HOT_WALLETS_SKETCH_DEPTH счетчиков на окно
+    HOT_WALLETS_TRACKING_ENABLED: bool = True
+    HOT_WALLETS_CAPACITY: int = 100
+    HOT_WALLETS_SKETCH_WIDTH: int = 2048
+    HOT_WALLETS_SKETCH_DEPTH: int = 4
+    HOT_WALLETS_WINDOW_S: float = 60.0
+    HOT_WALLETS_REPORT_INTERVAL_S: float = 5.0
+
+    # Подписка на изменения балансов: публикация через NOTIFY в транзакции каждой записи
+    # (выключено по умолчанию - NOTIFY сериализует commit) и одно соединение LISTEN на воркер
+    BALANCE_NOTIFY_ENABLED: bool = False
+    BALANCE_SUBSCRIBE_MAX_WALLETS: int = 100
+    BALANCE_SUBSCRIBE_HEARTBEAT_S: float = 15.0
+    BALANCE_NOTIFY_RECONNECT_INTERVAL_S: float = 1.0
+
+    # Выгрузка балансов: кусков COPY в буфере между БД и ответом
+    EXPORT_QUEUE_CHUNKS: int = 16
 
     # Загрузка переменных окружения из файла .env
     model_config = SettingsConfigDict(
@@ -32,6 +152,77 @@ class Settings(BaseSettings):
     def get_db_url(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    @property
+    def get_asyncpg_dsn(self):
+        return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
+    @property
+    def get_replica_urls(self) -> list[str]:
+        return [
+            f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{host.strip()}/{self.DB_NAME}"
+            for host in self.DB_REPLICA_HOSTS.split(",") if host.strip()
+        ]
+
+    @property
+    def get_access_log_sample_rates(self) -> dict[str, float]:
+        rates = {}
+        for item in self.LOG_ACCESS_ROUTE_SAMPLE_RATES.split(","):
+            if item.strip():
+                route, rate = item.rsplit("=", 1)
+                rates[route.strip()] = float(rate)
+        return rates
+
+    @property
+    def get_connection_budget(self) -> int:
+        """
+        Количество соединений с БД, доступное одному воркеру
+        """
+        return max((self.DB_MAX_CONNECTIONS - self.DB_RESERVED_CONNECTIONS) // self.WORKERS_COUNT, 2)
+
+    @property
+    def get_fast_path_pool_max_size(self) -> int:
+        """
+        Размер пула asyncpg: не больше половины бюджета воркера
+        """
+        if not self.FAST_PATH_ENABLED:
+            return 0
+        return max(min(self.FAST_PATH_POOL_MAX_SIZE, self.get_connection_budget // 2), 1)
+
+    @property
+    def get_listen_connections(self) -> int:
+        """
+        Соединение LISTEN уведомлений о балансах: отдельное, вне пулов
+        """
+        return int(self.BALANCE_NOTIFY_ENABLED)
+
+    @property
+    def get_ledger_writer_connections(self) -> int:
+        """
+        Соединение пула SQLAlchemy, оставленное записи журнала: запросам не выдается
+        """
+        return int(self.WALLET_STORAGE_ENGINE == "ledger")
+
+    @property
+    def get_pool_size(self) -> int:
+        budget = self.get_connection_budget - self.get_fast_path_pool_max_size - self.get_listen_connections
+        return max(min(self.DB_POOL_SIZE, budget), 1)
+
+    @property
+    def get_max_overflow(self) -> int:
+        budget = (self.get_connection_budget - self.get_fast_path_pool_max_size - self.get_listen_connections
+                  - self.get_pool_size)
+        return max(min(self.DB_MAX_OVERFLOW, budget), 0)
+
+    @property
+    def get_admission_max_concurrency(self) -> int:
+        """
+        Одновременных запросов к БД на воркер, по умолчанию - емкость пула SQLAlchemy
+        без соединения записи журнала
+        """
+        return self.ADMISSION_MAX_CONCURRENCY or max(
+            self.get_pool_size + self.get_max_overflow - self.get_ledger_writer_connections, 1
+        )
+
 
 # Экземпляр конфигурации
 settings = Settings()
@@ -0,0 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.config.config import settings
+from app.exceptions.db_exceptions import DatabaseOverloadedError
+from app.metrics.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED
+from app.metrics.tracing import tracer
+
+
+class AdmissionController:
+    """
+    Ограничивает число одновременных запросов к БД в воркере.
+    Ожидающие стоят в очереди ограниченной длины; не получившие слот до дедлайна
+    или не поместившиеся в очередь сразу отклоняются.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, timeout: float, retry_after: int):
+        """
+        :param max_concurrency: Одновременных запросов к БД
+        :param max_queue: Максимальная длина очереди ожидания
+        :param timeout: Максимальное ожидание слота в секундах
+        :param retry_after: Значение Retry-After для отклоненных запросов
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+
+    async def acquire(self) -> None:
+        """
+        Занимает слот, при перегрузке выбрасывает DatabaseOverloadedError
+        """
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            ADMISSION_IN_FLIGHT.inc()
+            return
+
+        if self.waiting >= self.max_queue:
+            ADMISSION_SHED.labels("queue_full").inc()
+            raise DatabaseOverloadedError(retry_after=self.retry_after)
+
+        self.waiting += 1
+        ADMISSION_QUEUE_DEPTH.inc()
+        try:
+            with tracer.span("db.admission.wait"):
+                async with asyncio.timeout(self.timeout):
+                    await self._semaphore.acquire()
+        except TimeoutError:
+            ADMISSION_SHED.labels("timeout").inc()
+            raise DatabaseOverloadedError(retry_after=self.retry_after)
+        finally:
+            self.waiting -= 1
+            ADMISSION_QUEUE_DEPTH.dec()
+
+        ADMISSION_IN_FLIGHT.inc()
+
+    def release(self) -> None:
+        ADMISSION_IN_FLIGHT.dec()
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Контекстный менеджер слота доступа к БД
+        """
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+# Экземпляр на процесс воркера
+admission_controller = AdmissionController(
+    max_concurrency=settings.get_admission_max_concurrency,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    timeout=settings.ADMISSION_TIMEOUT_MS / 1000,
+    retry_after=settings.ADMISSION_RETRY_AFTER_S,
+)
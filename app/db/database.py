@@ -1,19 +1,31 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, nullcontext
+
+from fastapi import Header, HTTPException
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
 from loguru import logger
 
 from app.config.config import settings
+from app.db.admission import admission_controller
+from app.db.replicas import replica_router
+from app.metrics.metrics import DB_READS_ROUTED, InstrumentedQueuePool, instrument_engine
+from app.metrics.tracing import trace_engine
 
 DATABASE_URL = settings.get_db_url
 
 engine = create_async_engine(
     DATABASE_URL,
-    pool_size=settings.DB_POOL_SIZE,
-    max_overflow=settings.DB_MAX_OVERFLOW,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.get_pool_size,
+    max_overflow=settings.get_max_overflow,
     pool_timeout=settings.DB_POOL_TIMEOUT,
     pool_recycle=settings.DB_POOL_RECYCLE,
     pool_pre_ping=True,
 )
 
+instrument_engine(engine)
+trace_engine(engine)
+
 
 async_session_maker = async_sessionmaker(
     engine,
@@ -23,15 +35,67 @@ async_session_maker = async_sessionmaker(
 )
 
 
+READ_CONSISTENCY_PATTERN = r"^(primary|max-lag=\d+(\.\d+)?)$"
+
+
 async def get_async_session() -> AsyncSession:
     """
     Асинхронный контекстный менеджер для работы с базой данных.
+    Сессия выдается только после получения слота у admission_controller.
     """
-    async with async_session_maker() as session:
+    async with admission_controller.slot(), async_session_maker() as session:
+        try:
+            yield session
+        except Exception as err:
+            # Ответы 4xx обработчиков - ожидаемый исход, не ошибка сессии
+            if not isinstance(err, HTTPException) or err.status_code >= 500:
+                logger.exception(f"Error in async session {err}")
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
+async def get_read_session(
+        x_read_consistency: str | None = Header(default=None, pattern=READ_CONSISTENCY_PATTERN)
+) -> AsyncSession:
+    """
+    Сессия для чтения: реплика с допустимым отставанием, если такой нет - основная БД.
+    Слот admission_controller занимают только чтения с основной БД.
+    :param x_read_consistency: "primary" - только основная БД, "max-lag=<мс>" - реплика не старше
+    :return: Сессия; session.info["replica"] - имя реплики или None
+    """
+    async with read_session(x_read_consistency) as session:
+        yield session
+
+
+@asynccontextmanager
+async def read_session(x_read_consistency: str | None = None) -> AsyncIterator[AsyncSession]:
+    """
+    Сессия для чтения вне зависимостей FastAPI (потоковые ответы), как get_read_session
+    """
+    replica = None
+    if replica_router.enabled and x_read_consistency != "primary":
+        max_lag = None
+        if x_read_consistency is not None:
+            max_lag = float(x_read_consistency.removeprefix("max-lag=")) / 1000
+        replica = replica_router.choose(max_lag)
+
+    if replica is None:
+        DB_READS_ROUTED.labels("primary").inc()
+        slot, session_maker = admission_controller.slot(), async_session_maker
+    else:
+        DB_READS_ROUTED.labels("replica").inc()
+        slot, session_maker = nullcontext(), replica.session_maker
+
+    async with slot, session_maker() as session:
+        session.info["replica"] = replica.name if replica else None
         try:
             yield session
         except Exception as err:
-            logger.exception(f"Error in async session {err}")
+            # Ответы 4xx обработчиков - ожидаемый исход, не ошибка сессии
+            if not isinstance(err, HTTPException) or err.status_code >= 500:
+                logger.exception(f"Error in async session {err}")
             await session.rollback()
             raise
         finally:
@@ -0,0 +1,140 @@
+import asyncio
+import time
+import uuid
+
+import asyncpg
+
+from app.api.v1.hot_wallets import hot_wallet_tracker
+from app.api.v1.notifications import CHANNEL
+from app.config.config import settings
+from app.exceptions import wallet_exceptions
+
+
+# Запросы горячих эндпоинтов. asyncpg готовит их на каждом соединении как
+# именованные prepared statements и переиспользует через кэш выражений.
+# Операции изменяют только кошельки без слотов, остальные обрабатывает app.api.v1.sharding.
+GET_BALANCE_SQL = """
+    SELECT balance + CASE WHEN slot_count > 0
+        THEN (SELECT coalesce(sum(balance), 0)::bigint FROM wallet_slots WHERE wallet_id = $1)
+        ELSE 0 END
+    FROM wallets WHERE id = $1
+"""
+DEPOSIT_SQL = "UPDATE wallets SET balance = balance + $2 WHERE id = $1 AND slot_count = 0 RETURNING balance"
+WITHDRAW_SQL = "UPDATE wallets SET balance = balance - $2 WHERE id = $1 AND slot_count = 0 RETURNING balance"
+# Те же операции с публикацией нового баланса (app.api.v1.notifications): уведомление уходит при commit
+# того же выражения, без лишнего обращения к БД
+DEPOSIT_NOTIFY_SQL = f"""
+    WITH upd AS (UPDATE wallets SET balance = balance + $2 WHERE id = $1 AND slot_count = 0 RETURNING id, balance)
+    SELECT balance FROM upd, pg_notify('{CHANNEL}', id::text || ':' || balance)
+"""
+WITHDRAW_NOTIFY_SQL = f"""
+    WITH upd AS (UPDATE wallets SET balance = balance - $2 WHERE id = $1 AND slot_count = 0 RETURNING id, balance)
+    SELECT balance FROM upd, pg_notify('{CHANNEL}', id::text || ':' || balance)
+"""
+CREATE_SQL = "INSERT INTO wallets (id, balance) VALUES (uuid_generate_v4(), 0) RETURNING id"
+
+# UUID, которого не бывает среди кошельков: запросы с ним ничего не меняют
+_WARMUP_UUID = uuid.UUID(int=0)
+
+_pool: asyncpg.Pool | None = None
+_pool_lock = asyncio.Lock()
+
+
+async def _prepare_statements(connection: asyncpg.Connection) -> None:
+    """
+    Готовит горячие запросы на новом соединении пула
+    """
+    await connection.fetchval(GET_BALANCE_SQL, _WARMUP_UUID)
+    await connection.fetchval(operation_sql("DEPOSIT"), _WARMUP_UUID, 0)
+    await connection.fetchval(operation_sql("WITHDRAW"), _WARMUP_UUID, 0)
+
+
+def operation_sql(operation: str) -> str:
+    if settings.BALANCE_NOTIFY_ENABLED:
+        return DEPOSIT_NOTIFY_SQL if operation == "DEPOSIT" else WITHDRAW_NOTIFY_SQL
+    return DEPOSIT_SQL if operation == "DEPOSIT" else WITHDRAW_SQL
+
+
+async def get_pool() -> asyncpg.Pool:
+    """
+    Возвращает пул asyncpg, создавая его при первом обращении
+    :return: Пул соединений
+    """
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    settings.get_asyncpg_dsn,
+                    min_size=min(settings.FAST_PATH_POOL_MIN_SIZE, settings.get_fast_path_pool_max_size),
+                    max_size=settings.get_fast_path_pool_max_size,
+                    max_inactive_connection_lifetime=settings.DB_POOL_RECYCLE,
+                    init=_prepare_statements,
+                )
+    return _pool
+
+
+async def close_pool() -> None:
+    """
+    Закрывает пул asyncpg
+    """
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def create_wallet() -> str:
+    """
+    Создает новый кошелек
+    :return: id кошелька
+    """
+    pool = await get_pool()
+    return await pool.fetchval(CREATE_SQL)
+
+
+async def get_wallet_balance(wallet_uuid: str) -> int:
+    """
+    Возвращает баланс кошелька
+    :param wallet_uuid: UUID кошелька
+    :return: Баланс кошелька
+    """
+    pool = await get_pool()
+    balance = await pool.fetchval(GET_BALANCE_SQL, wallet_uuid)
+
+    if balance is None:
+        raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+
+    return balance
+
+
+async def wallet_operation(wallet_uuid: str, operation: str, amount: int) -> int:
+    """
+    Выполняет операцию с кошельком одним запросом в autocommit.
+    Для отсутствующего кошелька и кошелька, разбитого на слоты, выбрасывает WalletNotFoundError.
+    :param wallet_uuid: UUID кошелька
+    :param operation: DEPOSIT или WITHDRAW
+    :param amount: Сумма операции в минимальных единицах
+    :return: Баланс кошелька после операции
+    """
+    stmt = operation_sql(operation)
+
+    pool = await get_pool()
+    async with pool.acquire() as connection:
+        started = time.perf_counter()
+        try:
+            new_balance = await connection.fetchval(stmt, wallet_uuid, amount)
+
+        # Если нарушено ограничение баланса, выбрасываем исключение
+        except asyncpg.CheckViolationError as e:
+            if e.constraint_name == "balance_check":
+                raise wallet_exceptions.WalletBalanceError(wallet_uuid=wallet_uuid)
+            raise
+
+        finally:
+            hot_wallet_tracker.record_lock_wait(wallet_uuid, time.perf_counter() - started)
+
+    if new_balance is None:
+        raise wallet_exceptions.WalletNotFoundError(wallet_uuid=wallet_uuid)
+
+    return new_balance
@@ -1,4 +1,4 @@
-from .models import Base, Wallet
+from .models import Base, HotWalletReport, IdempotencyKey, LedgerEntry, LedgerWatermark, Wallet, WalletSlot
 
 
-__all__ = ['Base', 'Wallet']
\ No newline at end of file
+__all__ = ['Base', 'HotWalletReport', 'IdempotencyKey', 'LedgerEntry', 'LedgerWatermark', 'Wallet', 'WalletSlot']
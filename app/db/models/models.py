@@ -1,27 +1,153 @@
 import uuid
+from datetime import datetime
 
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.ext.asyncio import AsyncAttrs
-from sqlalchemy import CheckConstraint
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import (
+    BigInteger, CheckConstraint, DateTime, ForeignKey, Identity, Index, String, Text, event, func, text
+)
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 
 
 class Base(AsyncAttrs, DeclarativeBase):
     __abstract__ = True
 
 
+# Число хеш-секций wallets. Изменить его можно только миграцией с переносом строк
+WALLET_PARTITIONS = 16
+
+# Параметры хранения секций wallets. Свободное место на странице (fillfactor) оставляет
+# новую версию строки на той же странице, и обновление баланса не трогает индексы (HOT).
+# Мертвые версии очищаются раньше и без пауз: секции небольшие, а обновляются постоянно.
+WALLET_PARTITION_OPTIONS = {
+    'fillfactor': 70,
+    'autovacuum_vacuum_scale_factor': 0.02,
+    'autovacuum_vacuum_threshold': 1000,
+    'autovacuum_analyze_scale_factor': 0.05,
+    'autovacuum_vacuum_cost_delay': 0,
+}
+
+
+def wallet_partitions_ddl(table: str = 'wallets', partitions: int = WALLET_PARTITIONS) -> list[str]:
+    """
+    :param table: Секционированная по HASH (id) таблица кошельков
+    :param partitions: Число секций
+    :return: Запросы создания секций с параметрами хранения
+    """
+    options = ', '.join(f'{name} = {value}' for name, value in WALLET_PARTITION_OPTIONS.items())
+    return [
+        f'CREATE TABLE {table}_p{remainder} PARTITION OF {table} '
+        f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder}) WITH ({options})'
+        for remainder in range(partitions)
+    ]
+
+
 class Wallet(Base):
     """
-    Модель кошелька
+    Модель кошелька. Таблица секционирована по HASH (id), секции создаются вместе с ней.
     """
     __tablename__ = 'wallets'
 
     id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True, default=uuid.uuid4)
-    balance: Mapped[float] = mapped_column(nullable=False, default=0.0)
+    # Баланс в минимальных единицах (10 ** BALANCE_SCALE на единицу валюты)
+    balance: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # Количество слотов, на которые разбит баланс горячего кошелька (0 - не разбит)
+    slot_count: Mapped[int] = mapped_column(nullable=False, default=0, server_default=text('0'))
 
     __table_args__ = (
         CheckConstraint(
             'balance >= 0',
             name='balance_check'
         ),
+        Index('ix_wallets_sharded', 'id', postgresql_where=text('slot_count > 0')),
+        {'postgresql_partition_by': 'HASH (id)'},
+    )
+
+
+@event.listens_for(Wallet.__table__, 'after_create')
+def create_wallet_partitions(target, connection, **kw) -> None:
+    for ddl in wallet_partitions_ddl(target.name):
+        connection.exec_driver_sql(ddl)
+
+
+class WalletSlot(Base):
+    """
+    Слот баланса кошелька: баланс кошелька равен wallets.balance плюс сумма его слотов
+    """
+    __tablename__ = 'wallet_slots'
+
+    wallet_id: Mapped[uuid.UUID] = mapped_column(
+        UUID,
+        ForeignKey('wallets.id', ondelete='CASCADE'),
+        primary_key=True
+    )
+    slot: Mapped[int] = mapped_column(primary_key=True)
+    balance: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        CheckConstraint(
+            'balance >= 0',
+            name='slot_balance_check'
+        ),
+    )
+
+
+class LedgerEntry(Base):
+    """
+    Запись журнала операций: изменение баланса кошелька со знаком.
+    Записи только добавляются, баланс в wallets - проекция журнала до ledger_watermark.
+    """
+    __tablename__ = 'wallet_ledger'
+
+    id: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True)
+    wallet_id: Mapped[uuid.UUID] = mapped_column(UUID, nullable=False)
+    amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_wallet_ledger_wallet_id_id', 'wallet_id', 'id'),
+    )
+
+
+class LedgerWatermark(Base):
+    """
+    Позиция журнала, до которой (включительно) записи уже учтены в wallets.balance
+    """
+    __tablename__ = 'ledger_watermark'
+
+    id: Mapped[int] = mapped_column(primary_key=True, default=1)
+    position: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        CheckConstraint('id = 1', name='ledger_watermark_single_row'),
+    )
+
+
+class IdempotencyKey(Base):
+    """
+    Ключ идемпотентности операции и сохраненный ответ на нее
+    """
+    __tablename__ = 'idempotency_keys'
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int | None] = mapped_column(nullable=True)
+    response: Mapped[str | None] = mapped_column(Text, nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class HotWalletReport(Base):
+    """
+    Последний отчет воркера о самых нагруженных кошельках. Таблица нежурналируемая:
+    отчеты перезаписываются каждые несколько секунд и не нужны после сбоя.
+    """
+    __tablename__ = 'hot_wallet_reports'
+    __table_args__ = {'prefixes': ['UNLOGGED']}
+
+    worker: Mapped[str] = mapped_column(String(255), primary_key=True)
+    report: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    reported_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now()
     )
@@ -0,0 +1,171 @@
+import asyncio
+import itertools
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from loguru import logger
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config.config import settings
+from app.metrics.metrics import DB_REPLICA_LAG
+
+# Позиции WAL в байтах от начала
+PRIMARY_POSITION_STMT = text("SELECT pg_current_wal_lsn() - '0/0'::pg_lsn")
+REPLICA_POSITION_STMT = text("SELECT pg_is_in_recovery(), pg_last_wal_replay_lsn() - '0/0'::pg_lsn")
+
+
+@dataclass
+class Replica:
+    """
+    Реплика для чтения и ее последнее измеренное отставание
+    """
+    name: str
+    engine: AsyncEngine
+    session_maker: async_sessionmaker
+    # Отставание в секундах; inf - недоступна, не является репликой или еще не проверялась
+    lag: float = math.inf
+
+
+class ReplicaRouter:
+    """
+    Выбирает реплику для чтения по допустимому отставанию.
+    Отставание оценивается по истории позиций WAL основной БД: реплика, воспроизведшая позицию,
+    которую основная БД имела в момент t, содержит все зафиксированное до t.
+    """
+
+    def __init__(self, urls: list[str], max_lag: float, pool_size: int, check_interval: float):
+        """
+        :param urls: Адреса реплик
+        :param max_lag: Отставание в секундах, сверх которого реплика исключается
+        :param pool_size: Размер пула соединений каждой реплики
+        :param check_interval: Период проверки отставания в секундах
+        """
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.replicas = []
+        for url in urls:
+            engine = create_async_engine(url, pool_size=pool_size, max_overflow=0, pool_pre_ping=True)
+            session_maker = async_sessionmaker(engine, expire_on_commit=False, autoflush=False, class_=AsyncSession)
+            name = f"{make_url(url).host}:{make_url(url).port or 5432}"
+            replica = Replica(name, engine, session_maker)
+            self.replicas.append(replica)
+            self._watch_disconnects(replica)
+
+        # История должна покрывать max_lag, иначе отставание нельзя оценить
+        self._history: deque[tuple[float, int]] = deque(maxlen=math.ceil(max_lag / check_interval) + 2)
+        self._next = itertools.count()
+
+    def _watch_disconnects(self, replica: Replica) -> None:
+        """
+        Обрыв соединения с репликой при чтении исключает ее до следующей успешной проверки:
+        следующие чтения идут на другие реплики или основную БД
+        """
+        @event.listens_for(replica.engine.sync_engine, "handle_error")
+        def handle_error(exception_context):
+            if exception_context.is_disconnect and not exception_context.is_pre_ping:
+                self.eject(replica)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def choose(self, max_lag: float | None = None) -> Replica | None:
+        """
+        Реплика по кругу среди отстающих не больше допустимого
+        :param max_lag: Допустимое отставание запроса в секундах, не больше заданного для всех
+        :return: Реплика или None - читать с основной БД
+        """
+        limit = self.max_lag if max_lag is None else min(max_lag, self.max_lag)
+        eligible = [replica for replica in self.replicas if replica.lag <= limit]
+        if not eligible:
+            return None
+        return eligible[next(self._next) % len(eligible)]
+
+    def set_lag(self, replica: Replica, lag: float) -> None:
+        if (lag > self.max_lag) != (replica.lag > self.max_lag):
+            if lag > self.max_lag:
+                logger.warning(f"Replica {replica.name} ejected, lag {lag:.3f} s")
+            else:
+                logger.info(f"Replica {replica.name} is back, lag {lag:.3f} s")
+
+        replica.lag = lag
+        DB_REPLICA_LAG.labels(replica.name).set(lag)
+
+    def eject(self, replica: Replica) -> None:
+        self.set_lag(replica, math.inf)
+
+    def record_primary_position(self, position: int, now: float) -> None:
+        self._history.append((now, position))
+
+    def estimate_lag(self, position: int | None, now: float) -> float:
+        """
+        :param position: Воспроизведенная репликой позиция WAL, None - не реплика или недоступна
+        :param now: Момент замера
+        :return: Верхняя оценка отставания в секундах
+        """
+        if position is None:
+            return math.inf
+
+        for sampled_at, primary_position in reversed(self._history):
+            if primary_position <= position:
+                return max(now - sampled_at, 0.0)
+        return math.inf
+
+    async def replica_position(self, replica: Replica) -> int | None:
+        try:
+            async with asyncio.timeout(self.check_interval), replica.engine.connect() as connection:
+                in_recovery, position = (await connection.execute(REPLICA_POSITION_STMT)).one()
+        except Exception as err:
+            if replica.lag <= self.max_lag:
+                logger.warning(f"Replica {replica.name} lag check failed {err!r}")
+            return None
+
+        # Повышенная до основной или самостоятельная БД не получает изменений
+        if not in_recovery or position is None:
+            return None
+        return int(position)
+
+    async def check_lag(self, primary_engine: AsyncEngine) -> None:
+        """
+        Замеряет позицию основной БД, затем позиции реплик, и обновляет их отставание.
+        Без новых замеров основной БД оценка отставания реплик растет со временем.
+        """
+        try:
+            async with primary_engine.connect() as connection:
+                position = int(await connection.scalar(PRIMARY_POSITION_STMT))
+            self.record_primary_position(position, time.monotonic())
+        except Exception as err:
+            logger.warning(f"Primary WAL position check failed {err!r}")
+
+        positions = await asyncio.gather(*(self.replica_position(replica) for replica in self.replicas))
+        now = time.monotonic()
+        for replica, replica_position in zip(self.replicas, positions):
+            self.set_lag(replica, self.estimate_lag(replica_position, now))
+
+    async def run_lag_monitor(self, primary_engine: AsyncEngine) -> None:
+        """
+        Фоновая задача периодической проверки отставания реплик
+        """
+        while True:
+            try:
+                await self.check_lag(primary_engine)
+            except Exception as err:
+                logger.exception(f"Failed to check replica lag {err}")
+            await asyncio.sleep(self.check_interval)
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+# Экземпляр на процесс воркера
+replica_router = ReplicaRouter(
+    urls=settings.get_replica_urls,
+    max_lag=settings.DB_REPLICA_MAX_LAG_MS / 1000,
+    pool_size=settings.DB_REPLICA_POOL_SIZE,
+    check_interval=settings.DB_REPLICA_LAG_CHECK_INTERVAL_S,
+)
@@ -0,0 +1,98 @@
+import asyncio
+import time
+import uuid
+from contextlib import AsyncExitStack
+
+from fastapi import FastAPI
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1 import crud_services, ledger
+from app.config.config import settings
+from app.db import fast_path
+from app.db.database import async_session_maker
+from app.db.models import Wallet
+from app.db.replicas import replica_router
+
+# UUID, которого не бывает среди кошельков: запросы с ним ничего не меняют
+WARMUP_UUID = uuid.UUID(int=0)
+
+
+def hot_statements(read_only: bool) -> list:
+    """
+    Горячие запросы: выполнение на соединении компилирует их в SQLAlchemy
+    и готовит как prepared statements asyncpg
+    :param read_only: Только чтение баланса (для реплик)
+    :return: Пары (выражение, параметры)
+    """
+    params = {"wallet_uuid": WARMUP_UUID, "amount": 0}
+    statements = [(select(Wallet).where(Wallet.id == WARMUP_UUID), {})]
+    if settings.WALLET_STORAGE_ENGINE == "ledger":
+        statements.append((ledger.GET_BALANCE_STMT, params))
+    if not read_only:
+        statements += [(crud_services.DEPOSIT_STMT, params), (crud_services.WITHDRAW_STMT, params)]
+    return statements
+
+
+async def warm_up_session(session: AsyncSession, statements: list) -> None:
+    for stmt, params in statements:
+        await session.execute(stmt, params)
+    await session.rollback()
+
+
+async def warm_up_pool(session_maker: async_sessionmaker, connections: int, statements: list) -> None:
+    """
+    Открывает connections соединений одновременно, чтобы пул не выдал одно и то же,
+    и выполняет на каждом горячие запросы
+    """
+    async with AsyncExitStack() as stack:
+        sessions = [await stack.enter_async_context(session_maker()) for _ in range(connections)]
+        # Сессии закрываются только после завершения всех запросов, в том числе при ошибке
+        results = await asyncio.gather(
+            *(warm_up_session(session, statements) for session in sessions),
+            return_exceptions=True
+        )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def warm_up() -> None:
+    """
+    Прогревает пулы воркера: основной БД, быстрого пути и реплик.
+    Ошибка основной БД выбрасывается, ошибка реплики только логируется - чтения уйдут на основную БД.
+    """
+    started = time.perf_counter()
+    connections = min(settings.WARMUP_CONNECTIONS, settings.get_pool_size)
+    await warm_up_pool(async_session_maker, connections, hot_statements(read_only=False))
+
+    # Пул быстрого пути готовит запросы на min_size соединениях при создании
+    if settings.FAST_PATH_ENABLED:
+        await fast_path.get_pool()
+
+    for replica in replica_router.replicas:
+        try:
+            await warm_up_pool(
+                replica.session_maker,
+                min(connections, settings.DB_REPLICA_POOL_SIZE),
+                hot_statements(read_only=True)
+            )
+        except Exception as err:
+            logger.warning(f"Replica {replica.name} warmup failed {err!r}")
+
+    logger.info(f"Warmed up {connections} connections in {time.perf_counter() - started:.3f} s")
+
+
+async def run_warmup(app: FastAPI, retry_interval: float) -> None:
+    """
+    Фоновая задача прогрева: повторяет прогрев до успеха, после него воркер готов (app.state.ready)
+    """
+    while True:
+        try:
+            await warm_up()
+            app.state.ready = True
+            return
+        except Exception as err:
+            logger.warning(f"Warmup failed, retrying in {retry_interval} s {err!r}")
+        await asyncio.sleep(retry_interval)
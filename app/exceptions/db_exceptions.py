@@ -0,0 +1,16 @@
+
+class DatabaseException(Exception):
+    """
+    Base class for all database access exceptions.
+    """
+    pass
+
+
+class DatabaseOverloadedError(DatabaseException):
+    """
+    Raised when a request can't get a database slot before its deadline.
+    """
+    def __init__(self, retry_after: int, message: str | None = None):
+        self.retry_after = retry_after
+        self.message = message or "Database is overloaded, retry later"
+        super().__init__(self.message)
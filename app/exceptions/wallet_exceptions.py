@@ -27,3 +27,13 @@ class WalletBalanceError(WalletException):
         self.wallet_uuid = wallet_uuid
         self.message = message or f"Wallet with uuid {wallet_uuid} has not enough balance"
         super().__init__(self.message)
+
+
+class IdempotencyKeyReusedError(WalletException):
+    """
+    Raised when an idempotency key is reused with a different request.
+    """
+    def __init__(self, key: str, message: str | None = None):
+        self.key = key
+        self.message = message or f"Idempotency key {key} was already used with a different request"
+        super().__init__(self.message)
@@ -1,12 +1,120 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
+from app.api.v1 import hot_wallets, idempotency, ledger, sharding
+from app.api.v1.notifications import balance_notifier
+from app.api.v1.admin import admin_router
 from app.api.v1.wallet import wallet_router
+from app.config.config import settings
+from app.db import fast_path, warmup
+from app.db.database import engine
+from app.db.replicas import replica_router
+from app.exceptions.db_exceptions import DatabaseOverloadedError
+from app.metrics.logs import AccessLogMiddleware, log_pipeline
+from app.metrics.metrics import MetricsMiddleware, collect_metrics
+from app.metrics.tracing import TracingMiddleware, create_trace_exporter, run_exporter, tracer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Прогрев пулов, фоновые задачи воркера и освобождение ресурсов при остановке
+    """
+    log_pipeline.start(settings.LOG_LEVEL)
+
+    # Запросы принимаются сразу, /ready отвечает 200 после прогрева
+    app.state.ready = False
+    warmer = asyncio.create_task(warmup.run_warmup(app, settings.WARMUP_RETRY_INTERVAL_S))
+
+    sweeper = asyncio.create_task(idempotency.run_sweeper(
+        settings.IDEMPOTENCY_SWEEP_INTERVAL_S,
+        settings.IDEMPOTENCY_SWEEP_BATCH_SIZE
+    ))
+    rebalancer = asyncio.create_task(sharding.run_rebalancer(settings.WALLET_SHARD_REBALANCE_INTERVAL_S))
+    if settings.WALLET_STORAGE_ENGINE == "ledger":
+        projector = asyncio.create_task(ledger.run_projector(
+            settings.LEDGER_PROJECTION_INTERVAL_S,
+            settings.LEDGER_PROJECTION_BATCH_SIZE
+        ))
+    else:
+        # Доносит журнал, оставшийся после смены режима на update
+        projector = asyncio.create_task(ledger.drain_ledger(settings.LEDGER_PROJECTION_BATCH_SIZE))
+
+    reporter = asyncio.create_task(hot_wallets.run_reporter(settings.HOT_WALLETS_REPORT_INTERVAL_S))
+
+    notifier = asyncio.create_task(balance_notifier.run()) if settings.BALANCE_NOTIFY_ENABLED else None
+
+    lag_monitor = asyncio.create_task(replica_router.run_lag_monitor(engine)) if replica_router.enabled else None
+
+    trace_exporter = None
+    if tracer.enabled:
+        trace_exporter = asyncio.create_task(
+            run_exporter(tracer, create_trace_exporter(), settings.TRACE_EXPORT_INTERVAL_S)
+        )
+
+    yield
+
+    app.state.ready = False
+    warmer.cancel()
+    sweeper.cancel()
+    rebalancer.cancel()
+    projector.cancel()
+    reporter.cancel()
+    if notifier is not None:
+        notifier.cancel()
+    if lag_monitor is not None:
+        lag_monitor.cancel()
+        await replica_router.dispose()
+    if trace_exporter is not None:
+        # Остаток трасс выгружается при отмене
+        trace_exporter.cancel()
+        with suppress(asyncio.CancelledError):
+            await trace_exporter
+    await fast_path.close_pool()
+    # Дописывает очередь логов
+    await asyncio.to_thread(log_pipeline.stop)
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(wallet_router)
+app.include_router(admin_router)
+
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(AccessLogMiddleware, pipeline=log_pipeline)
+if tracer.enabled:
+    app.add_middleware(TracingMiddleware, tracer=tracer)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Метрики в формате Prometheus
+    """
+    content, content_type = collect_metrics()
+    return Response(content, media_type=content_type)
+
+
+@app.get("/health", include_in_schema=False)
+async def health():
+    """
+    Процесс жив и обрабатывает запросы. БД не проверяется
+    """
+    return {"status": "ok"}
+
+
+@app.get("/ready", include_in_schema=False)
+async def ready(request: Request):
+    """
+    Воркер прогрел пулы соединений и готов принимать нагрузку
+    """
+    if not request.app.state.ready:
+        return JSONResponse(content={"status": "warming_up"}, status_code=503)
+    return {"status": "ready"}
 
 
 @app.exception_handler(RequestValidationError)
@@ -15,3 +123,12 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"message": f"ValidationError: {exc.errors()[0]["msg"]}"},
         status_code=422
     )
+
+
+@app.exception_handler(DatabaseOverloadedError)
+async def database_overloaded_handler(request: Request, exc: DatabaseOverloadedError):
+    return JSONResponse(
+        content={"detail": exc.message},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
@@ -0,0 +1,258 @@
+import inspect
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from app.config.config import settings
+from app.metrics.metrics import LOG_RECORDS_DROPPED
+
+# Сигнал потоку записи: дописать очередь и завершиться
+_STOP = object()
+
+
+class InterceptHandler(logging.Handler):
+    """
+    Перенаправляет записи стандартного logging (библиотеки) в loguru
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        # Место вызова - первый кадр вне модуля logging
+        frame, depth = inspect.currentframe(), 0
+        while frame is not None and (depth == 0 or frame.f_code.co_filename == logging.__file__):
+            frame = frame.f_back
+            depth += 1
+        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
+
+
+class LogPipeline:
+    """
+    Неблокирующее структурное логирование: вызов логгера в цикле событий только кладет запись
+    в ограниченную очередь, сериализация в JSON и запись в поток вывода - в отдельном потоке.
+    При переполненной очереди запись отбрасывается и учитывается.
+    Повторы одного исключения из одного места за окно подавляются, первое после окна
+    несет число подавленных. Журнал запросов пишется с долей по шаблону маршрута.
+    """
+
+    def __init__(
+            self,
+            max_queue: int,
+            dedup_window: float,
+            access_sample_rate: float,
+            access_route_sample_rates: dict[str, float],
+            stream=None
+    ):
+        """
+        :param max_queue: Максимум записей, ожидающих записи; лишние отбрасываются
+        :param dedup_window: Окно подавления повторов исключения в секундах (0 - выключено)
+        :param access_sample_rate: Доля запросов в журнале запросов
+        :param access_route_sample_rates: Доля по шаблону маршрута вместо access_sample_rate
+        :param stream: Двоичный поток вывода, по умолчанию stderr
+        """
+        self.max_queue = max_queue
+        self.dedup_window = dedup_window
+        self.access_sample_rate = access_sample_rate
+        self.access_route_sample_rates = access_route_sample_rates
+        self._stream = stream
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        # Место вызова и тип исключения -> [время последней записи, подавлено с нее]
+        self._seen: dict[tuple, list] = {}
+        self._handler_id: int | None = None
+        self._thread: threading.Thread | None = None
+        self.written = 0
+        self.dropped = 0
+        self.suppressed = 0
+        self.access_logged = 0
+
+    def start(self, level: str) -> None:
+        """
+        Заменяет обработчики loguru очередью и запускает поток записи
+        :param level: Минимальный уровень записей
+        """
+        if self._thread is not None:
+            return
+        logger.remove()
+        # Трассировка исключения форматируется в вызывающем потоке, поэтому без diagnose
+        self._handler_id = logger.add(
+            self.write,
+            level=level.upper(),
+            format=lambda record: "{exception}",
+            filter=self.filter,
+            backtrace=False,
+            diagnose=False,
+        )
+        # Не ниже WARNING: на INFO SQLAlchemy пишет каждое выражение
+        logging.basicConfig(
+            handlers=[InterceptHandler()],
+            level=max(logging.getLevelNamesMapping().get(level.upper(), 0), logging.WARNING),
+            force=True
+        )
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Отключает обработчик и дописывает очередь. Блокирующий, из цикла событий - через to_thread
+        """
+        if self._thread is None:
+            return
+        logger.remove(self._handler_id)
+        self._queue.put(_STOP, timeout=timeout)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def filter(self, record: dict) -> bool:
+        """
+        Подавляет повтор исключения до форматирования его трассировки
+        """
+        exception = record["exception"]
+        if exception is None or not self.dedup_window:
+            return True
+
+        # Ключей не больше, чем мест вызова с разными типами исключений
+        key = (record["name"], record["function"], record["line"], exception.type)
+        now = time.monotonic()
+        seen = self._seen.get(key)
+        if seen is not None and now - seen[0] < self.dedup_window:
+            seen[1] += 1
+            self.suppressed += 1
+            return False
+
+        if seen is not None and seen[1]:
+            record["extra"]["suppressed"] = seen[1]
+        self._seen[key] = [now, 0]
+        return True
+
+    def write(self, message) -> None:
+        """
+        Приемник loguru: запись и текст исключения в очередь без ожидания
+        """
+        try:
+            self._queue.put_nowait((message.record, str(message)))
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+    def should_log_access(self, route: str, status_code: int) -> bool:
+        """
+        Попадает ли запрос в журнал запросов. Ответы 5xx пишутся всегда
+        :param route: Шаблон маршрута
+        """
+        if status_code >= 500:
+            return True
+        rate = self.access_route_sample_rates.get(route, self.access_sample_rate)
+        return rate > 0 and random.random() < rate
+
+    def _run(self) -> None:
+        stream = self._stream or sys.stderr.buffer
+        while True:
+            batch = [self._queue.get()]
+            # Все накопившееся - одной записью в поток
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(item is _STOP for item in batch)
+            lines = [encode_record(*item) for item in batch if item is not _STOP]
+            if lines:
+                try:
+                    stream.write(b"".join(lines))
+                    stream.flush()
+                    self.written += len(lines)
+                except Exception:
+                    self.dropped += len(lines)
+            if stop:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "written": self.written,
+            "dropped": self.dropped,
+            "suppressed": self.suppressed,
+            "access_logged": self.access_logged,
+        }
+
+
+def encode_record(record: dict, exception: str) -> bytes:
+    """
+    Запись loguru строкой JSON
+    """
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "pid": record["process"].id,
+        **record["extra"],
+    }
+    if exception:
+        entry["exception"] = exception
+    return json.dumps(entry, default=str).encode() + b"\n"
+
+
+class AccessLogMiddleware:
+    """
+    ASGI middleware: журнал запросов с долей по шаблону маршрута вместо строки на каждый запрос
+    """
+
+    def __init__(self, app, pipeline: LogPipeline):
+        self.app = app
+        self.pipeline = pipeline
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            if self.pipeline.should_log_access(route_path, status_code):
+                self.pipeline.access_logged += 1
+                logger.info(
+                    "request",
+                    method=scope["method"],
+                    route=route_path,
+                    path=scope["path"],
+                    status=status_code,
+                    duration_ms=round((time.perf_counter() - started) * 1000, 3),
+                )
+
+
+def create_log_pipeline() -> LogPipeline:
+    return LogPipeline(
+        settings.LOG_QUEUE_MAX_SIZE,
+        settings.LOG_EXCEPTION_DEDUP_WINDOW_S,
+        settings.LOG_ACCESS_SAMPLE_RATE,
+        settings.get_access_log_sample_rates,
+    )
+
+
+# Экземпляр на процесс воркера
+log_pipeline = create_log_pipeline()
@@ -0,0 +1,213 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.metrics.tracing import SPAN_KIND_CLIENT, tracer
+
+
+# Границы корзин под латентности от долей миллисекунды до секунд
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "wallet_http_request_duration_seconds",
+    "HTTP request duration",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+DB_STATEMENT_DURATION = Histogram(
+    "wallet_db_statement_duration_seconds",
+    "SQL statement execution time",
+    ["statement"],
+    buckets=LATENCY_BUCKETS,
+)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "wallet_db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=LATENCY_BUCKETS,
+)
+
+# livesum - сумма по живым воркерам gunicorn
+DB_POOL_CHECKED_OUT = Gauge(
+    "wallet_db_pool_checked_out",
+    "Pooled connections checked out",
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_OVERFLOW = Gauge(
+    "wallet_db_pool_overflow",
+    "Connections open above pool_size",
+    multiprocess_mode="livesum",
+)
+
+DB_POOL_WAITERS = Gauge(
+    "wallet_db_pool_waiters",
+    "Checkouts waiting for a pooled connection",
+    multiprocess_mode="livesum",
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "wallet_admission_queue_depth",
+    "Requests waiting for a database slot",
+    multiprocess_mode="livesum",
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "wallet_admission_in_flight",
+    "Requests holding a database slot",
+    multiprocess_mode="livesum",
+)
+
+ADMISSION_SHED = Counter(
+    "wallet_admission_shed_total",
+    "Requests rejected by admission control",
+    ["reason"],
+)
+
+DB_REPLICA_LAG = Gauge(
+    "wallet_db_replica_lag_seconds",
+    "Replication lag of a read replica, +Inf while unreachable",
+    ["replica"],
+    multiprocess_mode="max",
+)
+
+DB_READS_ROUTED = Counter(
+    "wallet_db_reads_routed_total",
+    "Balance reads by routing target",
+    ["target"],
+)
+
+BALANCE_SUBSCRIBERS = Gauge(
+    "wallet_balance_subscribers",
+    "Open balance update subscriptions",
+    multiprocess_mode="livesum",
+)
+
+BALANCE_UPDATES = Counter(
+    "wallet_balance_updates_total",
+    "Balance updates received for subscribed wallets by outcome",
+    ["outcome"],
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "wallet_log_records_dropped_total",
+    "Log records dropped because the log queue was full",
+)
+
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: латентность запросов по шаблону маршрута и статусу ответа
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Шаблон маршрута, а не фактический путь: UUID кошельков не попадают в метки
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status_code),
+            ).observe(time.perf_counter() - started)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений с замером ожидания соединения и gauge-метриками состояния
+    """
+
+    def _do_get(self):
+        # Ждет только вызов при исчерпанном пуле: свободное или новое соединение выдается сразу
+        waiting = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        if waiting:
+            DB_POOL_WAITERS.inc()
+        span = tracer.start_span("db.pool.checkout", SPAN_KIND_CLIENT)
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if waiting:
+                DB_POOL_WAITERS.dec()
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+            if span is not None:
+                span.end()
+            self._update_gauges()
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        DB_POOL_CHECKED_OUT.set(self.checkedout())
+        DB_POOL_OVERFLOW.set(max(self.overflow(), 0))
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Подключает к движку SQLAlchemy замер времени выражений
+    :param engine: Асинхронный движок
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        DB_STATEMENT_DURATION.labels(statement.lstrip().split(None, 1)[0].upper()).observe(elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        # Выражение завершилось ошибкой: after_cursor_execute не будет вызван
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+
+def collect_metrics() -> tuple[bytes, str]:
+    """
+    Собирает метрики; при заданном PROMETHEUS_MULTIPROC_DIR - по всем воркерам gunicorn
+    :return: Тело ответа и его content type
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
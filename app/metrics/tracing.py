@@ -0,0 +1,449 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+import httpx
+from loguru import logger
+from pydantic_core import to_json
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config.config import settings
+
+# Виды спанов OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_CODE_ERROR = 2
+
+# Текущая трасса и спан запроса; None - запрос не записывается
+_current_trace: ContextVar["Trace | None"] = ContextVar("current_trace", default=None)
+_current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+# Общий пустой контекст для незаписываемых запросов, без создания объекта на вызов
+_NOT_RECORDING = nullcontext()
+
+
+class Span:
+    """
+    Интервал работы внутри трассы. Время - unix-время в наносекундах, как в OTLP.
+    """
+    __slots__ = ("name", "kind", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, kind: int, parent_id: int | None, attributes: dict | None = None):
+        self.name = name
+        self.kind = kind
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error = False
+
+    def end(self, error: bool = False) -> None:
+        self.end_ns = time.time_ns()
+        self.error = self.error or error
+
+
+class Trace:
+    """
+    Спаны одного запроса. Решение о сохранении принимается в конце запроса.
+    """
+    __slots__ = ("trace_id", "sampled", "root", "spans")
+
+    def __init__(self, trace_id: int, sampled: bool, root: Span):
+        self.trace_id = trace_id
+        # Сохраняется независимо от длительности (головное сэмплирование)
+        self.sampled = sampled
+        self.root = root
+        self.spans = [root]
+
+
+def parse_traceparent(value: str) -> tuple[int, int, bool] | None:
+    """
+    Заголовок W3C traceparent: "00-<trace id>-<parent span id>-<flags>"
+    :return: id трассы, id родительского спана, флаг сэмплирования или None для некорректного заголовка
+    """
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        trace_id, parent_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    if not trace_id or not parent_id:
+        return None
+    return trace_id, parent_id, bool(flags & 1)
+
+
+class Tracer:
+    """
+    Трассировка запросов с головным (доля запросов) и хвостовым (медленнее порога) сэмплированием.
+    При нулевой доле и выключенном пороге запросы не записываются вовсе, а точки трассировки
+    сводятся к чтению contextvar.
+    """
+
+    def __init__(self, sample_rate: float, slow_threshold: float, max_queue: int):
+        """
+        :param sample_rate: Доля запросов, трасса которых сохраняется всегда
+        :param slow_threshold: Порог длительности запроса в секундах, медленные сохраняются всегда (0 - выключено)
+        :param max_queue: Максимум трасс, ожидающих выгрузки; лишние отбрасываются
+        """
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.max_queue = max_queue
+        self.enabled = sample_rate > 0 or slow_threshold > 0
+        self._queue: deque[Trace] = deque()
+        self.sampled = 0
+        self.slow = 0
+        self.dropped = 0
+        self.exported = 0
+        self.failed = 0
+
+    def start_trace(self, name: str, traceparent: str | None = None, attributes: dict | None = None) -> Trace | None:
+        """
+        Начинает трассу запроса. Решение родителя из traceparent о сэмплировании соблюдается.
+        :return: Трасса или None, если запрос не записывается
+        """
+        parent = parse_traceparent(traceparent) if traceparent else None
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id, sampled = 0, None, random.random() < self.sample_rate
+
+        if not sampled and not self.slow_threshold:
+            return None
+
+        root = Span(name, SPAN_KIND_SERVER, parent_id, attributes)
+        return Trace(trace_id or random.getrandbits(128), sampled, root)
+
+    def finish_trace(self, trace: Trace) -> None:
+        """
+        Завершает трассу и ставит в очередь выгрузки, если она сэмплирована или медленная
+        """
+        root = trace.root
+        root.end()
+        if trace.sampled:
+            self.sampled += 1
+        elif (root.end_ns - root.start_ns) / 1e9 >= self.slow_threshold:
+            self.slow += 1
+        else:
+            return
+
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append(trace)
+
+    def start_span(self, name: str, kind: int = SPAN_KIND_INTERNAL, attributes: dict | None = None) -> Span | None:
+        """
+        Начинает дочерний спан текущего спана, не делая его текущим (для пар событий before/after)
+        :return: Спан или None, если запрос не записывается
+        """
+        trace = _current_trace.get()
+        if trace is None:
+            return None
+
+        parent = _current_span.get()
+        span = Span(name, kind, parent.span_id if parent is not None else None, attributes)
+        trace.spans.append(span)
+        return span
+
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, attributes: dict | None = None):
+        """
+        Контекстный менеджер дочернего спана, спан текущий внутри блока
+        """
+        if _current_trace.get() is None:
+            return _NOT_RECORDING
+        return _SpanScope(self, name, kind, attributes)
+
+    def drain(self) -> list[Trace]:
+        traces = list(self._queue)
+        self._queue.clear()
+        return traces
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "slow_threshold_ms": self.slow_threshold * 1000,
+            "queued": len(self._queue),
+            "sampled": self.sampled,
+            "slow": self.slow,
+            "dropped": self.dropped,
+            "exported": self.exported,
+            "failed": self.failed,
+        }
+
+
+class _SpanScope:
+    __slots__ = ("tracer", "name", "kind", "attributes", "span", "token")
+
+    def __init__(self, tracer: Tracer, name: str, kind: int, attributes: dict | None):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+
+    def __enter__(self) -> Span:
+        self.span = self.tracer.start_span(self.name, self.kind, self.attributes)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_span.reset(self.token)
+        self.span.end(error=exc_type is not None)
+
+
+def encode_attributes(attributes: dict) -> list[dict]:
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            encoded.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            encoded.append({"key": key, "value": {"intValue": str(value)}})
+        else:
+            encoded.append({"key": key, "value": {"stringValue": str(value)}})
+    return encoded
+
+
+def encode_otlp(traces: list[Trace], service_name: str) -> bytes:
+    """
+    Трассы в формате OTLP/JSON (ExportTraceServiceRequest): принимается OTLP/HTTP коллектором
+    и файловым приемником OpenTelemetry Collector
+    """
+    spans = []
+    for trace in traces:
+        trace_id = f"{trace.trace_id:032x}"
+        for span in trace.spans:
+            # Спан, не завершенный к концу запроса (например, прерванный поток), закрывается вместе с запросом
+            end_ns = span.end_ns or trace.root.end_ns
+            spans.append({
+                "traceId": trace_id,
+                "spanId": f"{span.span_id:016x}",
+                "parentSpanId": f"{span.parent_id:016x}" if span.parent_id is not None else "",
+                "name": span.name,
+                "kind": span.kind,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(end_ns),
+                "attributes": encode_attributes(span.attributes),
+                "status": {"code": STATUS_CODE_ERROR} if span.error else {},
+            })
+
+    return to_json({"resourceSpans": [{
+        "resource": {"attributes": encode_attributes({"service.name": service_name, "process.pid": os.getpid()})},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+    }]})
+
+
+class TraceExporter:
+    """
+    Интерфейс выгрузки пачки трасс в OTLP/JSON
+    """
+
+    async def export(self, payload: bytes) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class FileTraceExporter(TraceExporter):
+    """
+    Дописывает пачку трасс строкой в файл (формат файлового приемника OpenTelemetry Collector).
+    {pid} в пути - pid воркера, у каждого воркера свой файл.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, payload: bytes) -> None:
+        with open(self.path.format(pid=os.getpid()), "ab") as file:
+            file.write(payload + b"\n")
+
+    async def export(self, payload: bytes) -> None:
+        await asyncio.to_thread(self._write, payload)
+
+
+class HttpTraceExporter(TraceExporter):
+    """
+    Отправляет пачку трасс OTLP/HTTP коллектору (JSON, например http://collector:4318/v1/traces)
+    """
+
+    def __init__(self, endpoint: str, timeout: float):
+        self.endpoint = endpoint
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def export(self, payload: bytes) -> None:
+        response = await self._client.post(
+            self.endpoint,
+            content=payload,
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_trace_exporter() -> TraceExporter:
+    """
+    Коллектор, если задан TRACE_EXPORT_ENDPOINT, иначе файл TRACE_EXPORT_PATH
+    """
+    if settings.TRACE_EXPORT_ENDPOINT:
+        return HttpTraceExporter(settings.TRACE_EXPORT_ENDPOINT, settings.TRACE_EXPORT_TIMEOUT_S)
+    return FileTraceExporter(settings.TRACE_EXPORT_PATH)
+
+
+async def export_traces(tracer: Tracer, exporter: TraceExporter, service_name: str) -> None:
+    traces = tracer.drain()
+    if not traces:
+        return
+    try:
+        await exporter.export(encode_otlp(traces, service_name))
+        tracer.exported += len(traces)
+    except Exception as err:
+        tracer.failed += len(traces)
+        logger.warning(f"Trace export failed {err!r}")
+
+
+async def run_exporter(tracer: Tracer, exporter: TraceExporter, interval: float) -> None:
+    """
+    Фоновая задача: выгружает накопленные трассы раз в interval секунд, при остановке - остаток
+    """
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await export_traces(tracer, exporter, settings.TRACE_SERVICE_NAME)
+    finally:
+        await export_traces(tracer, exporter, settings.TRACE_SERVICE_NAME)
+        await exporter.close()
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: корневой спан запроса и спан отправки ответа
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        trace = self.tracer.start_trace(
+            f"{scope['method']} {scope['path']}",
+            traceparent,
+            {"http.method": scope["method"]}
+        )
+        if trace is None:
+            await self.app(scope, receive, send)
+            return
+
+        root = trace.root
+        send_span = None
+
+        async def traced_send(message):
+            nonlocal send_span
+            if message["type"] == "http.response.start":
+                root.attributes["http.status_code"] = message["status"]
+                root.error = message["status"] >= 500
+                send_span = self.tracer.start_span("http.send")
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body") and send_span is not None:
+                send_span.end()
+
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, traced_send)
+        except BaseException:
+            root.error = True
+            raise
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            # Шаблон маршрута известен только после маршрутизации
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+                root.attributes["http.route"] = route.path
+            self.tracer.finish_trace(trace)
+
+
+def trace_engine(engine) -> None:
+    """
+    Спаны выражений SQL движка и фиксации сессий. При выключенной трассировке ничего не подключается.
+    Парные события находят свой спан в стеке соединения (в info сессии для commit).
+    :param engine: Асинхронный движок
+    """
+    if not tracer.enabled:
+        return
+
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_trace.get() is None:
+            return
+        span = tracer.start_span("db.query", SPAN_KIND_CLIENT, {
+            "db.system": "postgresql",
+            "db.operation": statement.lstrip().split(None, 1)[0].upper(),
+            "db.statement": statement[:settings.TRACE_STATEMENT_MAX_LENGTH],
+        })
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_trace.get() is None:
+            return
+        conn.info["trace_spans"].pop().end()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        connection = exception_context.connection
+        if _current_trace.get() is None or connection is None or not connection.info.get("trace_spans"):
+            return
+        connection.info["trace_spans"].pop().end(error=True)
+
+    # События сессии, а не движка: commit включает flush
+    @event.listens_for(Session, "before_commit")
+    def before_commit(session):
+        span = tracer.start_span("db.commit", SPAN_KIND_CLIENT)
+        if span is not None:
+            session.info["trace_commit_span"] = span
+
+    @event.listens_for(Session, "after_commit")
+    def after_commit(session):
+        span = session.info.pop("trace_commit_span", None)
+        if span is not None:
+            span.end()
+
+    @event.listens_for(Session, "after_soft_rollback")
+    def after_soft_rollback(session, previous_transaction):
+        # Неудачный commit завершается откатом
+        span = session.info.pop("trace_commit_span", None)
+        if span is not None:
+            span.end(error=True)
+
+
+# Экземпляр на процесс воркера
+tracer = Tracer(
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    slow_threshold=settings.TRACE_SLOW_THRESHOLD_MS / 1000,
+    max_queue=settings.TRACE_EXPORT_MAX_QUEUE,
+)
@@ -0,0 +1,184 @@
+"""
+Нагрузочный прогон приложения внутри процесса: запросы идут в app.main:app через ASGI-транспорт httpx,
+без сети и внешнего клиента, против локальной БД. Для каждого сценария - пропускная способность
+и задержки p50/p95/p99. Результат пишется в JSON и сравнивается с сохраненным эталоном.
+
+Запуск (переменные подключения к БД - как для приложения, схема создана alembic upgrade head):
+    python -m benchmarks.asgi_benchmark --requests 2000 --concurrency 20 --output asgi_results.json
+Обновить эталон после осознанного изменения производительности:
+    python -m benchmarks.asgi_benchmark --update-baseline
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from httpx import ASGITransport, AsyncClient, Response
+
+from app.config.config import settings
+from app.main import app
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "asgi_benchmark.json"
+
+# Настройки, при различии которых сравнение с эталоном бессмысленно
+COMPARED_SETTINGS = (
+    "FAST_PATH_ENABLED",
+    "WALLET_COALESCING_ENABLED",
+    "BALANCE_CACHE_ENABLED",
+    "WALLET_STORAGE_ENGINE",
+)
+
+Request = Callable[[AsyncClient, int], Awaitable[Response]]
+
+
+async def create_wallet(client: AsyncClient) -> str:
+    response = await client.post("/api/v1/wallets/create_wallet")
+    wallet_uuid = response.json()["wallet_uuid"]
+    await client.post(f"/api/v1/wallets/{wallet_uuid}/operation", json={"operation": "DEPOSIT", "amount": "1000000"})
+    return wallet_uuid
+
+
+async def build_scenarios(client: AsyncClient, concurrency: int) -> dict[str, tuple[Request, int]]:
+    """
+    Сценарии: запрос по номеру потока и ожидаемый код ответа.
+    В несостязательных сценариях у каждого потока свой кошелек, в contended - один на всех.
+    """
+    wallets = [await create_wallet(client) for _ in range(concurrency)]
+    hot_wallet = await create_wallet(client)
+    deposit = {"operation": "DEPOSIT", "amount": "1.00"}
+    withdraw = {"operation": "WITHDRAW", "amount": "1.00"}
+
+    return {
+        "create": (lambda c, worker: c.post("/api/v1/wallets/create_wallet"), 201),
+        "get_balance": (lambda c, worker: c.get(f"/api/v1/wallets/{wallets[worker]}"), 200),
+        "deposit": (lambda c, worker: c.post(f"/api/v1/wallets/{wallets[worker]}/operation", json=deposit), 200),
+        "withdraw": (lambda c, worker: c.post(f"/api/v1/wallets/{wallets[worker]}/operation", json=withdraw), 200),
+        "contended": (
+            lambda c, worker: c.post(
+                f"/api/v1/wallets/{hot_wallet}/operation",
+                json=deposit if worker % 2 else withdraw
+            ),
+            200
+        ),
+    }
+
+
+def percentile(latencies: list[float], q: int) -> float:
+    return statistics.quantiles(latencies, n=100, method="inclusive")[q - 1]
+
+
+async def run_scenario(client: AsyncClient, request: Request, status_code: int, requests: int, concurrency: int) -> dict:
+    """
+    Выполняет requests запросов в concurrency потоков
+    :return: Запросов в секунду, задержки в миллисекундах и число неожиданных ответов
+    """
+    queue = iter(range(requests))
+    latencies = []
+    errors = 0
+
+    async def worker(number: int):
+        nonlocal errors
+        for _ in queue:
+            started = time.perf_counter()
+            response = await request(client, number)
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code != status_code
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "errors": errors,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Регрессии относительно эталона: пропускная способность ниже или p95/p99 выше более чем на tolerance
+    :return: Описания регрессий
+    """
+    regressions = []
+    if results["concurrency"] != baseline["concurrency"]:
+        regressions.append(f"concurrency {results['concurrency']}, baseline {baseline['concurrency']}")
+    for name in COMPARED_SETTINGS:
+        if results["settings"][name] != baseline["settings"].get(name):
+            regressions.append(f"settings: {name}={results['settings'][name]}, "
+                               f"baseline {baseline['settings'].get(name)}")
+
+    for name, current in results["scenarios"].items():
+        expected = baseline["scenarios"].get(name)
+        if expected is None:
+            continue
+        if current["errors"]:
+            regressions.append(f"{name}: {current['errors']} unexpected responses")
+        if current["rps"] < expected["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {current['rps']:.0f} < baseline {expected['rps']:.0f}")
+        for key in ("p95_ms", "p99_ms"):
+            if current[key] > expected[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {current[key]:.2f} > baseline {expected[key]:.2f}")
+    return regressions
+
+
+async def main(requests: int, concurrency: int, output: Path | None, update_baseline: bool, tolerance: float) -> int:
+    results = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "python": platform.python_version(),
+        "pool_size": settings.get_pool_size,
+        "settings": {name: getattr(settings, name) for name in COMPARED_SETTINGS},
+        "scenarios": {},
+    }
+
+    # ASGI-транспорт не отправляет события lifespan, фоновые задачи запускаются явно
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            scenarios = await build_scenarios(client, concurrency)
+
+            print(f"{'scenario':<12} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+            for name, (request, status_code) in scenarios.items():
+                # Прогрев: соединения пула, подготовка выражений
+                await run_scenario(client, request, status_code, concurrency * 10, concurrency)
+                result = await run_scenario(client, request, status_code, requests, concurrency)
+                results["scenarios"][name] = result
+                print(f"{name:<12} {result['rps']:>8.0f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                      f"{result['p99_ms']:>8.2f} {result['errors']:>7}")
+
+    if output is not None:
+        output.write_text(json.dumps(results, indent=2))
+
+    if update_baseline:
+        BASELINE_PATH.parent.mkdir(exist_ok=True)
+        BASELINE_PATH.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"baseline updated: {BASELINE_PATH}")
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print("no baseline to compare with")
+        return 0
+
+    regressions = compare(results, json.loads(BASELINE_PATH.read_text()), tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output", type=Path, default=None, help="Файл для результатов в JSON")
+    parser.add_argument("--update-baseline", action="store_true", help="Записать результаты как новый эталон")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое ухудшение относительно эталона")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.requests, args.concurrency, args.output, args.update_baseline, args.tolerance)))
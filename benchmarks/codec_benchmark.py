@@ -0,0 +1,95 @@
+"""
+Сравнение процессорного времени на разбор тела запроса и сборку ответа маршрутов кошельков:
+json.loads + проверка dict и JSONResponse против разбора pydantic-core и готовых байтовых шаблонов.
+БД не нужна.
+
+Запуск:
+    python -m benchmarks.codec_benchmark --requests 200000
+"""
+import argparse
+import json
+import time
+import uuid
+from typing import Callable
+
+from fastapi.responses import JSONResponse, Response
+
+from app.api.v1 import codec
+from app.api.v1.models import (
+    BatchOperationRequest,
+    BatchOperationResponse,
+    BatchOperationResult,
+    OperationStatus,
+    WalletOperation,
+    from_minor_units,
+)
+
+OPERATION_BODY = b'{"operation": "DEPOSIT", "amount": "100.50"}'
+BATCH_BODY = json.dumps({
+    "mode": "BEST_EFFORT",
+    "operations": [
+        {"wallet_uuid": str(uuid.uuid4()), "operation": "WITHDRAW", "amount": "1.25"} for _ in range(100)
+    ]
+}).encode()
+BALANCE = 1234567
+
+
+def batch_response() -> BatchOperationResponse:
+    request = BatchOperationRequest.model_validate_json(BATCH_BODY)
+    return BatchOperationResponse(applied=True, results=[
+        BatchOperationResult(wallet_uuid=item.wallet_uuid, status=OperationStatus.SUCCESS, balance=BALANCE)
+        for item in request.operations
+    ])
+
+
+def measure(call: Callable[[], object], requests: int) -> float:
+    """
+    :return: Процессорное время на вызов в микросекундах
+    """
+    started = time.process_time()
+    for _ in range(requests):
+        call()
+    return (time.process_time() - started) / requests * 1e6
+
+
+def main(requests: int) -> None:
+    batch = batch_response()
+    cases = {
+        "decode operation": (
+            lambda: WalletOperation.model_validate(json.loads(OPERATION_BODY)),
+            lambda: WalletOperation.model_validate_json(OPERATION_BODY),
+        ),
+        "encode operation": (
+            lambda: JSONResponse({"status": "success", "balance": from_minor_units(BALANCE)}),
+            lambda: codec.operation_response(BALANCE),
+        ),
+        "encode balance": (
+            lambda: JSONResponse({"balance": from_minor_units(BALANCE)}),
+            lambda: codec.balance_response(BALANCE),
+        ),
+        "decode batch": (
+            lambda: BatchOperationRequest.model_validate(json.loads(BATCH_BODY)),
+            lambda: BatchOperationRequest.model_validate_json(BATCH_BODY),
+        ),
+        "encode batch": (
+            lambda: JSONResponse(batch.model_dump(mode="json")),
+            lambda: Response(batch.model_dump_json(), media_type="application/json"),
+        ),
+    }
+
+    print(f"{'case':<18} {'stdlib us':>10} {'codec us':>10} {'saved us':>10}")
+    for name, (stdlib, fast) in cases.items():
+        # Батч из 100 операций в 100 раз дороже, поэтому и повторов меньше
+        count = requests // 100 if "batch" in name else requests
+        measure(stdlib, count // 10)
+        measure(fast, count // 10)
+        before, after = measure(stdlib, count), measure(fast, count)
+        print(f"{name:<18} {before:>10.2f} {after:>10.2f} {before - after:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200000)
+    args = parser.parse_args()
+
+    main(args.requests)
@@ -0,0 +1,79 @@
+"""
+Сравнение процессорного времени на запрос для пути через SQLAlchemy и быстрого пути asyncpg.
+
+Запуск (переменные подключения к БД - как для приложения):
+    python -m benchmarks.fast_path_benchmark --requests 5000 --concurrency 10
+"""
+import argparse
+import asyncio
+import time
+from decimal import Decimal
+
+from app.api.v1 import crud_services
+from app.api.v1.models import Operation, to_minor_units
+from app.config.config import settings
+from app.db import fast_path
+from app.db.database import async_session_maker, engine
+
+AMOUNT = to_minor_units(Decimal("1.00"))
+
+
+async def run_operation(name: str, wallet_uuid: str) -> None:
+    async with async_session_maker() as session:
+        if name == "create":
+            await crud_services.create_wallet(session)
+        elif name == "get_balance":
+            await crud_services.get_wallet_balance(wallet_uuid, session, use_cache=False)
+        elif name == "deposit":
+            await crud_services.wallet_operation(wallet_uuid, Operation.DEPOSIT, AMOUNT, session)
+        else:
+            await crud_services.wallet_operation(wallet_uuid, Operation.WITHDRAW, AMOUNT, session)
+
+
+async def measure(name: str, wallet_uuid: str, requests: int, concurrency: int) -> tuple[float, float]:
+    """
+    Выполняет requests запросов в concurrency потоков
+    :return: Процессорное время и время по часам на запрос в микросекундах
+    """
+    queue = iter(range(requests))
+
+    async def worker():
+        for _ in queue:
+            await run_operation(name, wallet_uuid)
+
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    cpu, wall = time.process_time() - cpu_started, time.perf_counter() - wall_started
+
+    return cpu / requests * 1e6, wall / requests * 1e6
+
+
+async def main(requests: int, concurrency: int) -> None:
+    # Кэш и объединение операций исказили бы сравнение путей доступа к БД
+    settings.WALLET_COALESCING_ENABLED = False
+
+    async with async_session_maker() as session:
+        wallet_uuid = str(await crud_services.create_wallet(session))
+        await crud_services.wallet_operation(wallet_uuid, Operation.DEPOSIT, AMOUNT * requests * 2, session)
+
+    print(f"{'operation':<12} {'path':<11} {'cpu us/req':>11} {'wall us/req':>12}")
+    for name in ("create", "get_balance", "deposit", "withdraw"):
+        for fast in (False, True):
+            settings.FAST_PATH_ENABLED = fast
+            # Прогрев: соединения пула и подготовка выражений
+            await measure(name, wallet_uuid, concurrency * 10, concurrency)
+            cpu, wall = await measure(name, wallet_uuid, requests, concurrency)
+            path = "asyncpg" if fast else "sqlalchemy"
+            print(f"{name:<12} {path:<11} {cpu:>11.1f} {wall:>12.1f}")
+
+    await fast_path.close_pool()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.concurrency))
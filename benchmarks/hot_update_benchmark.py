@@ -0,0 +1,148 @@
+"""
+Сравнение таблицы wallets до и после секционирования: пропускная способность обновлений баланса,
+доля HOT-обновлений и раздувание таблицы. Каждый вариант создается в своей схеме, обновления
+выполняются запросами crud_services без изменений.
+
+Запуск (переменные подключения к БД - как для приложения):
+    python -m benchmarks.hot_update_benchmark --operations 50000 --wallets 10000 --concurrency 50
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.api.v1 import crud_services
+from app.config.config import settings
+from app.db.models.models import wallet_partitions_ddl
+
+TABLE_DDL = """
+    CREATE TABLE wallets (
+        id uuid PRIMARY KEY,
+        slot_count integer NOT NULL DEFAULT 0,
+        balance bigint NOT NULL,
+        CONSTRAINT balance_check CHECK (balance >= 0)
+    ) {partition_by}
+"""
+INDEX_DDL = "CREATE INDEX ON wallets (id) WHERE slot_count > 0"
+
+# Схема, DDL таблицы
+VARIANTS = {
+    "bench_plain": [TABLE_DDL.format(partition_by=""), INDEX_DDL],
+    "bench_partitioned": [
+        TABLE_DDL.format(partition_by="PARTITION BY HASH (id)"), INDEX_DDL, *wallet_partitions_ddl()
+    ],
+}
+
+# Сумма по таблицам схемы варианта: для секционированной таблицы - по секциям
+TABLE_STATS_STMT = text("""
+    SELECT sum(pg_total_relation_size(relid)), sum(n_tup_upd), sum(n_tup_hot_upd), sum(n_dead_tup)
+    FROM pg_stat_user_tables
+    WHERE schemaname = current_schema()
+""")
+
+
+def create_engine(schema: str, pool_size: int) -> AsyncEngine:
+    """
+    Движок, у соединений которого wallets - таблица схемы варианта
+    """
+    return create_async_engine(
+        settings.get_db_url,
+        pool_size=pool_size,
+        max_overflow=0,
+        connect_args={"server_settings": {"search_path": schema}},
+    )
+
+
+async def prepare(schema: str, ddl: list[str], wallets: int) -> list[str]:
+    engine = create_engine(schema, pool_size=1)
+    async with engine.begin() as connection:
+        await connection.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        await connection.execute(text(f"CREATE SCHEMA {schema}"))
+        for stmt in ddl:
+            await connection.execute(text(stmt))
+        result = await connection.execute(
+            text("""
+                INSERT INTO wallets (id, balance)
+                SELECT gen_random_uuid(), 0 FROM generate_series(1, :wallets)
+                RETURNING id
+            """),
+            {"wallets": wallets}
+        )
+        wallet_ids = [str(wallet_id) for wallet_id in result.scalars()]
+        await connection.execute(text("ANALYZE wallets"))
+    await engine.dispose()
+    return wallet_ids
+
+
+async def table_stats(schema: str) -> tuple[int, int, int, int]:
+    """
+    Размер с индексами, обновления, HOT-обновления и мертвые версии строк
+    """
+    # Статистика отправляется сервером с задержкой
+    await asyncio.sleep(1)
+    engine = create_engine(schema, pool_size=1)
+    async with engine.connect() as connection:
+        result = await connection.execute(TABLE_STATS_STMT)
+        stats = tuple(int(value or 0) for value in result.one())
+    await engine.dispose()
+    return stats
+
+
+async def measure(schema: str, wallet_ids: list[str], operations: int, concurrency: int) -> float:
+    """
+    Выполняет operations пополнений случайных кошельков в concurrency соединений
+    :return: Обновлений в секунду
+    """
+    engine = create_engine(schema, pool_size=concurrency)
+    queue = iter(range(operations))
+
+    async def worker():
+        async with engine.connect() as connection:
+            for _ in queue:
+                await connection.execute(
+                    crud_services.DEPOSIT_STMT,
+                    {"wallet_uuid": random.choice(wallet_ids), "amount": 1}
+                )
+                await connection.commit()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    throughput = operations / (time.perf_counter() - started)
+
+    # Статистика сбрасывается при закрытии соединений
+    await engine.dispose()
+    return throughput
+
+
+async def main(operations: int, wallets: int, concurrency: int, keep: bool) -> None:
+    print(f"{'table':<18} {'updates/s':>10} {'HOT %':>7} {'size KiB':>10} {'+KiB':>8} {'dead tuples':>12}")
+    for schema, ddl in VARIANTS.items():
+        wallet_ids = await prepare(schema, ddl, wallets)
+
+        size_before, *_ = await table_stats(schema)
+        throughput = await measure(schema, wallet_ids, operations, concurrency)
+        size_after, updated, hot_updated, dead = await table_stats(schema)
+
+        hot = 100 * hot_updated / updated if updated else 0
+        growth = (size_after - size_before) / 1024
+        print(f"{schema:<18} {throughput:>10.0f} {hot:>7.1f} {size_after / 1024:>10.0f} {growth:>8.0f} {dead:>12}")
+
+        if not keep:
+            engine = create_engine(schema, pool_size=1)
+            async with engine.begin() as connection:
+                await connection.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=50000)
+    parser.add_argument("--wallets", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="Не удалять схемы после замера")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.operations, args.wallets, args.concurrency, args.keep))
@@ -0,0 +1,100 @@
+"""
+Сравнение хранения операций изменением строки кошелька (update) и журналом (ledger):
+пропускная способность операций и рост таблиц.
+
+Запуск (переменные подключения к БД - как для приложения):
+    python -m benchmarks.ledger_benchmark --operations 20000 --wallets 100 --concurrency 50
+"""
+import argparse
+import asyncio
+import random
+import time
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from app.api.v1 import crud_services, ledger
+from app.api.v1.models import Operation, to_minor_units
+from app.config.config import settings
+from app.db.database import async_session_maker, engine
+
+AMOUNT = to_minor_units(Decimal("1.00"))
+
+
+TABLE_STATS_STMT = text("""
+    SELECT relname, pg_total_relation_size(relid), n_dead_tup
+    FROM pg_stat_user_tables
+    WHERE relname IN ('wallets', 'wallet_ledger')
+""")
+
+
+async def table_stats() -> dict[str, tuple[int, int]]:
+    """
+    Размер таблиц с индексами и число мертвых версий строк
+    """
+    # Статистика по мертвым строкам отправляется сервером с задержкой
+    await asyncio.sleep(1)
+    async with async_session_maker() as session:
+        result = await session.execute(TABLE_STATS_STMT)
+        return {name: (size, dead) for name, size, dead in result.all()}
+
+
+async def create_wallets(count: int, balance: int) -> list[str]:
+    async with async_session_maker() as session:
+        wallet_ids = []
+        async for chunk in crud_services.create_wallets_bulk(count, balance, None, count, session):
+            wallet_ids.extend(chunk)
+        return wallet_ids
+
+
+async def measure(wallet_ids: list[str], operations: int, concurrency: int) -> float:
+    """
+    Выполняет operations случайных пополнений и снятий в concurrency потоков
+    :return: Операций в секунду
+    """
+    queue = iter(range(operations))
+
+    async def worker():
+        for _ in queue:
+            operation = random.choice((Operation.DEPOSIT, Operation.WITHDRAW))
+            async with async_session_maker() as session:
+                await crud_services.wallet_operation(random.choice(wallet_ids), operation, AMOUNT, session)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return operations / (time.perf_counter() - started)
+
+
+async def main(operations: int, wallets: int, concurrency: int) -> None:
+    settings.WALLET_COALESCING_ENABLED = False
+    settings.FAST_PATH_ENABLED = False
+
+    print(f"{'engine':<8} {'ops/s':>10} {'wallets +KiB':>13} {'ledger +KiB':>12} {'dead tuples':>12}")
+    for storage_engine in ("update", "ledger"):
+        settings.WALLET_STORAGE_ENGINE = storage_engine
+        wallet_ids = await create_wallets(wallets, AMOUNT * operations)
+
+        before = await table_stats()
+        throughput = await measure(wallet_ids, operations, concurrency)
+        after = await table_stats()
+
+        wallets_growth = (after["wallets"][0] - before["wallets"][0]) / 1024
+        ledger_growth = (after["wallet_ledger"][0] - before["wallet_ledger"][0]) / 1024
+        dead = after["wallets"][1] - before["wallets"][1]
+        print(f"{storage_engine:<8} {throughput:>10.0f} {wallets_growth:>13.0f} {ledger_growth:>12.0f} {dead:>12}")
+
+    started = time.perf_counter()
+    projected = await ledger.project_ledger(settings.LEDGER_PROJECTION_BATCH_SIZE)
+    print(f"projection: {projected} ledger entries in {time.perf_counter() - started:.3f} s")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=20000)
+    parser.add_argument("--wallets", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.operations, args.wallets, args.concurrency))
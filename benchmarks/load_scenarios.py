@@ -0,0 +1,286 @@
+"""
+Сценарии нагрузки с распределением обращений по кошелькам, как в реальном трафике: заранее созданный пул
+кошельков, выбор кошелька по Zipf, равномерно или с горячей долей, настраиваемые доли чтений, пополнений
+и снятий, размер пакета операций. Запросы приходят с заданной частотой (открытая модель, пуассоновский поток)
+и не ждут ответов на предыдущие; задержка считается от запланированного момента отправки.
+
+Запуск против развернутого сервиса или внутри процесса через ASGI (без --url):
+    python -m benchmarks.load_scenarios --scenario zipf --rate 500 --duration 30 --url http://localhost:8000
+    python -m benchmarks.load_scenarios --scenario all --rate 300 --duration 10 --output scenarios.json
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import random
+import statistics
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, replace
+from enum import Enum
+from pathlib import Path
+from typing import AsyncIterator
+
+from httpx import ASGITransport, AsyncClient, Limits
+
+
+class Distribution(str, Enum):
+    UNIFORM = "uniform"
+    ZIPF = "zipf"
+    HOTSPOT = "hotspot"
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    Параметры сценария нагрузки
+    """
+    distribution: Distribution
+    # Показатель Zipf: вес кошелька ранга k равен 1 / k ** zipf_s
+    zipf_s: float = 1.1
+    # Доля горячих кошельков и доля обращений к ним
+    hotspot_wallets: float = 0.01
+    hotspot_share: float = 0.9
+    # Доли запросов; остаток до 1 - снятия
+    read_ratio: float = 0.4
+    deposit_ratio: float = 0.3
+    # Операций в запросе: 1 - /operation, больше - /operations/batch
+    batch_size: int = 1
+    min_amount: float = 1.0
+    max_amount: float = 100.0
+
+
+SCENARIOS = {
+    "uniform": Scenario(Distribution.UNIFORM),
+    "zipf": Scenario(Distribution.ZIPF),
+    "hotspot": Scenario(Distribution.HOTSPOT),
+    "zipf_write_heavy": Scenario(Distribution.ZIPF, read_ratio=0.1, deposit_ratio=0.45),
+    "zipf_batch": Scenario(Distribution.ZIPF, read_ratio=0.2, batch_size=20),
+}
+
+
+class WalletPicker:
+    """
+    Выбор кошелька из пула по распределению сценария
+    """
+
+    def __init__(self, wallets: list[str], scenario: Scenario, rng: random.Random):
+        # Ранги перемешаны, чтобы горячие кошельки не шли подряд по UUID
+        self.wallets = rng.sample(wallets, len(wallets))
+        self.scenario = scenario
+        self.rng = rng
+        self.hot_count = max(1, int(len(wallets) * scenario.hotspot_wallets))
+
+        if scenario.distribution == Distribution.ZIPF:
+            weights = (1 / rank ** scenario.zipf_s for rank in range(1, len(wallets) + 1))
+            self.cum_weights = list(itertools.accumulate(weights))
+
+    def pick(self) -> str:
+        distribution = self.scenario.distribution
+        if distribution == Distribution.ZIPF:
+            point = self.rng.random() * self.cum_weights[-1]
+            return self.wallets[bisect.bisect_left(self.cum_weights, point)]
+        if distribution == Distribution.HOTSPOT and self.rng.random() < self.scenario.hotspot_share:
+            return self.wallets[self.rng.randrange(self.hot_count)]
+        return self.wallets[self.rng.randrange(len(self.wallets))]
+
+
+@dataclass
+class ScenarioStats:
+    sent: int = 0
+    # Ответы 2xx и ожидаемые 400 (недостаточно средств)
+    ok: int = 0
+    insufficient_funds: int = 0
+    errors: int = 0
+    # Запросы, не отправленные из-за предела одновременных запросов
+    dropped: int = 0
+
+
+async def seed_wallets(client: AsyncClient, count: int, balance: str) -> list[str]:
+    """
+    Создает пул кошельков массовой вставкой
+    """
+    wallets = []
+    while len(wallets) < count:
+        chunk = min(count - len(wallets), 10_000)
+        response = await client.post(
+            "/api/v1/wallets/create_wallets",
+            json={"count": chunk, "initial_balance": balance},
+            timeout=None
+        )
+        response.raise_for_status()
+        wallets.extend(json.loads(line)["wallet_uuid"] for line in response.text.splitlines())
+    return wallets
+
+
+def random_amount(scenario: Scenario, rng: random.Random) -> str:
+    return f"{rng.uniform(scenario.min_amount, scenario.max_amount):.2f}"
+
+
+async def send_request(client: AsyncClient, scenario: Scenario, picker: WalletPicker, rng: random.Random):
+    """
+    Один запрос сценария
+    :return: Тип запроса и ответ
+    """
+    roll = rng.random()
+    if roll < scenario.read_ratio:
+        return "read", await client.get(f"/api/v1/wallets/{picker.pick()}")
+
+    operation = "DEPOSIT" if roll < scenario.read_ratio + scenario.deposit_ratio else "WITHDRAW"
+    if scenario.batch_size == 1:
+        return operation.lower(), await client.post(
+            f"/api/v1/wallets/{picker.pick()}/operation",
+            json={"operation": operation, "amount": random_amount(scenario, rng)}
+        )
+
+    operations = [
+        {"wallet_uuid": picker.pick(), "operation": operation, "amount": random_amount(scenario, rng)}
+        for _ in range(scenario.batch_size)
+    ]
+    return "batch", await client.post("/api/v1/wallets/operations/batch", json={"operations": operations})
+
+
+async def run_scenario(
+        client: AsyncClient,
+        wallets: list[str],
+        scenario: Scenario,
+        rate: float,
+        duration: float,
+        max_in_flight: int,
+        seed: int
+) -> dict:
+    """
+    Открытая модель: моменты отправки - пуассоновский поток с частотой rate, независимо от ответов.
+    :return: Счетчики и задержки p50/p95/p99 в миллисекундах по типам запросов и общие
+    """
+    rng = random.Random(seed)
+    picker = WalletPicker(wallets, scenario, rng)
+    stats = ScenarioStats()
+    latencies: dict[str, list[float]] = {}
+    in_flight: set[asyncio.Task] = set()
+
+    async def fire(scheduled: float):
+        try:
+            kind, response = await send_request(client, scenario, picker, rng)
+        except Exception:
+            stats.errors += 1
+            return
+        # От запланированного момента: задержка отправки входит в задержку ответа
+        latencies.setdefault(kind, []).append((time.perf_counter() - scheduled) * 1000)
+        if response.status_code < 300:
+            stats.ok += 1
+        elif response.status_code == 400:
+            stats.insufficient_funds += 1
+        else:
+            stats.errors += 1
+
+    started = time.perf_counter()
+    scheduled = started
+    while scheduled - started < duration:
+        scheduled += rng.expovariate(rate)
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        stats.sent += 1
+        if len(in_flight) >= max_in_flight:
+            stats.dropped += 1
+            continue
+        task = asyncio.create_task(fire(scheduled))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    await asyncio.gather(*in_flight)
+    elapsed = time.perf_counter() - started
+
+    def summary(values: list[float]) -> dict:
+        if len(values) < 2:
+            return {"count": len(values)}
+        quantiles = statistics.quantiles(values, n=100, method="inclusive")
+        return {
+            "count": len(values),
+            "p50_ms": round(quantiles[49], 2),
+            "p95_ms": round(quantiles[94], 2),
+            "p99_ms": round(quantiles[98], 2),
+        }
+
+    return {
+        "scenario": asdict(scenario),
+        "target_rate": rate,
+        "achieved_rate": round((stats.sent - stats.dropped) / elapsed, 1),
+        **asdict(stats),
+        "latency": summary(list(itertools.chain.from_iterable(latencies.values()))),
+        "latency_by_request": {kind: summary(values) for kind, values in sorted(latencies.items())},
+    }
+
+
+@asynccontextmanager
+async def open_client(url: str | None, max_in_flight: int) -> AsyncIterator[AsyncClient]:
+    """
+    Клиент к развернутому сервису или к приложению в этом процессе
+    """
+    if url is not None:
+        limits = Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+        async with AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+            yield client
+        return
+
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://load", timeout=30) as client:
+            yield client
+
+
+async def main(args: argparse.Namespace) -> None:
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    overrides = {
+        key: value for key, value in (
+            ("zipf_s", args.zipf_s),
+            ("read_ratio", args.read_ratio),
+            ("deposit_ratio", args.deposit_ratio),
+            ("batch_size", args.batch_size),
+        )
+        if value is not None
+    }
+
+    results = {}
+    async with open_client(args.url, args.max_in_flight) as client:
+        wallets = await seed_wallets(client, args.wallets, args.initial_balance)
+        print(f"seeded {len(wallets)} wallets")
+
+        print(f"{'scenario':<18} {'rate':>7} {'sent':>7} {'dropped':>8} {'errors':>7} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name in names:
+            scenario = replace(SCENARIOS[name], **overrides)
+            result = await run_scenario(
+                client, wallets, scenario, args.rate, args.duration, args.max_in_flight, args.seed
+            )
+            results[name] = result
+            latency = result["latency"]
+            print(f"{name:<18} {result['achieved_rate']:>7.0f} {result['sent']:>7} {result['dropped']:>8} "
+                  f"{result['errors']:>7} {latency.get('p50_ms', 0):>8.2f} {latency.get('p95_ms', 0):>8.2f} "
+                  f"{latency.get('p99_ms', 0):>8.2f}")
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="zipf")
+    parser.add_argument("--url", default=None, help="Адрес сервиса; без него - приложение в этом процессе")
+    parser.add_argument("--rate", type=float, default=200, help="Запросов в секунду")
+    parser.add_argument("--duration", type=float, default=30, help="Длительность сценария в секундах")
+    parser.add_argument("--wallets", type=int, default=10_000, help="Размер пула кошельков")
+    parser.add_argument("--initial-balance", default="1000000")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Предел одновременных запросов")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--zipf-s", type=float, default=None)
+    parser.add_argument("--read-ratio", type=float, default=None)
+    parser.add_argument("--deposit-ratio", type=float, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--output", type=Path, default=None, help="Файл для результатов в JSON")
+
+    asyncio.run(main(parser.parse_args()))
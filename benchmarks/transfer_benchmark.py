@@ -0,0 +1,119 @@
+"""
+Переводы между небольшим числом кошельков во встречных направлениях: перевод одной транзакцией,
+пакет переводов и прежний способ - снятие и пополнение двумя операциями. Для каждого способа -
+переводов в секунду, задержки, ошибки (взаимоблокировки) и проверка сохранения суммы балансов.
+
+Запуск (переменные подключения к БД - как для приложения):
+    python -m benchmarks.transfer_benchmark --transfers 5000 --wallets 2 --concurrency 50
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from app.api.v1 import crud_services
+from app.api.v1.models import BatchMode, Operation, WalletTransfer, to_minor_units
+from app.config.config import settings
+from app.db.database import async_session_maker, engine
+
+TRANSFER_AMOUNT = Decimal("1.00")
+AMOUNT = to_minor_units(TRANSFER_AMOUNT)
+BATCH_SIZE = 10
+
+
+async def transfer(pairs: list[tuple[str, str]]) -> None:
+    async with async_session_maker() as session:
+        await crud_services.wallet_transfer(*pairs[0], AMOUNT, session)
+
+
+async def transfer_batch(pairs: list[tuple[str, str]]) -> None:
+    transfers = [
+        WalletTransfer(from_wallet_uuid=uuid.UUID(source), to_wallet_uuid=uuid.UUID(target), amount=TRANSFER_AMOUNT)
+        for source, target in pairs
+    ]
+    async with async_session_maker() as session:
+        await crud_services.wallet_batch_transfer(transfers, BatchMode.ATOMIC, session)
+
+
+async def two_operations(pairs: list[tuple[str, str]]) -> None:
+    source, target = pairs[0]
+    async with async_session_maker() as session:
+        await crud_services.wallet_operation(source, Operation.WITHDRAW, AMOUNT, session)
+    async with async_session_maker() as session:
+        await crud_services.wallet_operation(target, Operation.DEPOSIT, AMOUNT, session)
+
+
+METHODS = {
+    "transfer": (transfer, 1),
+    "batch": (transfer_batch, BATCH_SIZE),
+    "two_operations": (two_operations, 1),
+}
+
+
+async def total_balance(wallet_ids: list[str]) -> int:
+    async with async_session_maker() as session:
+        balances = [await crud_services.get_wallet_balance(wallet_uuid, session, False) for wallet_uuid in wallet_ids]
+    return sum(balances)
+
+
+async def measure(method: str, wallet_ids: list[str], transfers: int, concurrency: int) -> dict:
+    """
+    Выполняет transfers переводов между случайными парами кошельков в concurrency потоков
+    :return: Переводов в секунду, задержки вызова в миллисекундах, число ошибок
+    """
+    call, per_call = METHODS[method]
+    queue = iter(range(transfers // per_call))
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for _ in queue:
+            pairs = [tuple(random.sample(wallet_ids, 2)) for _ in range(per_call)]
+            started = time.perf_counter()
+            try:
+                await call(pairs)
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"tps": transfers / elapsed, "p50_ms": quantiles[49], "p99_ms": quantiles[98], "errors": errors}
+
+
+async def main(transfers: int, wallets: int, concurrency: int) -> None:
+    # Кэш балансов и объединение операций исказили бы сравнение
+    settings.WALLET_COALESCING_ENABLED = False
+    settings.BALANCE_CACHE_ENABLED = False
+
+    async with async_session_maker() as session:
+        wallet_ids = []
+        async for chunk in crud_services.create_wallets_bulk(wallets, AMOUNT * transfers * 2, None, wallets, session):
+            wallet_ids.extend(chunk)
+
+    print(f"{'method':<15} {'transfers/s':>12} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'sum kept':>9}")
+    for method in METHODS:
+        before = await total_balance(wallet_ids)
+        result = await measure(method, wallet_ids, transfers, concurrency)
+        kept = await total_balance(wallet_ids) == before
+        print(f"{method:<15} {result['tps']:>12.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['errors']:>7} {str(kept):>9}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transfers", type=int, default=5000)
+    parser.add_argument("--wallets", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.transfers, args.wallets, args.concurrency))
@@ -5,5 +5,7 @@ class CustomUvicornWorker(UvicornWorker):
     CONFIG_KWARGS = {
         "loop": "uvloop",
         "http": "httptools",
-        "limit_concurrency": 2000
+        "limit_concurrency": 2000,
+        # Журнал запросов пишет AccessLogMiddleware с сэмплированием
+        "access_log": False
     }
\ No newline at end of file
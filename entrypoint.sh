@@ -1,11 +1,27 @@
 #!/bin/sh
 set -e
 
-echo "Running migrations..."
-alembic upgrade head
+# SKIP_MIGRATIONS: auto - не запускать миграции, если схема уже на head (перезапуск, раскатка без миграций),
+# true - не запускать вовсе (миграции применяет отдельный шаг раскатки), false - запускать всегда
+SKIP_MIGRATIONS="${SKIP_MIGRATIONS:-auto}"
+if [ "$SKIP_MIGRATIONS" = "true" ]; then
+    echo "Skipping migrations"
+elif [ "$SKIP_MIGRATIONS" = "auto" ] && \
+        [ "$(alembic current 2>/dev/null | cut -d' ' -f1)" = "$(alembic heads 2>/dev/null | cut -d' ' -f1)" ]; then
+    echo "Schema is at head, skipping migrations"
+else
+    echo "Running migrations..."
+    alembic upgrade head
+fi
+
+# Каталог метрик Prometheus, общий для всех воркеров gunicorn
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 
 echo "Starting server..."
 gunicorn app.main:app \
+-c gunicorn.conf.py \
 -w "${WORKERS_COUNT:-4}" \
 -k custom_uvicorn_worker.CustomUvicornWorker \
 --threads "${THREADS_COUNT:-8}" \
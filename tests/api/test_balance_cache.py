@@ -0,0 +1,48 @@
+import time
+
+from app.api.v1.balance_cache import LRUBalanceCache
+
+
+def test_balance_cache_hit_and_miss():
+    """Тест попаданий и промахов кэша балансов"""
+    cache = LRUBalanceCache(max_size=10, ttl=60)
+
+    assert cache.get("AAAA") is None
+    cache.set("AAAA", 10)
+    assert cache.get("aaaa") == 10
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_balance_cache_add_does_not_overwrite():
+    """Тест: заполнение при чтении не перетирает значение после записи"""
+    cache = LRUBalanceCache(max_size=10, ttl=60)
+
+    cache.set("a", 20)
+    cache.add("a", 10)
+    assert cache.get("a") == 20
+
+
+def test_balance_cache_eviction():
+    """Тест вытеснения давно не использованных кошельков"""
+    cache = LRUBalanceCache(max_size=2, ttl=60)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_balance_cache_ttl():
+    """Тест устаревания значений по TTL"""
+    cache = LRUBalanceCache(max_size=10, ttl=0.01)
+
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1 import coalescer as coalescer_module
+from app.api.v1.coalescer import WalletOperationCoalescer
+from app.api.v1.hot_wallets import SketchHotWalletTracker
+from app.api.v1.models import Operation
+from app.db.models import Wallet
+from app.exceptions import wallet_exceptions
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_wallet(session: AsyncSession, balance: int) -> str:
+    wallet = Wallet(balance=balance)
+    session.add(wallet)
+    await session.commit()
+    return str(wallet.id)
+
+
+async def test_coalesced_operations_balances(db_engine, db_session):
+    """Тест пачки операций: каждый получает свой баланс, лишнее снятие отклоняется"""
+    wallet_uuid = await create_wallet(db_session, 10)
+    coalescer = WalletOperationCoalescer(
+        window=0.05,
+        max_batch=100,
+        session_maker=async_sessionmaker(db_engine, expire_on_commit=False, class_=AsyncSession)
+    )
+
+    results = await asyncio.gather(
+        coalescer.submit(wallet_uuid, Operation.DEPOSIT, 5),
+        coalescer.submit(wallet_uuid, Operation.WITHDRAW, 20),
+        coalescer.submit(wallet_uuid, Operation.WITHDRAW, 15),
+        coalescer.submit(wallet_uuid, Operation.DEPOSIT, 1),
+        return_exceptions=True
+    )
+
+    assert results[0] == 15
+    assert isinstance(results[1], wallet_exceptions.WalletBalanceError)
+    assert results[2] == 0
+    assert results[3] == 1
+
+    wallet = await db_session.get(Wallet, wallet_uuid)
+    await db_session.refresh(wallet)
+    assert wallet.balance == 1
+
+
+async def test_coalesced_operation_wallet_not_found(db_engine):
+    """Тест пачки операций над несуществующим кошельком"""
+    coalescer = WalletOperationCoalescer(
+        window=0.01,
+        max_batch=100,
+        session_maker=async_sessionmaker(db_engine, expire_on_commit=False, class_=AsyncSession)
+    )
+
+    with pytest.raises(wallet_exceptions.WalletNotFoundError):
+        await coalescer.submit("aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee", Operation.DEPOSIT, 1)
+
+
+async def test_coalesced_operations_lock_wait(db_engine, db_session, monkeypatch):
+    """Тест: ожидание блокировки пачки учитывается для каждой объединенной операции"""
+    tracker = SketchHotWalletTracker(capacity=10, width=64, depth=2, window=60)
+    monkeypatch.setattr(coalescer_module, "hot_wallet_tracker", tracker)
+    wallet_uuid = await create_wallet(db_session, 0)
+    session_maker = async_sessionmaker(db_engine, expire_on_commit=False, class_=AsyncSession)
+    coalescer = WalletOperationCoalescer(window=0.01, max_batch=100, session_maker=session_maker)
+
+    async with session_maker() as holder:
+        await holder.execute(text("SELECT 1 FROM wallets WHERE id = :id FOR UPDATE"), {"id": wallet_uuid})
+        operations = asyncio.gather(*(coalescer.submit(wallet_uuid, Operation.DEPOSIT, 1) for _ in range(3)))
+        await asyncio.sleep(0.2)
+        await holder.commit()
+
+    assert await operations == [1, 2, 3]
+    _, lock_wait = tracker.report()["wallets"][wallet_uuid]
+    assert lock_wait >= 3 * 0.15
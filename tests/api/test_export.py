@@ -0,0 +1,38 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_wallets(test_client: AsyncClient, balances: list[str]) -> list[str]:
+    response = await test_client.post("/api/v1/wallets/create_wallets", json={"balances": balances})
+    return [json.loads(line)["wallet_uuid"] for line in response.text.splitlines()]
+
+
+async def test_export_csv(test_client: AsyncClient):
+    """Тест выгрузки балансов в CSV в порядке UUID"""
+    wallet_ids = await create_wallets(test_client, ["1.50", "2", "0"])
+    balances = dict(zip(wallet_ids, [1.5, 2.0, 0.0]))
+
+    response = await test_client.get("/api/v1/wallets/export", params={"format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0] == "wallet_uuid,balance"
+    rows = [line.split(",") for line in lines[1:]]
+    assert [wallet_uuid for wallet_uuid, _ in rows] == sorted(wallet_ids)
+    assert {wallet_uuid: float(balance) for wallet_uuid, balance in rows} == balances
+
+
+async def test_export_ndjson_resume(test_client: AsyncClient):
+    """Тест продолжения выгрузки NDJSON после последнего полученного UUID"""
+    wallet_ids = sorted(await create_wallets(test_client, ["10"] * 5))
+
+    response = await test_client.get("/api/v1/wallets/export", params={"after": wallet_ids[1]})
+
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == [{"wallet_uuid": wallet_uuid, "balance": 10.0} for wallet_uuid in wallet_ids[2:]]
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+from httpx import AsyncClient
+
+from app.api.v1.hot_wallets import HeavyHitters, merge_reports
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_heavy_hitters_bounded():
+    """Тест: горячие ключи находятся среди множества холодных, кандидатов не больше 2 * capacity"""
+    hitters = HeavyHitters(capacity=10, width=512, depth=4)
+    rng = random.Random(1)
+
+    for step in range(20_000):
+        hitters.add(f"hot-{step % 3}" if step % 4 == 0 else f"cold-{rng.randrange(100_000)}")
+        assert len(hitters._candidates) <= 20
+
+    assert {key for key, _ in hitters.top(3)} == {"hot-0", "hot-1", "hot-2"}
+    # Оценка count-min не меньше точного значения
+    assert hitters.estimate("hot-0") >= 5000 / 3
+
+
+async def test_merge_reports():
+    """Тест объединения отчетов воркеров"""
+    merged = merge_reports([
+        {"window_s": 10.0, "wallets": {"a": [100, 0.5], "b": [10, 0.0]}},
+        {"window_s": 5.0, "wallets": {"a": [50, 0.25]}},
+    ])
+
+    assert merged["a"] == {"requests": 150, "rate": 20.0, "lock_wait_s": 0.75}
+    assert merged["b"] == {"requests": 10, "rate": 1.0, "lock_wait_s": 0.0}
+
+
+async def test_hot_wallets_endpoint(test_client: AsyncClient):
+    """Тест: кошелек с частыми операциями попадает в отчет о горячих кошельках"""
+    create_response = await test_client.post("/api/v1/wallets/create_wallet")
+    wallet_uuid = create_response.json()["wallet_uuid"]
+
+    for _ in range(50):
+        await test_client.post(
+            f"/api/v1/wallets/{wallet_uuid}/operation",
+            json={"operation": "DEPOSIT", "amount": "1.00"}
+        )
+
+    response = await test_client.get("/api/v1/admin/hot_wallets", params={"limit": 5})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["workers"] >= 1
+
+    hot = {item["wallet_uuid"]: item for item in body["wallets"]}
+    assert hot[wallet_uuid]["requests"] >= 50
+    assert hot[wallet_uuid]["requests_per_s"] > 0
+    assert hot[wallet_uuid]["lock_wait_s"] > 0
+
+    response = await test_client.get("/api/v1/admin/hot_wallets", params={"sort": "lock_wait"})
+    assert response.status_code == 200
+    lock_waits = [item["lock_wait_s"] for item in response.json()["wallets"]]
+    assert lock_waits == sorted(lock_waits, reverse=True)
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1.idempotency import sweep_expired_keys
+from app.db.models import IdempotencyKey
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_idempotent_operation_replay(test_client: AsyncClient):
+    """Тест: повтор операции с тем же ключом не списывает средства повторно"""
+    create_response = await test_client.post("/api/v1/wallets/create_wallet")
+    wallet_uuid = create_response.json()["wallet_uuid"]
+    headers = {"Idempotency-Key": f"deposit-{wallet_uuid}"}
+
+    responses = [
+        await test_client.post(
+            f"/api/v1/wallets/{wallet_uuid}/operation",
+            json={"operation": "DEPOSIT", "amount": "100.00"},
+            headers=headers
+        )
+        for _ in range(3)
+    ]
+
+    for response in responses:
+        assert response.status_code == 200
+        assert response.content == b'{"status":"success","balance":100.0}'
+    assert [response.headers["Idempotent-Replayed"] for response in responses] == ["false", "true", "true"]
+
+    balance_response = await test_client.get(f"/api/v1/wallets/{wallet_uuid}")
+    assert balance_response.json()["balance"] == 100.0
+
+
+async def test_idempotent_operation_error_replay(test_client: AsyncClient):
+    """Тест: ответ с ошибкой тоже сохраняется для ключа"""
+    create_response = await test_client.post("/api/v1/wallets/create_wallet")
+    wallet_uuid = create_response.json()["wallet_uuid"]
+    headers = {"Idempotency-Key": f"withdraw-{wallet_uuid}"}
+
+    for _ in range(2):
+        response = await test_client.post(
+            f"/api/v1/wallets/{wallet_uuid}/operation",
+            json={"operation": "WITHDRAW", "amount": "50.00"},
+            headers=headers
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"].endswith("has not enough balance")
+
+
+async def test_idempotency_key_reused_with_other_request(test_client: AsyncClient):
+    """Тест: ключ нельзя использовать для другого запроса"""
+    create_response = await test_client.post("/api/v1/wallets/create_wallet")
+    wallet_uuid = create_response.json()["wallet_uuid"]
+    headers = {"Idempotency-Key": f"reused-{wallet_uuid}"}
+
+    await test_client.post(
+        f"/api/v1/wallets/{wallet_uuid}/operation",
+        json={"operation": "DEPOSIT", "amount": "100.00"},
+        headers=headers
+    )
+    response = await test_client.post(
+        f"/api/v1/wallets/{wallet_uuid}/operation",
+        json={"operation": "DEPOSIT", "amount": "200.00"},
+        headers=headers
+    )
+    assert response.status_code == 422
+
+
+async def test_sweep_expired_keys(db_engine, db_session):
+    """Тест пакетной очистки просроченных ключей"""
+    now = datetime.now(timezone.utc)
+    db_session.add_all(
+        [IdempotencyKey(key=f"expired-{i}", request_hash="", expires_at=now - timedelta(seconds=1)) for i in range(5)]
+        + [IdempotencyKey(key="alive", request_hash="", expires_at=now + timedelta(hours=1))]
+    )
+    await db_session.commit()
+
+    deleted = await sweep_expired_keys(
+        batch_size=2,
+        session_maker=async_sessionmaker(db_engine, expire_on_commit=False, class_=AsyncSession)
+    )
+    assert deleted == 5
+
+    remaining = await db_session.scalar(select(func.count()).select_from(IdempotencyKey))
+    assert remaining == 1
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1 import ledger
+from app.api.v1.models import Operation
+from app.config.config import settings
+from app.db.models import LedgerEntry, LedgerWatermark, Wallet
+from app.exceptions import wallet_exceptions
+
+pytestmark = pytest.mark.asyncio
+
+# Блокировки projector'а: ключ bigint хранится в pg_locks как classid (старшие 32 бита) и objid
+PROJECTOR_LOCKS_STMT = text("""
+    SELECT count(*) FROM pg_locks
+    WHERE locktype = 'advisory' AND (classid::bigint << 32 | objid::bigint) = :key
+""")
+
+
+async def test_ledger_writer(db_engine, db_session):
+    """Тест: операции пишутся в журнал, снятия проверяются по балансу с учетом журнала"""
+    session_maker = async_sessionmaker(db_engine, expire_on_commit=False, class_=AsyncSession)
+    wallet = Wallet(balance=10000)
+    db_session.add(wallet)
+    await db_session.commit()
+    wallet_uuid = str(wallet.id)
+
+    writer = ledger.LedgerWriter(interval=0.01, max_batch=1000, session_maker=session_maker)
+    results = await asyncio.gather(
+        *[writer.submit(wallet_uuid, Operation.WITHDRAW, 3000) for _ in range(4)],
+        return_exceptions=True
+    )
+
+    assert results[:3] == [7000, 4000, 1000]
+    assert isinstance(results[3], wallet_exceptions.WalletBalanceError)
+
+    # Баланс строки кошелька не меняется до проекции
+    await db_session.refresh(wallet)
+    assert wallet.balance == 10000
+    assert await ledger.get_wallet_balance(wallet_uuid, db_session) == 1000
+    assert await db_session.scalar(select(func.count()).select_from(LedgerEntry)) == 3
+
+
+@pytest.mark.skipif(
+    settings.WALLET_STORAGE_ENGINE == "ledger",
+    reason="the server's projector runs in ledger mode"
+)
+async def test_project_ledger(db_engine, db_session):
+    """Тест: проекция переносит журнал в балансы и сдвигает watermark"""
+    session_maker = async_sessionmaker(db_engine, expire_on_commit=False, class_=AsyncSession)
+    wallets = [Wallet(balance=0) for _ in range(3)]
+    db_session.add_all(wallets)
+    await db_session.commit()
+
+    async with session_maker() as session:
+        await ledger.append_operations(
+            [(str(wallet.id), Operation.DEPOSIT, i + 1) for i, wallet in enumerate(wallets) for _ in range(2)],
+            session
+        )
+        await session.commit()
+
+    projected = await ledger.project_ledger(batch_size=4, db_engine=db_engine)
+    assert projected == 6
+
+    balances = (await db_session.scalars(select(Wallet.balance).order_by(Wallet.balance))).all()
+    assert balances == [2, 4, 6]
+    assert await db_session.scalar(select(LedgerWatermark.position)) == 6
+    assert await ledger.get_wallet_balance(str(wallets[0].id), db_session) == 2
+    # Блокировка projector'а снята на том же соединении, а не осталась в пуле
+    assert await db_session.scalar(PROJECTOR_LOCKS_STMT, {"key": ledger.LEDGER_PROJECTOR_LOCK_KEY}) == 0
+
+
+@pytest.mark.skipif(
+    settings.WALLET_STORAGE_ENGINE == "ledger",
+    reason="the server's projector runs in ledger mode"
+)
+async def test_projector_single_leader(db_engine, db_session):
+    """Тест: пока проекцию выполняет другой воркер, проход пропускается без ожидания"""
+    session_maker = async_sessionmaker(db_engine, expire_on_commit=False, class_=AsyncSession)
+    wallet = Wallet(balance=0)
+    db_session.add(wallet)
+    await db_session.commit()
+
+    async with session_maker() as session:
+        await ledger.append_operations([(str(wallet.id), Operation.DEPOSIT, 5)], session)
+        await session.commit()
+
+    async with session_maker() as leader:
+        await leader.execute(ledger.TRY_PROJECTOR_LOCK_STMT, {"key": ledger.LEDGER_PROJECTOR_LOCK_KEY})
+        assert await ledger.project_ledger(batch_size=4, db_engine=db_engine) == 0
+        await leader.execute(ledger.PROJECTOR_UNLOCK_STMT, {"key": ledger.LEDGER_PROJECTOR_LOCK_KEY})
+        await leader.commit()
+
+    assert await ledger.project_ledger(batch_size=4, db_engine=db_engine) == 1
@@ -0,0 +1,75 @@
+import io
+import json
+import sys
+import time
+
+from loguru import logger
+
+from app.metrics.logs import LogPipeline
+
+
+class Message(str):
+    """
+    Сообщение приемника loguru: текст исключения и запись
+    """
+    record: dict
+
+
+def test_log_queue_drops_when_full():
+    """Тест: при переполненной очереди запись отбрасывается и учитывается"""
+    pipeline = LogPipeline(max_queue=1, dedup_window=0, access_sample_rate=0, access_route_sample_rates={})
+
+    for _ in range(3):
+        message = Message("")
+        message.record = {}
+        pipeline.write(message)
+
+    assert pipeline.stats()["queued"] == 1
+    assert pipeline.stats()["dropped"] == 2
+
+
+def test_repeated_exceptions_suppressed():
+    """Тест: повторы исключения за окно подавляются, следующая запись несет их число"""
+    stream = io.BytesIO()
+    pipeline = LogPipeline(
+        max_queue=100,
+        dedup_window=0.05,
+        access_sample_rate=0,
+        access_route_sample_rates={},
+        stream=stream
+    )
+    pipeline.start("INFO")
+    try:
+        for attempt in range(4):
+            if attempt == 3:
+                time.sleep(0.06)
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("Failed")
+        logger.info("done", wallet_uuid="a")
+    finally:
+        pipeline.stop()
+        logger.add(sys.stderr)
+
+    first, after_window, done = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert "ValueError: boom" in first["exception"]
+    assert "suppressed" not in first
+    assert after_window["suppressed"] == 2
+    assert done["message"] == "done"
+    assert done["wallet_uuid"] == "a"
+    assert pipeline.stats()["suppressed"] == 2
+
+
+def test_access_log_sampling():
+    """Тест: доля журнала запросов по маршруту, ответы 5xx пишутся всегда"""
+    pipeline = LogPipeline(
+        max_queue=10,
+        dedup_window=0,
+        access_sample_rate=1.0,
+        access_route_sample_rates={"/health": 0.0}
+    )
+
+    assert pipeline.should_log_access("/api/v1/wallets/{wallet_uuid}", 200)
+    assert not pipeline.should_log_access("/health", 200)
+    assert pipeline.should_log_access("/health", 503)
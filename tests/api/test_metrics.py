@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config.config import settings
+from app.metrics.metrics import DB_POOL_WAITERS, InstrumentedQueuePool
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_metrics_route_latency(test_client: AsyncClient):
+    """Тест метрик: латентность учитывается по шаблону маршрута, а не по UUID"""
+    create_response = await test_client.post("/api/v1/wallets/create_wallet")
+    wallet_uuid = create_response.json()["wallet_uuid"]
+    await test_client.get(f"/api/v1/wallets/{wallet_uuid}")
+
+    response = await test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    body = response.text
+    assert 'route="/api/v1/wallets/{wallet_uuid}"' in body
+    assert wallet_uuid not in body
+    assert "wallet_db_statement_duration_seconds" in body
+    assert "wallet_db_pool_checked_out" in body
+
+
+async def test_pool_waiters():
+    """Тест: ожидающим соединения считается только вызов при исчерпанном пуле"""
+    engine = create_async_engine(settings.get_db_url, poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0)
+    # Значение в момент открытия соединения, то есть внутри выдачи из пула
+    on_connect = []
+    event.listen(engine.sync_engine, "connect", lambda *args: on_connect.append(DB_POOL_WAITERS._value.get()))
+
+    async with engine.connect() as holder:
+        await holder.execute(text("SELECT 1"))
+        assert on_connect == [0]
+
+        waiter = asyncio.create_task(engine.connect().start())
+        for _ in range(50):
+            if DB_POOL_WAITERS._value.get() == 1:
+                break
+            await asyncio.sleep(0.01)
+        assert DB_POOL_WAITERS._value.get() == 1
+
+    await (await waiter).close()
+    assert DB_POOL_WAITERS._value.get() == 0
+    await engine.dispose()
@@ -0,0 +1,94 @@
+import time
+import uuid
+
+import pytest
+from httpx import AsyncClient
+
+from app.api.v1.missing_wallets import LRUMissingWalletFilter
+from app.config.config import settings
+
+
+def test_missing_wallets_eviction_and_ttl():
+    """Тест вытеснения и устаревания отметок фильтра отсутствующих кошельков"""
+    missing = LRUMissingWalletFilter(max_size=2, ttl=60)
+
+    missing.add("a")
+    missing.add("b")
+    assert missing.contains("a")
+    missing.add("c")
+
+    assert not missing.contains("b")
+    assert missing.contains("a")
+    assert missing.stats()["evictions"] == 1
+
+    short_lived = LRUMissingWalletFilter(max_size=10, ttl=0.01)
+    short_lived.add("a")
+    time.sleep(0.02)
+    assert not short_lived.contains("a")
+
+
+def test_missing_wallets_discard():
+    """Тест: созданный кошелек снимается с отметки"""
+    missing = LRUMissingWalletFilter(max_size=10, ttl=60)
+
+    missing.add("a")
+    missing.discard("a")
+    assert not missing.contains("a")
+
+
+@pytest.mark.asyncio
+async def test_invalid_wallet_uuid(test_client: AsyncClient):
+    """Тест: некорректный UUID отклоняется с кодом 422 до обращения к БД"""
+    response = await test_client.get("/api/v1/wallets/not-a-uuid")
+    assert response.status_code == 422
+    assert response.json() == {"message": "ValidationError: Input should be a valid UUID"}
+
+    response = await test_client.post(
+        "/api/v1/wallets/not-a-uuid/operation",
+        json={"operation": "DEPOSIT", "amount": "1"}
+    )
+    assert response.status_code == 422
+
+    response = await test_client.post("/api/v1/admin/wallets/not-a-uuid/shards", json={"slots": 4})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not settings.MISSING_WALLETS_CACHE_ENABLED, reason="MISSING_WALLETS_CACHE_ENABLED is off")
+async def test_missing_wallet_answered_from_filter(test_client: AsyncClient):
+    """Тест: повторный запрос к несуществующему кошельку получает 404 из фильтра"""
+    missing_uuid = str(uuid.uuid4())
+    hits = (await test_client.get("/api/v1/admin/missing_wallets")).json()["hits"]
+
+    for _ in range(3):
+        response = await test_client.post(
+            f"/api/v1/wallets/{missing_uuid.upper()}/operation",
+            json={"operation": "DEPOSIT", "amount": "1"}
+        )
+        assert response.status_code == 404
+        assert response.json()["detail"] == "Wallet not found"
+
+    response = await test_client.get(f"/api/v1/wallets/{missing_uuid}")
+    assert response.status_code == 404
+
+    assert (await test_client.get("/api/v1/admin/missing_wallets")).json()["hits"] == hits + 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not settings.MISSING_WALLETS_CACHE_ENABLED, reason="MISSING_WALLETS_CACHE_ENABLED is off")
+async def test_missing_wallet_from_idempotent_operation(test_client: AsyncClient):
+    """Тест: 404 операции с ключом идемпотентности тоже попадает в фильтр"""
+    missing_uuid = str(uuid.uuid4())
+    hits = (await test_client.get("/api/v1/admin/missing_wallets")).json()["hits"]
+
+    response = await test_client.post(
+        f"/api/v1/wallets/{missing_uuid}/operation",
+        json={"operation": "DEPOSIT", "amount": "1"},
+        headers={"Idempotency-Key": f"missing-{missing_uuid}"}
+    )
+    assert response.status_code == 404
+
+    response = await test_client.get(f"/api/v1/wallets/{missing_uuid}")
+    assert response.status_code == 404
+
+    assert (await test_client.get("/api/v1/admin/missing_wallets")).json()["hits"] == hits + 1
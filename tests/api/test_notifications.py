@@ -0,0 +1,79 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+from httpx import AsyncClient
+
+from app.api.v1.notifications import BalanceNotifier, BalanceSubscription, publish_balances
+from app.config.config import settings
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_subscription_coalescing():
+    """Тест: медленный подписчик получает только последний баланс, снимок не перетирает уведомление"""
+    subscription = BalanceSubscription(["A", "B"])
+    subscription.needs_snapshot = False
+
+    subscription.push("a", 100)
+    subscription.push("a", 200)
+    subscription.push("b", 50, snapshot=True)
+    subscription.push("a", 150, snapshot=True)
+
+    assert await subscription.wait(timeout=1) == {"a": 200, "b": 50}
+    assert await subscription.wait(timeout=0.01) == {}
+
+
+async def test_idle_subscribers(db_session, monkeypatch):
+    """Тест: тысячи подписчиков без изменений не нагружают воркер, уведомление получает только свой"""
+    monkeypatch.setattr(settings, "BALANCE_NOTIFY_ENABLED", True)
+    notifier = BalanceNotifier(settings.get_asyncpg_dsn, reconnect_interval=1.0)
+    listener = asyncio.create_task(notifier.run())
+    tasks_before = len(asyncio.all_tasks())
+
+    idle = [await notifier.subscribe([str(uuid.uuid4())]) for _ in range(5000)]
+    wallet_uuid = str(uuid.uuid4())
+    subscription = await notifier.subscribe([wallet_uuid])
+
+    # Подписки - только записи в словаре, без задач и соединений на подписчика
+    assert len(asyncio.all_tasks()) == tasks_before
+
+    await publish_balances({wallet_uuid: 100, str(uuid.uuid4()): 1}, db_session)
+    await publish_balances({wallet_uuid: 250}, db_session)
+    await db_session.commit()
+
+    balances = {}
+    while balances.get(wallet_uuid) != 250:
+        balances.update(await asyncio.wait_for(subscription.wait(timeout=5), 5))
+    assert not any(item.pending for item in idle)
+
+    for item in idle + [subscription]:
+        notifier.unsubscribe(item)
+    assert notifier._subscriptions == {}
+
+    listener.cancel()
+
+
+@pytest.mark.skipif(not settings.BALANCE_NOTIFY_ENABLED, reason="BALANCE_NOTIFY_ENABLED is off")
+async def test_subscribe_endpoint(test_client: AsyncClient):
+    """Тест подписки: сначала текущий баланс, затем баланс после операции"""
+    wallet_uuid = (await test_client.post("/api/v1/wallets/create_wallet")).json()["wallet_uuid"]
+
+    async with test_client.stream("GET", "/api/v1/wallets/subscribe", params={"wallet_uuid": wallet_uuid}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        lines = response.aiter_lines()
+
+        async def next_event() -> dict:
+            while not (line := await asyncio.wait_for(anext(lines), 5)).startswith("data: "):
+                pass
+            return json.loads(line.removeprefix("data: "))
+
+        assert await next_event() == {"wallet_uuid": wallet_uuid, "balance": 0.0}
+
+        await test_client.post(
+            f"/api/v1/wallets/{wallet_uuid}/operation",
+            json={"operation": "DEPOSIT", "amount": "12.50"}
+        )
+        assert await next_event() == {"wallet_uuid": wallet_uuid, "balance": 12.5}
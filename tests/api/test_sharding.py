@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.v1 import sharding
+from app.api.v1.models import Operation
+from app.api.v1.sharding import rebalance_wallets
+from app.db.models import Wallet, WalletSlot
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_sharded_wallet(test_client: AsyncClient, balance: str, slots: int) -> str:
+    create_response = await test_client.post("/api/v1/wallets/create_wallet")
+    wallet_uuid = create_response.json()["wallet_uuid"]
+
+    await test_client.post(
+        f"/api/v1/wallets/{wallet_uuid}/operation",
+        json={"operation": "DEPOSIT", "amount": balance}
+    )
+    response = await test_client.post(f"/api/v1/admin/wallets/{wallet_uuid}/shards", json={"slots": slots})
+    assert response.status_code == 200
+
+    return wallet_uuid
+
+
+async def test_sharded_wallet_operations(test_client: AsyncClient):
+    """Тест: операции с разбитым кошельком видят полный баланс"""
+    wallet_uuid = await create_sharded_wallet(test_client, "100.00", 4)
+
+    responses = await asyncio.gather(*[
+        test_client.post(
+            f"/api/v1/wallets/{wallet_uuid}/operation",
+            json={"operation": "DEPOSIT", "amount": "10.00"}
+        )
+        for _ in range(10)
+    ])
+    assert all(response.status_code == 200 for response in responses)
+
+    # Снятие больше, чем лежит в любом одном слоте
+    response = await test_client.post(
+        f"/api/v1/wallets/{wallet_uuid}/operation",
+        json={"operation": "WITHDRAW", "amount": "150.00"}
+    )
+    assert response.status_code == 200
+    assert response.json()["balance"] == 50.0
+
+    response = await test_client.post(
+        f"/api/v1/wallets/{wallet_uuid}/operation",
+        json={"operation": "WITHDRAW", "amount": "50.01"}
+    )
+    assert response.status_code == 400
+
+    balance_response = await test_client.get(f"/api/v1/wallets/{wallet_uuid}")
+    assert balance_response.json()["balance"] == 50.0
+
+
+async def test_sharded_wallet_batch_and_unshard(test_client: AsyncClient):
+    """Тест: пакетные операции и обратная сборка разбитого кошелька"""
+    wallet_uuid = await create_sharded_wallet(test_client, "100.00", 8)
+
+    response = await test_client.post(
+        "/api/v1/wallets/operations/batch",
+        json={"operations": [{"wallet_uuid": wallet_uuid, "operation": "WITHDRAW", "amount": "30.00"}]}
+    )
+    assert response.json()["results"][0]["balance"] == 70.0
+
+    response = await test_client.post(f"/api/v1/admin/wallets/{wallet_uuid}/shards", json={"slots": 0})
+    assert response.json()["balance"] == 70.0
+
+    balance_response = await test_client.get(f"/api/v1/wallets/{wallet_uuid}")
+    assert balance_response.json()["balance"] == 70.0
+
+
+async def test_rebalance_wallets(test_client: AsyncClient, db_engine, db_session):
+    """Тест: перебалансировка переносит баланс кошелька в слоты"""
+    wallet_uuid = await create_sharded_wallet(test_client, "100.00", 4)
+    await test_client.post(
+        "/api/v1/wallets/operations/batch",
+        json={"operations": [{"wallet_uuid": wallet_uuid, "operation": "DEPOSIT", "amount": "0.03"}]}
+    )
+
+    rebalanced = await rebalance_wallets(
+        session_maker=async_sessionmaker(db_engine, expire_on_commit=False, class_=AsyncSession)
+    )
+    assert rebalanced == 1
+
+    wallet = await db_session.scalar(select(Wallet).where(Wallet.id == wallet_uuid))
+    slots = (await db_session.scalars(select(WalletSlot.balance).where(WalletSlot.wallet_id == wallet_uuid))).all()
+    assert wallet.balance == 0
+    assert sorted(slots) == [2500, 2500, 2500, 2503]
+
+
+async def test_slot_operation_balance_during_rebalance(db_engine, db_session):
+    """Тест: операция со слотом, дождавшаяся перебалансировки, возвращает полный баланс после нее"""
+    session_maker = async_sessionmaker(db_engine, expire_on_commit=False, class_=AsyncSession)
+    wallet = Wallet(balance=0)
+    db_session.add(wallet)
+    await db_session.commit()
+    wallet_uuid = str(wallet.id)
+
+    async with session_maker() as session:
+        await sharding.set_wallet_slots(wallet_uuid, 2, session)
+    async with session_maker() as session:
+        await sharding.locked_wallet_operation(wallet_uuid, Operation.DEPOSIT, 10000, session)
+        await session.commit()
+
+    # Перебалансировка переносит wallets.balance в слоты и держит блокировки до commit
+    async with session_maker() as rebalance:
+        await rebalance.execute(sharding.LOCK_WALLETS_STMT, {"wallet_ids": [wallet_uuid]})
+        await rebalance.execute(sharding.LOCK_SLOTS_STMT, {"wallet_ids": [wallet_uuid]})
+        await rebalance.execute(
+            sharding.SET_SLOTS_STMT,
+            {"wallet_uuid": wallet_uuid, "slots": [0, 1], "balances": [5000, 5000]}
+        )
+        await rebalance.execute(sharding.SET_BALANCES_STMT, {"wallet_ids": [wallet_uuid], "balances": [0]})
+
+        async def deposit():
+            async with session_maker() as session:
+                balance = await sharding.sharded_wallet_operation(wallet_uuid, Operation.DEPOSIT, 100, session)
+                await session.commit()
+                return balance
+
+        depositing = asyncio.create_task(deposit())
+        await asyncio.sleep(0.2)
+        await rebalance.commit()
+
+    assert await depositing == 10100
@@ -0,0 +1,79 @@
+import json
+import time
+
+import httpx
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config.config import settings
+from app.metrics.metrics import InstrumentedQueuePool
+from app.metrics.tracing import (
+    FileTraceExporter,
+    Tracer,
+    TracingMiddleware,
+    export_traces,
+    trace_engine,
+    tracer,
+)
+
+
+def test_tracer_not_recording():
+    """Тест: при нулевой доле и выключенном пороге запросы не записываются"""
+    idle = Tracer(sample_rate=0.0, slow_threshold=0.0, max_queue=10)
+
+    assert not idle.enabled
+    assert idle.start_trace("GET /") is None
+    assert idle.start_span("db.query") is None
+    assert idle.span("a") is idle.span("b")
+
+
+def test_tail_sampling():
+    """Тест: без головного сэмплирования сохраняются только запросы медленнее порога"""
+    slow_only = Tracer(sample_rate=0.0, slow_threshold=0.01, max_queue=1)
+
+    slow_only.finish_trace(slow_only.start_trace("fast"))
+    slow = slow_only.start_trace("slow")
+    time.sleep(0.02)
+    slow_only.finish_trace(slow)
+    slower = slow_only.start_trace("slower")
+    time.sleep(0.02)
+    slow_only.finish_trace(slower)
+
+    assert [trace.root.name for trace in slow_only.drain()] == ["slow"]
+    assert slow_only.stats()["dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_request_trace_export(monkeypatch, tmp_path):
+    """Тест: трасса запроса с ожиданием пула, выражением и commit выгружается в файл OTLP/JSON"""
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    monkeypatch.setattr(tracer, "enabled", True)
+
+    engine = create_async_engine(settings.get_db_url, poolclass=InstrumentedQueuePool, pool_size=1)
+    trace_engine(engine)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    async def endpoint(scope, receive, send):
+        async with session_maker() as session:
+            await session.execute(text("SELECT 1"))
+            await session.commit()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    transport = httpx.ASGITransport(app=TracingMiddleware(endpoint, tracer))
+    async with httpx.AsyncClient(transport=transport, base_url="http://tests") as client:
+        await client.get("/traced", headers={"traceparent": f"00-{'ab' * 16}-{'cd' * 8}-01"})
+    await engine.dispose()
+
+    await export_traces(tracer, FileTraceExporter(str(tmp_path / "traces-{pid}.jsonl")), "wallet-api")
+
+    [path] = tmp_path.iterdir()
+    [resource_spans] = json.loads(path.read_text())["resourceSpans"]
+    spans = resource_spans["scopeSpans"][0]["spans"]
+    root = next(span for span in spans if span["name"] == "GET /traced")
+
+    assert {span["name"] for span in spans} >= {"db.pool.checkout", "db.query", "db.commit", "http.send"}
+    assert all(span["traceId"] == "ab" * 16 for span in spans)
+    assert root["parentSpanId"] == "cd" * 8
+    assert all(span["parentSpanId"] == root["spanId"] for span in spans if span is not root)
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_wallet(test_client: AsyncClient, balance: str) -> str:
+    create_response = await test_client.post("/api/v1/wallets/create_wallet")
+    wallet_uuid = create_response.json()["wallet_uuid"]
+    await test_client.post(
+        f"/api/v1/wallets/{wallet_uuid}/operation",
+        json={"operation": "DEPOSIT", "amount": balance}
+    )
+    return wallet_uuid
+
+
+async def get_balance(test_client: AsyncClient, wallet_uuid: str) -> float:
+    response = await test_client.get(f"/api/v1/wallets/{wallet_uuid}", headers={"Cache-Control": "no-cache"})
+    return response.json()["balance"]
+
+
+async def test_transfer(test_client: AsyncClient):
+    """Тест перевода: оба баланса в ответе, ошибки не меняют балансы"""
+    source = await create_wallet(test_client, "100.00")
+    target = await create_wallet(test_client, "5.00")
+
+    response = await test_client.post(
+        "/api/v1/wallets/transfer",
+        json={"from_wallet_uuid": source, "to_wallet_uuid": target, "amount": "40.50"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"status": "success", "from_balance": 59.5, "to_balance": 45.5}
+
+    response = await test_client.post(
+        "/api/v1/wallets/transfer",
+        json={"from_wallet_uuid": source, "to_wallet_uuid": target, "amount": "59.51"}
+    )
+    assert response.status_code == 400
+    assert [await get_balance(test_client, source), await get_balance(test_client, target)] == [59.5, 45.5]
+
+    response = await test_client.post(
+        "/api/v1/wallets/transfer",
+        json={"from_wallet_uuid": source, "to_wallet_uuid": "aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee", "amount": "1"}
+    )
+    assert response.status_code == 404
+    assert await get_balance(test_client, source) == 59.5
+
+    response = await test_client.post(
+        "/api/v1/wallets/transfer",
+        json={"from_wallet_uuid": source, "to_wallet_uuid": source, "amount": "1"}
+    )
+    assert response.status_code == 422
+
+
+async def test_concurrent_opposite_transfers(test_client: AsyncClient):
+    """Тест встречных переводов: без взаимоблокировок, сумма балансов сохраняется"""
+    first = await create_wallet(test_client, "100.00")
+    second = await create_wallet(test_client, "100.00")
+
+    responses = await asyncio.gather(*[
+        test_client.post(
+            "/api/v1/wallets/transfer",
+            json={"from_wallet_uuid": source, "to_wallet_uuid": target, "amount": "1.00"}
+        )
+        for _ in range(20)
+        for source, target in ((first, second), (second, first))
+    ])
+
+    assert all(response.status_code == 200 for response in responses)
+    assert [await get_balance(test_client, first), await get_balance(test_client, second)] == [100.0, 100.0]
+
+
+async def test_transfer_sharded_wallet(test_client: AsyncClient):
+    """Тест перевода с кошелька, разбитого на слоты"""
+    source = await create_wallet(test_client, "100.00")
+    target = await create_wallet(test_client, "0")
+    await test_client.post(f"/api/v1/admin/wallets/{source}/shards", json={"slots": 4})
+
+    response = await test_client.post(
+        "/api/v1/wallets/transfer",
+        json={"from_wallet_uuid": source, "to_wallet_uuid": target, "amount": "60.00"}
+    )
+    assert response.json() == {"status": "success", "from_balance": 40.0, "to_balance": 60.0}
+    assert await get_balance(test_client, source) == 40.0
+
+
+async def test_transfer_batch(test_client: AsyncClient):
+    """Тест пакета переводов в режимах ATOMIC и BEST_EFFORT"""
+    first = await create_wallet(test_client, "10.00")
+    second = await create_wallet(test_client, "0")
+    transfers = [
+        {"from_wallet_uuid": first, "to_wallet_uuid": second, "amount": "10.00"},
+        {"from_wallet_uuid": second, "to_wallet_uuid": first, "amount": "4.00"},
+        {"from_wallet_uuid": second, "to_wallet_uuid": first, "amount": "7.00"},
+    ]
+
+    response = await test_client.post("/api/v1/wallets/transfers/batch", json={"mode": "ATOMIC", "transfers": transfers})
+    assert response.status_code == 409
+    assert [result["status"] for result in response.json()["results"]] == [
+        "rolled_back", "rolled_back", "insufficient_funds"
+    ]
+    assert await get_balance(test_client, first) == 10.0
+
+    response = await test_client.post("/api/v1/wallets/transfers/batch", json={"transfers": transfers})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["success", "success", "insufficient_funds"]
+    assert (results[1]["from_balance"], results[1]["to_balance"]) == (6.0, 4.0)
+    assert [await get_balance(test_client, first), await get_balance(test_client, second)] == [4.0, 6.0]
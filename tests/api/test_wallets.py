@@ -1,3 +1,6 @@
+import json
+import uuid
+
 import pytest
 from loguru import logger
 from httpx import AsyncClient, Response
@@ -15,6 +18,39 @@ async def test_create_wallet(test_client: AsyncClient):
     assert "wallet_uuid" in data
 
 
+async def test_create_wallets_bulk(test_client: AsyncClient):
+    """Тест массового создания кошельков"""
+    response = await test_client.post(
+        "/api/v1/wallets/create_wallets",
+        json={"count": 3, "initial_balance": "25.00"}
+    )
+    assert response.status_code == 201
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    wallet_uuids = [json.loads(line)["wallet_uuid"] for line in response.text.splitlines()]
+    assert len(set(wallet_uuids)) == 3
+
+    for wallet_uuid in wallet_uuids:
+        balance_response = await test_client.get(f"/api/v1/wallets/{wallet_uuid}")
+        assert balance_response.json()["balance"] == 25.00
+
+
+async def test_create_wallets_bulk_with_balances(test_client: AsyncClient):
+    """Тест массового создания кошельков с индивидуальными балансами"""
+    response = await test_client.post(
+        "/api/v1/wallets/create_wallets",
+        json={"balances": ["1.00", "2.00"]}
+    )
+    assert response.status_code == 201
+
+    wallet_uuids = [json.loads(line)["wallet_uuid"] for line in response.text.splitlines()]
+    balances = [
+        (await test_client.get(f"/api/v1/wallets/{wallet_uuid}")).json()["balance"]
+        for wallet_uuid in wallet_uuids
+    ]
+    assert sorted(balances) == [1.00, 2.00]
+
+
 async def test_get_wallet_balance(test_client: AsyncClient):
     """Тест получения баланса кошелька"""
     # Создаем кошелек
@@ -129,6 +165,23 @@ async def test_wallet_operation_invalid_amount(test_client: AsyncClient):
     )
     assert response.status_code == 422  # Validation error
 
+    # Сумма точнее минимальной единицы баланса
+    operation_data["amount"] = "0.001"
+    response = await test_client.post(
+        f"/api/v1/wallets/{wallet_uuid}/operation",
+        json=operation_data
+    )
+    assert response.status_code == 422
+    assert "decimal places" in response.json()["message"]
+
+    # Тело, не являющееся JSON, отклоняется в том же формате
+    response = await test_client.post(
+        f"/api/v1/wallets/{wallet_uuid}/operation",
+        content=b'{"operation": "DEPOSIT",'
+    )
+    assert response.status_code == 422
+    assert response.json()["message"].startswith("ValidationError: ")
+
 
 async def test_concurrent_operations(test_client: AsyncClient):
     """Тест параллельных операций с кошельком"""
@@ -162,3 +215,101 @@ async def test_concurrent_operations(test_client: AsyncClient):
     assert balance_response.status_code == 200
     final_balance = float(balance_response.json()["balance"])
     assert final_balance == 50.00  # 5 * 10.00
+
+
+async def test_wallet_batch_operations_best_effort(test_client: AsyncClient):
+    """Тест пакетных операций в режиме best effort"""
+    create_response = await test_client.post("/api/v1/wallets/create_wallet")
+    wallet_uuid = create_response.json()["wallet_uuid"]
+    missing_uuid = "aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee"
+
+    response = await test_client.post(
+        "/api/v1/wallets/operations/batch",
+        json={
+            "mode": "BEST_EFFORT",
+            "operations": [
+                {"wallet_uuid": wallet_uuid, "operation": "DEPOSIT", "amount": "100.00"},
+                {"wallet_uuid": wallet_uuid, "operation": "WITHDRAW", "amount": "150.00"},
+                {"wallet_uuid": missing_uuid, "operation": "DEPOSIT", "amount": "10.00"},
+                {"wallet_uuid": wallet_uuid, "operation": "WITHDRAW", "amount": "40.00"},
+            ]
+        }
+    )
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["applied"] is True
+    assert [item["status"] for item in data["results"]] == [
+        "success", "insufficient_funds", "not_found", "success"
+    ]
+    assert data["results"][0]["balance"] == 100.00
+    assert data["results"][3]["balance"] == 60.00
+
+    balance_response = await test_client.get(f"/api/v1/wallets/{wallet_uuid}")
+    assert balance_response.json()["balance"] == 60.00
+
+
+async def test_wallet_batch_operations_atomic(test_client: AsyncClient):
+    """Тест пакетных операций в режиме "все или ничего" """
+    create_response = await test_client.post("/api/v1/wallets/create_wallet")
+    wallet_uuid = create_response.json()["wallet_uuid"]
+
+    response = await test_client.post(
+        "/api/v1/wallets/operations/batch",
+        json={
+            "mode": "ATOMIC",
+            "operations": [
+                {"wallet_uuid": wallet_uuid, "operation": "DEPOSIT", "amount": "100.00"},
+                {"wallet_uuid": wallet_uuid, "operation": "WITHDRAW", "amount": "150.00"},
+            ]
+        }
+    )
+    assert response.status_code == 409
+
+    data = response.json()
+    assert data["applied"] is False
+    assert [item["status"] for item in data["results"]] == ["rolled_back", "insufficient_funds"]
+
+    balance_response = await test_client.get(f"/api/v1/wallets/{wallet_uuid}")
+    assert balance_response.json()["balance"] == 0
+
+
+async def test_get_wallets_balances(test_client: AsyncClient):
+    """Тест чтения балансов списком: порядок не важен, ненайденные и повторы"""
+    wallet_uuids = []
+    for amount in ("10.50", "20.00"):
+        wallet_uuid = (await test_client.post("/api/v1/wallets/create_wallet")).json()["wallet_uuid"]
+        await test_client.post(
+            f"/api/v1/wallets/{wallet_uuid}/operation",
+            json={"operation": "DEPOSIT", "amount": amount}
+        )
+        wallet_uuids.append(wallet_uuid)
+    missing_uuid = str(uuid.uuid4())
+
+    response = await test_client.post(
+        "/api/v1/wallets/balances",
+        json={"wallet_uuids": [wallet_uuids[0], missing_uuid, wallet_uuids[1], wallet_uuids[0]]}
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert sorted(body["balances"], key=lambda item: item["balance"]) == [
+        {"wallet_uuid": wallet_uuids[0], "balance": 10.5},
+        {"wallet_uuid": wallet_uuids[1], "balance": 20.0},
+    ]
+    assert body["missing"] == [missing_uuid]
+
+
+async def test_get_wallets_balances_streamed(test_client: AsyncClient):
+    """Тест: список длиннее куска чтения отдается потоком в том же формате"""
+    response = await test_client.post("/api/v1/wallets/create_wallets", json={"count": 1500, "initial_balance": "1.00"})
+    wallet_uuids = [json.loads(line)["wallet_uuid"] for line in response.text.splitlines()]
+
+    response = await test_client.post("/api/v1/wallets/balances", json={"wallet_uuids": wallet_uuids})
+
+    assert response.status_code == 200
+    assert "content-length" not in response.headers
+    body = response.json()
+    assert {item["wallet_uuid"] for item in body["balances"]} == set(wallet_uuids)
+    assert {item["balance"] for item in body["balances"]} == {1.0}
+    assert body["missing"] == []
@@ -4,6 +4,7 @@ from typing import AsyncIterator
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
@@ -71,13 +72,30 @@ async def db_session(db_engine):
         yield session
 
 
+# Фоновые задачи сервера обновляют wallets во время пересоздания таблиц. Удаление wallet_slots
+# блокирует секции wallets (внешний ключ) в другом порядке, чем UPDATE, поэтому сначала
+# блокируется сама wallets - вместе с секциями, как в запросах сервера
+LOCK_WALLETS_STMT = text("""
+    DO $$ BEGIN
+        IF to_regclass('wallets') IS NOT NULL THEN
+            LOCK TABLE wallets, wallet_slots IN ACCESS EXCLUSIVE MODE;
+        END IF;
+    END $$
+""")
+
+
+async def drop_tables(conn) -> None:
+    await conn.execute(LOCK_WALLETS_STMT)
+    await conn.run_sync(Base.metadata.drop_all)
+
+
 @pytest_asyncio.fixture(autouse=True)
 async def setup_database(db_engine):
     """Create test database for each test."""
     try:
         async with db_engine.begin() as conn:
             logger.debug("Удаление всех таблиц...")
-            await conn.run_sync(Base.metadata.drop_all)
+            await drop_tables(conn)
             logger.debug("Создание всех таблиц...")
             await conn.run_sync(Base.metadata.create_all)
         yield
@@ -86,7 +104,7 @@ async def setup_database(db_engine):
         raise
     finally:
         async with db_engine.begin() as conn:
-            await conn.run_sync(Base.metadata.drop_all)
+            await drop_tables(conn)
 
 
 @asynccontextmanager
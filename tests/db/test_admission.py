@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from app.config.config import settings
+from app.db.admission import AdmissionController
+from app.exceptions.db_exceptions import DatabaseOverloadedError
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_admission_queue_full():
+    """Тест: при заполненной очереди запрос отклоняется сразу"""
+    controller = AdmissionController(max_concurrency=1, max_queue=1, timeout=1, retry_after=2)
+
+    await controller.acquire()
+    waiter = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(DatabaseOverloadedError) as exc_info:
+        await controller.acquire()
+    assert exc_info.value.retry_after == 2
+
+    controller.release()
+    await waiter
+    controller.release()
+
+
+async def test_admission_timeout():
+    """Тест: запрос, не дождавшийся слота до дедлайна, отклоняется"""
+    controller = AdmissionController(max_concurrency=1, max_queue=10, timeout=0.01, retry_after=1)
+
+    async with controller.slot():
+        with pytest.raises(DatabaseOverloadedError):
+            await controller.acquire()
+
+    assert controller.waiting == 0
+    async with controller.slot():
+        pass
+
+
+async def test_dedicated_connections_in_budget():
+    """Тест: соединение LISTEN вычитается из пула, соединение записи журнала - из admission control"""
+    base = settings.model_copy(update={
+        "DB_MAX_CONNECTIONS": 50, "DB_RESERVED_CONNECTIONS": 10, "WORKERS_COUNT": 2,
+        "DB_POOL_SIZE": 100, "DB_MAX_OVERFLOW": 100, "FAST_PATH_ENABLED": False,
+        "ADMISSION_MAX_CONCURRENCY": None, "BALANCE_NOTIFY_ENABLED": False, "WALLET_STORAGE_ENGINE": "update",
+    })
+    assert base.get_pool_size + base.get_max_overflow == 20
+    assert base.get_admission_max_concurrency == 20
+
+    dedicated = base.model_copy(update={"BALANCE_NOTIFY_ENABLED": True, "WALLET_STORAGE_ENGINE": "ledger"})
+    assert dedicated.get_pool_size + dedicated.get_max_overflow == 19
+    assert dedicated.get_admission_max_concurrency == 18
@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import text
+
+from app.api.v1 import crud_services
+from app.db.models.models import WALLET_PARTITIONS
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_wallet_partitions(db_session):
+    """Тест: wallets создается секционированной, у каждой секции запас места под HOT-обновления"""
+    result = await db_session.execute(text("""
+        SELECT c.relname, c.reloptions
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'wallets'::regclass
+    """))
+    partitions = result.all()
+
+    assert len(partitions) == WALLET_PARTITIONS
+    assert all("fillfactor=70" in options for _, options in partitions)
+
+
+async def test_balance_updates_are_hot(db_session):
+    """Тест: обновления баланса не трогают индексы (HOT)"""
+    wallet_uuid = await crud_services.create_wallet(db_session)
+    await db_session.commit()
+
+    for _ in range(20):
+        await db_session.execute(crud_services.DEPOSIT_STMT, {"wallet_uuid": wallet_uuid, "amount": 100})
+
+    # Статистика текущей транзакции доступна сразу, без задержки отправки
+    result = await db_session.execute(text("""
+        SELECT sum(n_tup_upd), sum(n_tup_hot_upd) FROM pg_stat_xact_user_tables WHERE relname LIKE 'wallets_p%'
+    """))
+    updated, hot_updated = result.one()
+
+    assert updated == 20
+    assert hot_updated == updated
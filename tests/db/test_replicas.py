@@ -0,0 +1,53 @@
+import math
+
+import pytest
+
+from app.config.config import settings
+from app.db.replicas import ReplicaRouter
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_replica_lag_routing():
+    """Тест: выбор реплики по отставанию и исключение отстающей"""
+    router = ReplicaRouter(
+        urls=[settings.get_db_url.replace(settings.DB_HOST, "replica-a"),
+              settings.get_db_url.replace(settings.DB_HOST, "replica-b")],
+        max_lag=1.0,
+        pool_size=1,
+        check_interval=0.5
+    )
+    first, second = router.replicas
+
+    # До первой проверки отставание неизвестно - чтение с основной БД
+    assert router.choose() is None
+
+    router.record_primary_position(100, now=10.0)
+    router.record_primary_position(200, now=10.5)
+    router.set_lag(first, router.estimate_lag(200, now=10.6))
+    router.set_lag(second, router.estimate_lag(150, now=10.6))
+
+    assert first.lag == pytest.approx(0.1)
+    assert second.lag == pytest.approx(0.6)
+    assert {router.choose().name for _ in range(4)} == {first.name, second.name}
+    assert {router.choose(max_lag=0.3).name for _ in range(4)} == {first.name}
+
+    # Позиция старше всей истории: отставание больше max_lag, реплика исключается
+    router.set_lag(second, router.estimate_lag(50, now=10.6))
+    router.eject(first)
+    assert math.isinf(second.lag)
+    assert router.choose() is None
+
+    await router.dispose()
+
+
+async def test_replica_not_in_recovery(db_engine):
+    """Тест: самостоятельная БД (не в режиме восстановления) не используется как реплика"""
+    router = ReplicaRouter(urls=[settings.get_db_url], max_lag=1.0, pool_size=1, check_interval=0.5)
+
+    await router.check_lag(db_engine)
+
+    assert math.isinf(router.replicas[0].lag)
+    assert router.choose() is None
+
+    await router.dispose()
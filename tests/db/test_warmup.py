@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config.config import settings
+from app.db.warmup import hot_statements, warm_up_pool
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_warm_up_pool():
+    """Тест: прогрев открывает заданное число соединений и оставляет их в пуле"""
+    engine = create_async_engine(settings.get_db_url, pool_size=3, max_overflow=0)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False, autoflush=False, class_=AsyncSession)
+
+    await warm_up_pool(session_maker, 3, hot_statements(read_only=False))
+
+    assert engine.pool.checkedin() == 3
+    assert engine.pool.checkedout() == 0
+
+    await engine.dispose()
+
+
+async def test_health_and_ready(test_client: AsyncClient):
+    """Тест: /health отвечает всегда, /ready - после прогрева"""
+    response = await test_client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+    for _ in range(50):
+        response = await test_client.get("/ready")
+        if response.status_code == 200:
+            break
+        assert response.json() == {"status": "warming_up"}
+        await asyncio.sleep(0.1)
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}